@@ -2,6 +2,8 @@
 
 from __future__ import annotations
 
+import json
+import re
 from dataclasses import dataclass
 
 
@@ -64,12 +66,18 @@ def extra_headers(api_url: str) -> dict[str, str]:
     return {}
 
 
-def chat_payload(model_name: str, prompt: str) -> dict:
+SSE_DONE = "[DONE]"
+
+
+def chat_payload(model_name: str, prompt: str, *, stream: bool = False) -> dict:
     """OpenAI-совместимый chat/completions payload (OpenAI, DeepSeek, Groq, OpenRouter)."""
-    return {
+    payload: dict = {
         "model": model_name,
         "messages": [{"role": "user", "content": prompt}],
     }
+    if stream:
+        payload["stream"] = True
+    return payload
 
 
 def parse_chat_content(data: object) -> str:
@@ -85,3 +93,102 @@ def parse_chat_content(data: object) -> str:
     if content is None:
         raise ValueError("no content")
     return str(content).strip()
+
+
+_CONTENT_KEY = re.compile(r'"content"\s*:\s*"')
+
+
+def truncated_chat_content(body: bytes | bytearray) -> str:
+    """
+    Начало текста ответа из обрезанного по лимиту тела JSON: строка после
+    первого ключа "content" (message.content) до места обрыва.
+    """
+    text = bytes(body).decode("utf-8", "ignore")
+    match = _CONTENT_KEY.search(text)
+    if match is None:
+        return ""
+    try:
+        # Строка закрылась до обрыва — обрезаны только поля после неё.
+        return json.decoder.scanstring(text, match.end())[0].strip()
+    except ValueError:
+        pass
+    raw = text[match.end():]
+    # Хвост может оборваться на середине escape-последовательности (\uXXXX).
+    for cut in range(7):
+        try:
+            return json.loads('"' + raw[: len(raw) - cut] + '"').strip()
+        except ValueError:
+            continue
+    return ""
+
+
+def sse_data(line: str) -> str | None:
+    """Полезная нагрузка строки SSE «data: …»; None для комментариев и служебных строк."""
+    if not line.startswith("data:"):
+        return None
+    return line[5:].strip()
+
+
+def parse_chat_delta(data: object) -> str:
+    """Фрагмент текста из чанка потокового ответа (choices[0].delta.content)."""
+    if not isinstance(data, dict):
+        raise ValueError("chunk is not an object")
+    error = data.get("error")
+    if error:
+        message = error.get("message") if isinstance(error, dict) else error
+        raise ValueError(str(message))
+    choices = data.get("choices")
+    if not isinstance(choices, list) or not choices:
+        return ""
+    delta = choices[0].get("delta") if isinstance(choices[0], dict) else None
+    if not isinstance(delta, dict):
+        return ""
+    content = delta.get("content")
+    return "" if content is None else str(content)
+
+
+@dataclass(frozen=True)
+class Usage:
+    prompt_tokens: int
+    completion_tokens: int
+    # Токены промта, взятые из кэша провайдера (входят в prompt_tokens).
+    cached_tokens: int = 0
+
+
+def _int_or_zero(value: object) -> int:
+    try:
+        return max(0, int(value))  # type: ignore[arg-type]
+    except (TypeError, ValueError):
+        return 0
+
+
+def parse_usage(data: object) -> Usage | None:
+    """
+    Блок usage ответа или последнего чанка потока; None, если его нет.
+    Кэшированные токены: prompt_tokens_details.cached_tokens (OpenAI, OpenRouter,
+    Groq) или prompt_cache_hit_tokens (DeepSeek).
+    """
+    if not isinstance(data, dict):
+        return None
+    usage = data.get("usage")
+    if usage is None and isinstance(data.get("x_groq"), dict):
+        # Groq в потоке кладёт usage в x_groq последнего чанка.
+        usage = data["x_groq"].get("usage")
+    if not isinstance(usage, dict):
+        return None
+    details = usage.get("prompt_tokens_details")
+    cached = details.get("cached_tokens") if isinstance(details, dict) else None
+    if cached is None:
+        cached = usage.get("prompt_cache_hit_tokens")
+    return Usage(
+        prompt_tokens=_int_or_zero(usage.get("prompt_tokens")),
+        completion_tokens=_int_or_zero(usage.get("completion_tokens")),
+        cached_tokens=_int_or_zero(cached),
+    )
+
+
+def stream_options(api_url: str) -> dict:
+    """Доп. поля потокового запроса: OpenAI, DeepSeek и Groq шлют usage только по запросу."""
+    if detect_provider(api_url) in ("openai", "deepseek", "groq"):
+        return {"stream_options": {"include_usage": True}}
+    return {}
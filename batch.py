@@ -0,0 +1,321 @@
+"""Пакетный прогон промтов по активным моделям без GUI (python -m chatlist batch)."""
+
+from __future__ import annotations
+
+import csv
+import json
+import sys
+import threading
+import time
+from collections.abc import Mapping, Sequence
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, TextIO
+
+import ratelimit
+from adapters import chat_payload, detect_provider
+from cache import cache_key, response_cache
+from db import Database
+from models import ActiveModel
+from network import SendOutcome, send_one
+from pricing import format_cost, usage_columns
+from retry import NO_RETRY, RetryPolicy, hedge_delay_sec, percentile
+
+# Сколько строк копить перед записью в БД одной транзакцией.
+FLUSH_ROWS = 50
+PROGRESS_WIDTH = 30
+
+
+@dataclass(frozen=True)
+class BatchPrompt:
+    prompt_id: int
+    text: str
+
+
+@dataclass
+class BatchSummary:
+    total: int = 0
+    ok: int = 0
+    errors: int = 0
+    # Пропущены разомкнутым предохранителем: запроса не было, это не ошибка.
+    skipped: int = 0
+    cached: int = 0
+    elapsed_sec: float = 0.0
+    durations_ms: list[int] = field(default_factory=list)
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    # None — ни у одной модели не задана цена.
+    cost_usd: float | None = None
+    response_bytes: int = 0
+    wire_bytes: int = 0
+
+    @property
+    def requests_per_sec(self) -> float:
+        return self.total / self.elapsed_sec if self.elapsed_sec > 0 else 0.0
+
+    def format(self) -> str:
+        p50 = percentile(self.durations_ms, 50)
+        p95 = percentile(self.durations_ms, 95)
+        latency = (
+            f"p50 {p50:.0f} мс, p95 {p95:.0f} мс"
+            if p50 is not None and p95 is not None
+            else "запросов в сеть не было"
+        )
+        text = (
+            f"Запросов: {self.total} (ok {self.ok}, ошибок {self.errors}, "
+            f"пропущено {self.skipped}, из кэша {self.cached}) за {self.elapsed_sec:.1f} с — "
+            f"{self.requests_per_sec:.1f} запр/с, {latency}"
+        )
+        if self.prompt_tokens or self.completion_tokens:
+            text += f"; токенов: {self.prompt_tokens} → {self.completion_tokens}"
+        if self.cost_usd is not None:
+            text += f", стоимость {format_cost(self.cost_usd)}"
+        if self.response_bytes:
+            text += (
+                f"; ответы {self.response_bytes / 1024 / 1024:.1f} МБ "
+                f"(по сети {self.wire_bytes / 1024 / 1024:.1f} МБ)"
+            )
+        return text
+
+
+def read_prompts_file(path: Path) -> list[tuple[str, str]]:
+    """
+    (промт, теги) из JSONL или CSV.
+    JSONL: строка JSON или объект {"prompt": ..., "tags": ...}.
+    CSV: колонки prompt и tags; без заголовка prompt — берётся первая колонка.
+    """
+    suffix = path.suffix.lower()
+    items: list[tuple[str, str]] = []
+    if suffix in (".jsonl", ".ndjson"):
+        with path.open(encoding="utf-8") as fh:
+            for number, line in enumerate(fh, start=1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    data = json.loads(line)
+                except json.JSONDecodeError as exc:
+                    raise ValueError(f"{path}:{number}: некорректный JSON") from exc
+                if isinstance(data, str):
+                    items.append((data, ""))
+                elif isinstance(data, dict) and data.get("prompt"):
+                    items.append((str(data["prompt"]), str(data.get("tags") or "")))
+                else:
+                    raise ValueError(f"{path}:{number}: нет поля prompt")
+    elif suffix == ".csv":
+        with path.open(encoding="utf-8-sig", newline="") as fh:
+            rows = list(csv.reader(fh))
+        if not rows:
+            return items
+        header = [h.strip().lower() for h in rows[0]]
+        if "prompt" in header:
+            prompt_col = header.index("prompt")
+            tags_col = header.index("tags") if "tags" in header else None
+            rows = rows[1:]
+        else:
+            prompt_col, tags_col = 0, None
+        for row in rows:
+            if len(row) <= prompt_col or not row[prompt_col].strip():
+                continue
+            tags = row[tags_col] if tags_col is not None and len(row) > tags_col else ""
+            items.append((row[prompt_col].strip(), tags.strip()))
+    else:
+        raise ValueError(f"Неизвестный формат файла промтов: {path.name} (нужен .jsonl или .csv)")
+    return [(text.strip(), tags) for text, tags in items if text.strip()]
+
+
+def load_prompts(
+    db: Database, *, path: Path | None = None, tag: str | None = None
+) -> list[BatchPrompt]:
+    """Промты из файла (заносятся в prompts) или из prompts по тегу."""
+    if path is not None:
+        return [
+            BatchPrompt(db.create_prompt(text, tags), text)
+            for text, tags in read_prompts_file(path)
+        ]
+    if tag:
+        return [
+            BatchPrompt(int(row["id"]), row["prompt"])
+            for row in db.list_prompts_by_tag(tag)
+        ]
+    raise ValueError("Нужен файл промтов или тег")
+
+
+class Progress:
+    """Строка прогресса в stderr, перерисовывается на месте."""
+
+    def __init__(self, total: int, stream: TextIO = sys.stderr) -> None:
+        self.total = total
+        self.stream = stream
+        self.started = time.perf_counter()
+
+    def update(self, done: int, errors: int) -> None:
+        filled = PROGRESS_WIDTH * done // self.total if self.total else PROGRESS_WIDTH
+        elapsed = time.perf_counter() - self.started
+        rate = done / elapsed if elapsed > 0 else 0.0
+        bar = "#" * filled + "-" * (PROGRESS_WIDTH - filled)
+        limits = ratelimit.format_concurrency()
+        self.stream.write(
+            f"\r[{bar}] {done}/{self.total} {rate:.1f} запр/с, ошибок: {errors}"
+            + (f", в работе/лимит: {limits}" if limits else "")
+            + "\x1b[K"
+        )
+        self.stream.flush()
+
+    def close(self) -> None:
+        self.stream.write("\n")
+        self.stream.flush()
+
+
+def run_batch(
+    db: Database,
+    prompts: Sequence[BatchPrompt],
+    models: Sequence[ActiveModel],
+    *,
+    concurrency: int,
+    per_provider: int = 0,
+    timeout_sec: float = 60.0,
+    policy: RetryPolicy = NO_RETRY,
+    use_cache: bool = True,
+    progress: Progress | None = None,
+    timeouts: Mapping[int, float] | None = None,
+) -> BatchSummary:
+    """
+    Каждый промт × каждая модель. Не больше concurrency запросов всего и
+    per_provider (0 — без отдельного лимита) к одному провайдеру.
+    timeouts: model_id → свой таймаут модели вместо timeout_sec.
+    Ответы пишутся в results, request_logs и кэш пачками по FLUSH_ROWS.
+    """
+    summary = BatchSummary(total=len(prompts) * len(models))
+    started = time.perf_counter()
+    keys = {
+        (p.prompt_id, m.id): cache_key(m, chat_payload(m.name, p.text))
+        for p in prompts
+        for m in models
+    }
+    hedge_after = {m.id: hedge_delay_sec(db, m.name, policy) for m in models}
+    results: list[dict[str, Any]] = []
+    logs: list[dict[str, Any]] = []
+    # (ключ кэша, модель, ответ) — в response_cache вместе с пачкой.
+    to_cache: list[tuple[str, str, str]] = []
+    done = 0
+
+    def flush() -> None:
+        # Логи, результаты и кэш пачки — одна транзакция, один fsync.
+        with db.transaction():
+            if logs:
+                db.log_requests_many(logs)
+                logs.clear()
+            if results:
+                db.save_results_many(results)
+                results.clear()
+            for key, model_name, answer in to_cache:
+                response_cache.put(key, answer, model_name=model_name, db=db)
+            to_cache.clear()
+
+    def step() -> None:
+        nonlocal done
+        done += 1
+        if len(logs) >= FLUSH_ROWS:
+            flush()
+        if progress is not None:
+            progress.update(done, summary.errors)
+
+    pending: list[tuple[BatchPrompt, ActiveModel]] = []
+    for prompt in prompts:
+        for model in models:
+            hit = (
+                response_cache.get(keys[(prompt.prompt_id, model.id)], db)
+                if use_cache
+                else None
+            )
+            if hit is None:
+                pending.append((prompt, model))
+                continue
+            summary.cached += 1
+            summary.ok += 1
+            logs.append(
+                {
+                    "model_name": model.name,
+                    "prompt": prompt.text,
+                    "status": "cached",
+                    "response": hit,
+                }
+            )
+            results.append(
+                {"prompt_id": prompt.prompt_id, "model_id": model.id, "response": hit}
+            )
+            step()
+
+    slots = threading.BoundedSemaphore(max(1, concurrency))
+
+    def job(prompt: BatchPrompt, model: ActiveModel) -> SendOutcome:
+        with slots:
+            return send_one(
+                model,
+                prompt.text,
+                timeout_sec=(timeouts or {}).get(model.id, timeout_sec),
+                policy=policy,
+                hedge_after_sec=hedge_after[model.id],
+            )
+
+    workers = max(1, concurrency)
+    if per_provider > 0:
+        workers = min(workers, per_provider)
+    pools: dict[str, ThreadPoolExecutor] = {}
+    futures: dict[Future[SendOutcome], BatchPrompt] = {}
+    try:
+        for prompt, model in pending:
+            provider = detect_provider(model.api_url)
+            pool = pools.get(provider)
+            if pool is None:
+                pool = ThreadPoolExecutor(
+                    max_workers=workers, thread_name_prefix=f"batch-{provider}"
+                )
+                pools[provider] = pool
+            futures[pool.submit(job, prompt, model)] = prompt
+        for future in as_completed(futures):
+            prompt = futures[future]
+            outcome = future.result()
+            logs.extend(outcome.log_rows(prompt.text))
+            if outcome.status == "skipped":
+                summary.skipped += 1
+                step()
+                continue
+            summary.durations_ms.append(outcome.duration_ms)
+            if outcome.usage is not None and not outcome.coalesced:
+                summary.prompt_tokens += outcome.usage.prompt_tokens
+                summary.completion_tokens += outcome.usage.completion_tokens
+                cost = usage_columns(outcome.usage, outcome.model.price)["cost_usd"]
+                if cost is not None:
+                    summary.cost_usd = (summary.cost_usd or 0.0) + cost
+            if outcome.size is not None and not outcome.coalesced:
+                summary.response_bytes += outcome.size.body_bytes
+                summary.wire_bytes += outcome.size.wire_bytes
+            if outcome.status == "ok":
+                summary.ok += 1
+                results.append(
+                    {
+                        "prompt_id": prompt.prompt_id,
+                        "model_id": outcome.model.id,
+                        "response": outcome.answer,
+                        **usage_columns(outcome.usage, outcome.model.price),
+                    }
+                )
+                to_cache.append(
+                    (
+                        keys[(prompt.prompt_id, outcome.model.id)],
+                        outcome.model.name,
+                        outcome.answer,
+                    )
+                )
+            else:
+                summary.errors += 1
+            step()
+    finally:
+        for pool in pools.values():
+            pool.shutdown(wait=True, cancel_futures=True)
+        flush()
+        summary.elapsed_sec = time.perf_counter() - started
+    return summary
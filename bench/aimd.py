@@ -0,0 +1,81 @@
+"""
+Бенчмарк адаптивного лимита параллельности (AIMD) против статического.
+
+mock_server отвечает 429 на запросы сверх --capacity одновременных; клиент
+шлёт --requests запросов в --workers потоков. Запуск из корня проекта:
+
+    python -m bench.aimd --requests 300 --workers 32 --capacity 6
+
+Без AIMD лишние запросы получают 429 и ждут Retry-After; с AIMD лимит
+сходится к ёмкости сервера, и 429 почти не бывает.
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import ratelimit
+from mock_server import MockConfig, MockServer
+from models import ActiveModel
+from network import close_clients, send_one
+from retry import RetryPolicy
+
+
+def _run(label: str, aimd: ratelimit.AimdConfig, args, server: MockServer) -> None:
+    ratelimit.configure_aimd(aimd)
+    server.reset_stats()
+    # Свой ключ на прогон — свежий лимитер без истории прошлого прогона.
+    model = ActiveModel(
+        id=0, name="stub", api_url=server.url, api_id="", api_key=f"bench-{label}"
+    )
+    policy = RetryPolicy(max_attempts=1)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        outcomes = list(
+            pool.map(
+                lambda i: send_one(model, f"p{i}", timeout_sec=60.0, policy=policy),
+                range(args.requests),
+            )
+        )
+    elapsed = time.perf_counter() - started
+    stats = server.stats()
+    ok = sum(1 for o in outcomes if o.status == "ok")
+    limiter = ratelimit.limiter_for("openai_compatible", model.api_key).stats()
+    limit = (
+        "—" if limiter.concurrency_limit is None else f"{limiter.concurrency_limit:.1f}"
+    )
+    print(
+        f"{label:<8} ok {ok}/{args.requests} за {elapsed:.2f} с "
+        f"({ok / elapsed:.1f} запр/с), HTTP-запросов {stats.requests}, "
+        f"429: {stats.by_status.get(429, 0)}, итоговый лимит {limit}, "
+        f"сокращений {limiter.decreases}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--workers", type=int, default=32)
+    parser.add_argument("--capacity", type=int, default=6)
+    parser.add_argument("--latency", default="fixed:100")
+    parser.add_argument("--retry-after", type=float, default=0.5)
+    args = parser.parse_args()
+
+    config = MockConfig(
+        latency=args.latency,
+        answer_words=5,
+        capacity=args.capacity,
+        retry_after_sec=args.retry_after,
+    )
+    with MockServer(config) as server:
+        try:
+            _run("static", ratelimit.AimdConfig(enabled=False), args, server)
+            _run("aimd", ratelimit.AimdConfig(initial=float(args.workers)), args, server)
+        finally:
+            close_clients()
+
+
+if __name__ == "__main__":
+    main()
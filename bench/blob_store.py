@@ -0,0 +1,197 @@
+"""
+Отчёт о размере БД: длинные ответы в строках против blobs (хэш + zlib).
+
+    python -m bench.blob_store                       # синтетические данные
+    python -m bench.blob_store --db chatlist.db      # ответы из своей БД
+
+Одни и те же результаты и логи записываются в две временные БД: как раньше
+(Database.blob_min_bytes = None, весь текст в строке) и через blobs. После
+VACUUM сравниваются размеры файлов и время открытия страницы / полной строки.
+Исходная БД только читается (из копии: открытие её мигрирует).
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from typing import Any
+
+from db import Database
+
+WORDS = [f"w{i}" for i in range(3000)]
+
+
+def _text(rng: random.Random, mean_bytes: int) -> str:
+    """Ответ модели: слова по Zipf, длина — логнормальная вокруг mean_bytes."""
+    target = max(20, int(rng.lognormvariate(0, 0.6) * mean_bytes))
+    words: list[str] = []
+    size = 0
+    while size < target:
+        word = WORDS[min(int(rng.paretovariate(1.1)), len(WORDS)) - 1]
+        words.append(word)
+        size += len(word) + 1
+    return " ".join(words)
+
+
+def _synthetic(args: argparse.Namespace) -> tuple[list[dict[str, Any]], list[dict[str, Any]]]:
+    """
+    Как пишет приложение: каждый ответ — в request_logs, отмеченные — в results;
+    повторные прогоны того же промта отдают тот же ответ из кэша.
+    """
+    rng = random.Random(7)
+    models = [f"vendor/model-{i}" for i in range(args.models)]
+    results: list[dict[str, Any]] = []
+    logs: list[dict[str, Any]] = []
+    for n in range(args.prompts):
+        prompt = f"prompt {n}"
+        answers = {model: _text(rng, args.mean_bytes) for model in models}
+        for run in range(1 + (n % (args.reruns + 1))):
+            for model, answer in answers.items():
+                logs.append(
+                    {
+                        "model_name": model,
+                        "prompt": prompt,
+                        "status": "ok" if run == 0 else "cached",
+                        "response": answer,
+                    }
+                )
+                if rng.random() < args.saved:
+                    results.append({"prompt": prompt, "model": model, "response": answer})
+    return results, logs
+
+
+def _from_db(path: Path) -> tuple[list[dict[str, Any]], list[dict[str, Any]]]:
+    with tempfile.TemporaryDirectory() as tmp:
+        copy = Path(tmp) / "source.db"
+        shutil.copyfile(path, copy)
+        db = Database(copy)
+        try:
+            results = [
+                {"prompt": r["prompt_text"], "model": r["model_name"], "response": r["response"]}
+                for r in reversed(db.list_results())
+            ]
+            logs = list(reversed(db.list_logs(limit=-1)))
+        finally:
+            db.close()
+    return results, logs
+
+
+def _write(
+    path: Path,
+    results: list[dict[str, Any]],
+    logs: list[dict[str, Any]],
+    blobs: bool,
+    batch: int = 500,
+) -> Database:
+    db = Database(path)
+    if not blobs:
+        db.blob_min_bytes = None
+    prompt_ids: dict[str, int] = {}
+    model_ids: dict[str, int] = {}
+    for r in results:
+        if r["prompt"] not in prompt_ids:
+            prompt_ids[r["prompt"]] = db.create_prompt(r["prompt"])
+        if r["model"] not in model_ids:
+            model_ids[r["model"]] = db.create_model(r["model"], "http://127.0.0.1/", "KEY")
+    for start in range(0, len(results), batch):
+        db.save_results_many(
+            [
+                {
+                    "prompt_id": prompt_ids[r["prompt"]],
+                    "model_id": model_ids[r["model"]],
+                    "response": r["response"],
+                }
+                for r in results[start : start + batch]
+            ]
+        )
+    for start in range(0, len(logs), batch):
+        db.log_requests_many(
+            [
+                {
+                    "model_name": r["model_name"],
+                    "prompt": r["prompt"],
+                    "status": r["status"],
+                    "response": r.get("response") or "",
+                    "duration_ms": r.get("duration_ms") or 0,
+                }
+                for r in logs[start : start + batch]
+            ]
+        )
+    return db
+
+
+def _size_mb(db: Database, path: Path) -> float:
+    db.vacuum()
+    return path.stat().st_size / 1024 / 1024
+
+
+def _ms(started: float) -> float:
+    return (time.perf_counter() - started) * 1000
+
+
+def _reads(db: Database) -> tuple[float, float]:
+    """Первая страница «Результатов» и полная строка (выделение), мс."""
+    started = time.perf_counter()
+    page = db.list_results_page()
+    page_ms = _ms(started)
+    started = time.perf_counter()
+    for row in page[:50]:
+        db.get_results([int(row["id"])])
+    full_ms = _ms(started) / max(1, min(50, len(page)))
+    return page_ms, full_ms
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--db", type=Path, help="взять ответы из этой БД")
+    parser.add_argument("--prompts", type=int, default=1000)
+    parser.add_argument("--models", type=int, default=4)
+    parser.add_argument("--reruns", type=int, default=2, help="повторных прогонов промта, до")
+    parser.add_argument("--saved", type=float, default=0.5, help="доля ответов в results")
+    parser.add_argument("--mean-bytes", type=int, default=3000, help="средний размер ответа")
+    args = parser.parse_args()
+
+    if args.db:
+        results, logs = _from_db(args.db)
+        source = str(args.db)
+    else:
+        results, logs = _synthetic(args)
+        source = "синтетика"
+    text_mb = sum(len(str(r.get("response") or "").encode()) for r in results + logs) / 1024 / 1024
+    print(f"{source}: results {len(results)}, request_logs {len(logs)}, текста ответов {text_mb:.1f} МБ")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        sizes = {}
+        for label, blobs in (("в строках", False), ("blobs", True)):
+            path = Path(tmp) / f"{label}.db"
+            started = time.perf_counter()
+            db = _write(path, results, logs, blobs)
+            write_s = time.perf_counter() - started
+            try:
+                page_ms, full_ms = _reads(db)
+                sizes[label] = _size_mb(db, path)
+                stats = db.blob_stats()
+                top = list(db.table_sizes().items())[:5]
+            finally:
+                db.close()
+            print(
+                f"{label:<10} БД {sizes[label]:7.1f} МБ, запись {write_s:5.1f} с, "
+                f"страница {page_ms:5.1f} мс, полная строка {full_ms:5.2f} мс"
+            )
+            print(f"{'':<10} " + ", ".join(f"{name} {size / 1024 / 1024:.1f}" for name, size in top))
+            if blobs:
+                print(
+                    f"{'':<10} blobs {stats['blobs']}: текста {stats['text_bytes'] / 1024 / 1024:.1f} МБ, "
+                    f"сжато {stats['stored_bytes'] / 1024 / 1024:.1f} МБ; ссылок {stats['refs']} "
+                    f"на {stats['ref_bytes'] / 1024 / 1024:.1f} МБ текста"
+                )
+        before, after = sizes["в строках"], sizes["blobs"]
+        print(f"БД меньше в {before / after:.1f} раза ({before - after:.1f} МБ)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+Бенчмарк одновременного чтения и записи SQLite: прежний профиль против WAL.
+
+Писатели — как SendWorker и ImproveWorker: своё соединение и log_request
+с commit на строку; читатели — как окно «Логи запросов»: list_logs. Запуск
+из корня проекта:
+
+    python -m bench.db_concurrency --writers 4 --readers 2 --seconds 5
+
+Прежний профиль (DELETE, synchronous=FULL): читатель и писатель блокируют друг
+друга, запись ждёт fsync журнала и файла. WAL + NORMAL: чтение не ждёт записи,
+fsync — только на контрольных точках.
+"""
+
+from __future__ import annotations
+
+import argparse
+import sqlite3
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from db import ConnectionProfile, Database
+from retry import percentile
+
+PROFILES = {
+    # Как было до профилей: настройки sqlite3.connect по умолчанию.
+    "legacy": ConnectionProfile(
+        journal_mode="DELETE",
+        synchronous="FULL",
+        busy_timeout_ms=5000,
+        cache_size_kb=2000,
+        mmap_size_mb=0,
+        temp_store="DEFAULT",
+    ),
+    "wal": ConnectionProfile(),
+}
+
+
+class _Counter:
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.latencies_ms: list[float] = []
+        self.locked = 0
+
+    def add(self, started: float) -> None:
+        elapsed = (time.perf_counter() - started) * 1000
+        with self.lock:
+            self.latencies_ms.append(elapsed)
+
+    def fail(self) -> None:
+        with self.lock:
+            self.locked += 1
+
+
+def _writer(path: Path, profile: ConnectionProfile, stop: threading.Event,
+            counter: _Counter, response: str, number: int) -> None:
+    db = Database(path, profile)
+    try:
+        i = 0
+        while not stop.is_set():
+            started = time.perf_counter()
+            try:
+                db.log_request(
+                    model_name=f"bench/model-{number}",
+                    prompt=f"prompt {i}",
+                    status="ok",
+                    response=response,
+                    duration_ms=100,
+                    http_status=200,
+                )
+            except sqlite3.OperationalError:
+                counter.fail()
+                continue
+            counter.add(started)
+            i += 1
+    finally:
+        db.close()
+
+
+def _reader(path: Path, profile: ConnectionProfile, stop: threading.Event,
+            counter: _Counter) -> None:
+    db = Database(path, profile)
+    try:
+        while not stop.is_set():
+            started = time.perf_counter()
+            try:
+                db.list_logs(limit=200)
+            except sqlite3.OperationalError:
+                counter.fail()
+                continue
+            counter.add(started)
+    finally:
+        db.close()
+
+
+def _fmt(values: list[float], q: float) -> str:
+    value = percentile(values, q)
+    return "—" if value is None else f"{value:.1f}"
+
+
+def _run(label: str, profile: ConnectionProfile, args: argparse.Namespace) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "bench.db"
+        Database(path, profile).close()
+        writes, reads = _Counter(), _Counter()
+        stop = threading.Event()
+        response = "x" * args.response_bytes
+        threads = [
+            threading.Thread(
+                target=_writer, args=(path, profile, stop, writes, response, i)
+            )
+            for i in range(args.writers)
+        ] + [
+            threading.Thread(target=_reader, args=(path, profile, stop, reads))
+            for _ in range(args.readers)
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        time.sleep(args.seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+    w, r = writes.latencies_ms, reads.latencies_ms
+    print(
+        f"{label:<7} запись {len(w) / elapsed:7.0f} строк/с "
+        f"(p50 {_fmt(w, 50)} мс, p99 {_fmt(w, 99)} мс), "
+        f"чтение {len(r) / elapsed:6.0f} запр/с "
+        f"(p50 {_fmt(r, 50)} мс, p99 {_fmt(r, 99)} мс), "
+        f"database is locked: {writes.locked + reads.locked}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=2)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--response-bytes", type=int, default=2000)
+    parser.add_argument("--profile", choices=("all", *PROFILES), default="all")
+    args = parser.parse_args()
+    for label, profile in PROFILES.items():
+        if args.profile in ("all", label):
+            _run(label, profile, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Бенчмарк открытия окна «Результаты»: вся таблица против keyset-страниц.
+
+    python -m bench.db_pages --sizes 100,10000,200000
+
+Для каждого размера заполняет временную БД и меряет list_results (как окно
+читало раньше — все строки с полным текстом ответа), первую страницу
+list_results_page и страницу на глубине --depth страниц.
+"""
+
+from __future__ import annotations
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+from db import PAGE_ROWS, Database, page_cursor
+
+
+def _fill(db: Database, rows: int, response: str, batch: int = 5000) -> None:
+    model_id = db.create_model("bench/model", "http://127.0.0.1/", "KEY")
+    prompt_id = db.create_prompt("bench prompt")
+    for start in range(0, rows, batch):
+        count = min(batch, rows - start)
+        db.save_results_many(
+            [
+                {"prompt_id": prompt_id, "model_id": model_id, "response": response}
+                for _ in range(count)
+            ]
+        )
+
+
+def _ms(started: float) -> float:
+    return (time.perf_counter() - started) * 1000
+
+
+def _run(size: int, args: argparse.Namespace) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(Path(tmp) / "bench.db")
+        try:
+            _fill(db, size, "x" * args.response_bytes)
+
+            started = time.perf_counter()
+            everything = db.list_results()
+            full_ms = _ms(started)
+            del everything
+
+            started = time.perf_counter()
+            page = db.list_results_page()
+            first_ms = _ms(started)
+
+            # Курсор на глубине depth страниц, затем замер одной страницы оттуда.
+            for _ in range(args.depth - 1):
+                if len(page) < PAGE_ROWS:
+                    break
+                page = db.list_results_page(page_cursor(page[-1]))
+            deep_ms = None
+            if len(page) == PAGE_ROWS:
+                started = time.perf_counter()
+                db.list_results_page(page_cursor(page[-1]))
+                deep_ms = _ms(started)
+        finally:
+            db.close()
+    deep = "—" if deep_ms is None else f"{deep_ms:.1f} мс"
+    print(
+        f"{size:>9} строк: вся таблица {full_ms:9.1f} мс, первая страница "
+        f"{first_ms:5.1f} мс, страница {args.depth + 1}: {deep}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="100,10000,200000")
+    parser.add_argument("--depth", type=int, default=50, help="глубина в страницах")
+    parser.add_argument("--response-bytes", type=int, default=2000)
+    args = parser.parse_args()
+    for size in (int(s) for s in args.sizes.split(",")):
+        _run(size, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Бенчмарк записи в SQLite: строка за строкой с commit против пачек в одной транзакции.
+
+    python -m bench.db_writes --rows 5000 --batch 50
+
+row — как было: log_request и save_result на строку, у каждой свой commit
+(и свой fsync); many — log_requests_many и save_results_many пачками по --batch
+внутри Database.transaction(). Оба режима — для прежнего профиля SQLite и для WAL.
+"""
+
+from __future__ import annotations
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+from bench.db_concurrency import PROFILES
+from db import ConnectionProfile, Database
+
+
+def _log_row(i: int, response: str) -> dict:
+    return {
+        "model_name": f"bench/model-{i % 4}",
+        "prompt": f"prompt {i // 4}",
+        "status": "ok",
+        "response": response,
+        "duration_ms": 100,
+        "http_status": 200,
+        "prompt_tokens": 12,
+        "completion_tokens": 340,
+    }
+
+
+def _row_by_row(db: Database, rows: int, response: str, prompt_id: int, model_id: int) -> None:
+    for i in range(rows):
+        db.log_request(**_log_row(i, response))
+        db.save_result(prompt_id, model_id, response)
+
+
+def _batched(
+    db: Database, rows: int, response: str, prompt_id: int, model_id: int, batch: int
+) -> None:
+    for start in range(0, rows, batch):
+        count = min(batch, rows - start)
+        with db.transaction():
+            db.log_requests_many([_log_row(start + i, response) for i in range(count)])
+            db.save_results_many(
+                [
+                    {"prompt_id": prompt_id, "model_id": model_id, "response": response}
+                    for _ in range(count)
+                ]
+            )
+
+
+def _run(label: str, profile: ConnectionProfile, args: argparse.Namespace) -> None:
+    response = "x" * args.response_bytes
+    timings = {}
+    for mode in ("row", "many"):
+        with tempfile.TemporaryDirectory() as tmp:
+            db = Database(Path(tmp) / "bench.db", profile)
+            try:
+                prompt_id = db.create_prompt("bench")
+                model_id = db.create_model("bench/model", "http://127.0.0.1/", "KEY")
+                started = time.perf_counter()
+                if mode == "row":
+                    _row_by_row(db, args.rows, response, prompt_id, model_id)
+                else:
+                    _batched(db, args.rows, response, prompt_id, model_id, args.batch)
+                timings[mode] = time.perf_counter() - started
+            finally:
+                db.close()
+    # На строку — запись в request_logs и в results.
+    row_rate = args.rows / timings["row"]
+    many_rate = args.rows / timings["many"]
+    print(
+        f"{label:<7} по строке {row_rate:8.0f} строк/с, "
+        f"пачками по {args.batch}: {many_rate:8.0f} строк/с "
+        f"(×{many_rate / row_rate:.1f})"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--batch", type=int, default=50)
+    parser.add_argument("--response-bytes", type=int, default=2000)
+    parser.add_argument("--profile", choices=("all", *PROFILES), default="all")
+    args = parser.parse_args()
+    for label, profile in PROFILES.items():
+        if args.profile in ("all", label):
+            _run(label, profile, args)
+
+
+if __name__ == "__main__":
+    main()
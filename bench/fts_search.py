@@ -0,0 +1,116 @@
+"""
+Бенчмарк поиска по логам: LIKE '%q%' против FTS5 (bm25 + snippet).
+
+    python -m bench.fts_search --rows 1000000
+
+Заполняет временную БД --rows строками request_logs (FTS-индекс ведут триггеры)
+и меряет search_logs для редкого, среднего и частого слова, имени модели и
+запроса из двух слов. LIKE — тот же метод с Database.fts = False. Печатает
+размер request_logs и её FTS-индекса (dbstat).
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from db import Database
+from retry import percentile
+
+MODELS = ("openai/gpt-4o-mini", "deepseek/deepseek-chat", "google/gemma-2-9b-it", "groq/llama-3.1-8b")
+STATUSES = ("ok",) * 18 + ("error", "retry")
+VOCABULARY = 20_000
+
+
+def _word(rng: random.Random) -> str:
+    # Zipf-подобное распределение: слово N встречается примерно в 1/N раз реже первого.
+    rank = min(int(rng.paretovariate(1.0)), VOCABULARY)
+    return f"w{rank}"
+
+
+def _fill(db: Database, rows: int, words: int, batch: int) -> float:
+    rng = random.Random(42)
+    started = time.perf_counter()
+    for start in range(0, rows, batch):
+        count = min(batch, rows - start)
+        with db.transaction():
+            db.log_requests_many(
+                [
+                    {
+                        "model_name": MODELS[i % len(MODELS)],
+                        "prompt": f"prompt {(start + i) // 4} " + _word(rng),
+                        "status": rng.choice(STATUSES),
+                        "response": " ".join(_word(rng) for _ in range(words)),
+                        "duration_ms": 100,
+                    }
+                    for i in range(count)
+                ]
+            )
+    return time.perf_counter() - started
+
+
+def _mb(size: int) -> float:
+    return size / 1024 / 1024
+
+
+def _measure(db: Database, query: str, repeat: int) -> tuple[float, int]:
+    timings = []
+    found = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        found = len(db.search_logs(query))
+        timings.append((time.perf_counter() - started) * 1000)
+    return percentile(timings, 50) or 0.0, found
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--words", type=int, default=40, help="слов в ответе")
+    parser.add_argument("--batch", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    queries = {
+        "редкое слово": "w5000",
+        "среднее": "w300",
+        "частое": "w2",
+        "модель": "deepseek",
+        "два слова": "w50 w70",
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "bench.db"
+        db = Database(path)
+        try:
+            if not db.fts:
+                raise SystemExit("SQLite собран без FTS5")
+            elapsed = _fill(db, args.rows, args.words, args.batch)
+            size_mb = path.stat().st_size / 1024 / 1024
+            sizes = db.table_sizes()
+            print(
+                f"{args.rows} строк за {elapsed:.1f} с ({args.rows / elapsed:.0f} строк/с "
+                f"с триггерами FTS), БД {size_mb:.0f} МБ"
+            )
+            if sizes:
+                print(
+                    f"request_logs {_mb(sizes.get('request_logs', 0)):.1f} МБ, "
+                    f"request_logs_fts {_mb(sizes.get('request_logs_fts', 0)):.1f} МБ"
+                )
+            for label, query in queries.items():
+                db.fts = False
+                like_ms, like_found = _measure(db, query, args.repeat)
+                db.fts = True
+                fts_ms, fts_found = _measure(db, query, args.repeat)
+                print(
+                    f"{label:<13} {query!r:<10} LIKE {like_ms:8.1f} мс ({like_found}), "
+                    f"FTS5 {fts_ms:8.1f} мс ({fts_found})"
+                )
+        finally:
+            db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Бенчмарк пула HTTP-клиентов: новый httpx.Client на запрос против get_client().
+
+Локальный mock_server считает принятые TCP-соединения. Запуск из корня проекта:
+
+    python -m bench.http_pool --requests 200
+
+Заглушка работает по HTTP без TLS, поэтому выигрыш здесь — TCP-рукопожатия и
+создание клиента (SSL-контекст, пул); на реальном HTTPS (OpenRouter) к ним
+добавляются TLS-рукопожатие и DNS.
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+
+import httpx
+
+from mock_server import MockConfig, MockServer
+from models import ActiveModel
+from network import close_clients, send_prompt
+
+
+def _per_call_client(model: ActiveModel) -> None:
+    """Поведение до пула: свой клиент (и своё соединение) на каждый запрос."""
+    with httpx.Client(timeout=10.0) as client:
+        client.post(model.api_url, json={"model": model.name}).raise_for_status()
+
+
+def _pooled_client(model: ActiveModel) -> None:
+    send_prompt(model, "ping", timeout_sec=10.0)
+
+
+def _run(label: str, fn, model: ActiveModel, n: int, server: MockServer) -> None:
+    server.reset_stats()
+    started = time.perf_counter()
+    for _ in range(n):
+        fn(model)
+    elapsed = time.perf_counter() - started
+    print(
+        f"{label:<16} {n} запросов за {elapsed:.3f} с "
+        f"({elapsed / n * 1000:.2f} мс/запрос), "
+        f"TCP-соединений: {server.stats().connections}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+
+    with MockServer(MockConfig(latency="fixed:0", answer_words=1)) as server:
+        model = ActiveModel(
+            id=0, name="stub", api_url=server.url, api_id="", api_key="x"
+        )
+        try:
+            _run("per-call client", _per_call_client, model, args.requests, server)
+            _run("pooled client", _pooled_client, model, args.requests, server)
+        finally:
+            close_clients()
+
+
+if __name__ == "__main__":
+    main()
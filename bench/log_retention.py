@@ -0,0 +1,91 @@
+"""
+Бенчмарк обслуживания: срок хранения request_logs, сводки и incremental vacuum.
+
+    python -m bench.log_retention --rows 100000 --days 120 --keep-days 30
+
+Заполняет временную БД логами за --days дней, затем проход
+maintenance.run_maintenance с --keep-days: удаление со сводками по часам,
+слияние FTS-индекса, incremental vacuum. Печатает размер файла до и после и
+сверяет сводки с удалёнными строками.
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from db import Database
+from maintenance import RetentionPolicy, run_maintenance
+
+MODELS = ("openai/gpt-4o-mini", "deepseek/deepseek-chat", "groq/llama-3.1-8b")
+STATUSES = ("ok",) * 18 + ("error", "retry")
+
+
+def _fill(db: Database, rows: int, days: int, words: int, batch: int) -> None:
+    rng = random.Random(3)
+    now = datetime.now(timezone.utc)
+    step = timedelta(days=days) / max(1, rows)
+    for start in range(0, rows, batch):
+        count = min(batch, rows - start)
+        db.log_requests_many(
+            [
+                {
+                    "created_at": (now - step * (rows - start - i)).isoformat(timespec="seconds"),
+                    "model_name": MODELS[i % len(MODELS)],
+                    "prompt": f"prompt {start + i}",
+                    "status": rng.choice(STATUSES),
+                    "response": " ".join(f"w{rng.randrange(5000)}" for _ in range(words)),
+                    "duration_ms": int(rng.lognormvariate(7, 0.6)),
+                }
+                for i in range(count)
+            ]
+        )
+
+
+def _size_mb(path: Path) -> float:
+    return sum(p.stat().st_size for p in path.parent.glob(path.name + "*")) / 1024 / 1024
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--days", type=int, default=120, help="логи за столько дней")
+    parser.add_argument("--keep-days", type=int, default=30)
+    parser.add_argument("--words", type=int, default=40, help="слов в ответе")
+    parser.add_argument("--batch", type=int, default=5000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "bench.db"
+        db = Database(path)
+        try:
+            _fill(db, args.rows, args.days, args.words, args.batch)
+            db.vacuum()
+            before_mb = _size_mb(path)
+            cutoff = (datetime.now(timezone.utc) - timedelta(days=args.keep_days)).isoformat()
+            old = [r for r in db.list_logs(limit=-1) if r["created_at"] < cutoff]
+            report = run_maintenance(db, RetentionPolicy(max_age_days=args.keep_days, max_rows=0))
+            db.checkpoint("TRUNCATE")
+            after_mb = _size_mb(path)
+            rollups = db.list_log_rollups()
+            started = time.perf_counter()
+            db.list_logs_page()
+            page_ms = (time.perf_counter() - started) * 1000
+        finally:
+            db.close()
+    requests = sum(r["requests"] for r in rollups)
+    duration = sum(r["duration_ms_sum"] for r in rollups)
+    print(report.format())
+    print(f"БД {before_mb:.1f} МБ -> {after_mb:.1f} МБ, первая страница логов {page_ms:.1f} мс")
+    print(
+        f"сводок {len(rollups)}: запросов {requests} (удалено {len(old)}), "
+        f"duration_ms {duration} (удалено {sum(r['duration_ms'] for r in old)})"
+    )
+
+
+if __name__ == "__main__":
+    main()
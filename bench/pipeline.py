@@ -0,0 +1,203 @@
+"""
+Сквозной бенчмарк: отправка → request_logs → results против mock_server.
+
+Запуск из корня проекта (реальные ключи и квота не нужны):
+
+    python -m bench.pipeline --prompts 50 --models 4 --latency lognormal:200,0.5
+    python -m bench.pipeline --mode batch --prompts 200 --concurrency 16 --error-rate 0.05
+    python -m bench.pipeline --record runs/mock.jsonl.gz --stream
+    python -m bench.pipeline --replay runs/prod.jsonl.gz --latency-scale 0 --prompts 5000
+
+worker — как кнопка «Отправить»: SendWorker.run() на промт, затем сохранение
+ответов одной пачкой (как «Сохранить»). batch — batch.run_batch по всем промтам сразу.
+--replay отвечает из кассеты (см. cassette.py) вместо сети: модели берутся
+из записи, mock_server запросов не получает.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import cassette
+from db import Database
+from mock_server import MockServer, add_config_arguments, config_from_args
+from network import close_clients
+from retry import percentile
+
+KEY_ENV = "CHATLIST_BENCH_KEY"
+
+
+def _peak_rss_mb() -> float | None:
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024.0  # Linux: КБ
+
+
+def _prepare_db(path: Path, url: str, names: list[str], stream: bool) -> None:
+    db = Database(path)
+    try:
+        for name in names:
+            db.create_model(name, url, KEY_ENV, is_active=True)
+        db.set_setting("stream_responses", "1" if stream else "0")
+    finally:
+        db.close()
+
+
+def _run_worker(path: Path, prompts: list[str], args: argparse.Namespace) -> list[float]:
+    from main import SendWorker  # PyQt6 нужен только этому режиму
+
+    rounds: list[float] = []
+    db = Database(path)
+    try:
+        for text in prompts:
+            prompt_id = db.create_prompt(text)
+            items: list[tuple[int, str, str]] = []
+            errors: list[str] = []
+            worker = SendWorker(
+                text,
+                args.timeout,
+                args.concurrency,
+                stream=args.stream,
+                use_cache=False,
+                db_path=path,
+            )
+            worker.finished_ok.connect(items.extend)
+            worker.finished_err.connect(errors.append)
+            started = time.perf_counter()
+            worker.run()
+            if errors:
+                raise SystemExit(errors[0])
+            db.save_results_many(
+                [
+                    {"prompt_id": prompt_id, "model_id": model_id, "response": response}
+                    for model_id, _name, response in items
+                ]
+            )
+            rounds.append((time.perf_counter() - started) * 1000)
+    finally:
+        db.close()
+    return rounds
+
+
+def _run_batch(path: Path, prompts: list[str], args: argparse.Namespace) -> list[float]:
+    from batch import BatchPrompt, run_batch
+    from models import get_active_models
+    from retry import policy_from_settings
+
+    db = Database(path)
+    try:
+        items = [BatchPrompt(db.create_prompt(text), text) for text in prompts]
+        run_batch(
+            db,
+            items,
+            get_active_models(db),
+            concurrency=args.concurrency,
+            timeout_sec=args.timeout,
+            policy=policy_from_settings(db),
+            use_cache=False,
+        )
+    finally:
+        db.close()
+    return []
+
+
+def _fmt(values: list[float], q: float) -> str:
+    value = percentile(values, q)
+    return "—" if value is None else f"{value:.0f}"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--mode", choices=("worker", "batch"), default="worker")
+    parser.add_argument("--prompts", type=int, default=50)
+    parser.add_argument("--models", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--stream", action="store_true", help="SSE вместо JSON")
+    parser.add_argument(
+        "--trace-memory",
+        action="store_true",
+        help="пик памяти Python через tracemalloc (замедляет прогон)",
+    )
+    add_config_arguments(parser)
+    cassette.add_arguments(parser)
+    args = parser.parse_args()
+    config = config_from_args(args)
+    tape = cassette.configure_from_args(args)
+    names = [f"mock/model-{i}" for i in range(args.models)]
+    if tape is not None and tape.mode == "replay" and tape.models():
+        # Модели из записи — чтобы ответы совпадали хотя бы по модели.
+        names = tape.models()[: args.models]
+
+    os.environ[KEY_ENV] = "bench"
+    prompts = [f"bench prompt {i}" for i in range(args.prompts)]
+    with tempfile.TemporaryDirectory() as tmp, MockServer(config) as server:
+        path = Path(tmp) / "bench.db"
+        _prepare_db(path, server.url, names, args.stream)
+        if args.trace_memory:
+            tracemalloc.start()
+        started = time.perf_counter()
+        try:
+            run = _run_worker if args.mode == "worker" else _run_batch
+            rounds = run(path, prompts, args)
+        finally:
+            close_clients()
+        elapsed = time.perf_counter() - started
+        traced_peak = tracemalloc.get_traced_memory()[1] if args.trace_memory else None
+        tracemalloc.stop()
+
+        db = Database(path)
+        try:
+            logs = db.list_logs(limit=args.prompts * len(names) * 10)
+            saved = len(db.list_results())
+        finally:
+            db.close()
+        stats = server.stats()
+
+    final = [r for r in logs if r["status"] in ("ok", "error", "skipped")]
+    durations = [float(r["duration_ms"]) for r in final if r["status"] == "ok"]
+    ttfts = [float(r["ttft_ms"]) for r in final if r["ttft_ms"] is not None]
+    errors = sum(1 for r in final if r["status"] != "ok")
+    print(
+        f"режим {args.mode}: {len(final)} запросов ({errors} с ошибкой), "
+        f"сохранено {saved} ответов за {elapsed:.2f} с — "
+        f"{len(final) / elapsed:.1f} запр/с"
+    )
+    print(
+        f"задержка запроса, мс: p50 {_fmt(durations, 50)}, p95 {_fmt(durations, 95)}, "
+        f"p99 {_fmt(durations, 99)}"
+    )
+    if ttfts:
+        print(f"до первого токена, мс: p50 {_fmt(ttfts, 50)}, p95 {_fmt(ttfts, 95)}")
+    if rounds:
+        print(f"промт целиком, мс: p50 {_fmt(rounds, 50)}, p95 {_fmt(rounds, 95)}")
+    print(
+        f"сервер: HTTP-запросов {stats.requests}, TCP-соединений {stats.connections}, "
+        f"коды {dict(sorted(stats.by_status.items()))}"
+    )
+    body = sum(r["response_bytes"] or 0 for r in final)
+    if body:
+        wire = sum(r["wire_bytes"] or 0 for r in final)
+        print(f"тела ответов: {body / 1024:.0f} КБ, по сети {wire / 1024:.0f} КБ")
+    memory = []
+    rss = _peak_rss_mb()
+    if rss is not None:
+        memory.append(f"пик RSS {rss:.0f} МБ")
+    if traced_peak is not None:
+        memory.append(f"пик Python-кучи {traced_peak / 1024 / 1024:.1f} МБ")
+    if memory:
+        print("память: " + ", ".join(memory))
+    if tape is not None:
+        print(tape.describe())
+
+
+if __name__ == "__main__":
+    main()
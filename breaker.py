@@ -0,0 +1,163 @@
+"""Предохранитель (circuit breaker) на модель: пропуск стабильно падающих эндпоинтов."""
+
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+
+from db import Database
+
+DEFAULT_THRESHOLD = 3
+DEFAULT_COOLDOWN_SEC = 120.0
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Решения allow(): отправлять как обычно, пропустить, пропустить и проверить в фоне.
+PASS = "pass"
+SKIP = "skip"
+PROBE = "probe"
+
+
+@dataclass(frozen=True)
+class BreakerState:
+    model_name: str
+    state: str
+    failures: int
+    retry_in_sec: float
+
+
+class CircuitBreaker:
+    """
+    Размыкается после threshold ошибок подряд. Пока разомкнут — запросы к модели
+    не уходят; по истечении cooldown одна фоновая проверка (half-open) решает,
+    замкнуть его снова или продлить паузу.
+    """
+
+    def __init__(self, model_name: str) -> None:
+        self.model_name = model_name
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+
+    def allow(self, now: float | None = None) -> str:
+        now = time.time() if now is None else now
+        with self._lock:
+            if _threshold <= 0 or self._failures < _threshold:
+                return PASS
+            if self._probing:
+                return SKIP
+            if now - self._opened_at >= _cooldown_sec:
+                self._probing = True
+                return PROBE
+            return SKIP
+
+    def record(self, ok: bool, now: float | None = None) -> None:
+        now = time.time() if now is None else now
+        with self._lock:
+            self._probing = False
+            if ok:
+                self._failures = 0
+                return
+            self._failures += 1
+            if _threshold > 0 and self._failures >= _threshold:
+                self._opened_at = now
+
+    def restore(self, failures: int, last_failure_at: float) -> None:
+        """Состояние из БД (после перезапуска или записей другого процесса)."""
+        with self._lock:
+            if self._probing:
+                return
+            self._failures = failures
+            self._opened_at = last_failure_at
+
+    def state(self, now: float | None = None) -> BreakerState:
+        now = time.time() if now is None else now
+        with self._lock:
+            if _threshold <= 0 or self._failures < _threshold:
+                name, retry_in = CLOSED, 0.0
+            elif self._probing:
+                name, retry_in = HALF_OPEN, 0.0
+            else:
+                name = OPEN
+                retry_in = max(0.0, self._opened_at + _cooldown_sec - now)
+            return BreakerState(self.model_name, name, self._failures, retry_in)
+
+
+_threshold = DEFAULT_THRESHOLD
+_cooldown_sec = DEFAULT_COOLDOWN_SEC
+_db_path: Path | None = None
+_breakers: dict[str, CircuitBreaker] = {}
+_registry_lock = threading.Lock()
+
+
+def breaker_for(model_name: str) -> CircuitBreaker:
+    with _registry_lock:
+        breaker = _breakers.get(model_name)
+        if breaker is None:
+            breaker = CircuitBreaker(model_name)
+            _breakers[model_name] = breaker
+        return breaker
+
+
+def _epoch(iso: str | None) -> float:
+    if not iso:
+        return 0.0
+    try:
+        return datetime.fromisoformat(iso).timestamp()
+    except ValueError:
+        return 0.0
+
+
+def configure_from_settings(db: Database) -> None:
+    """Порог и пауза из settings, состояние моделей — из model_health."""
+    global _threshold, _cooldown_sec, _db_path
+    try:
+        _threshold = int(db.get_setting("breaker_threshold", "") or DEFAULT_THRESHOLD)
+    except ValueError:
+        _threshold = DEFAULT_THRESHOLD
+    try:
+        _cooldown_sec = float(
+            db.get_setting("breaker_cooldown_sec", "") or DEFAULT_COOLDOWN_SEC
+        )
+    except ValueError:
+        _cooldown_sec = DEFAULT_COOLDOWN_SEC
+    _db_path = db.db_path
+    for row in db.list_model_health():
+        breaker_for(row["model_name"]).restore(
+            int(row["consecutive_failures"]), _epoch(row["last_failure_at"])
+        )
+
+
+def record_probe(model_name: str, ok: bool, duration_ms: int, detail: str) -> None:
+    """Итог фоновой проверки: обновляет предохранитель и пишет его в request_logs."""
+    breaker_for(model_name).record(ok)
+    if _db_path is None:
+        return
+    db = Database(_db_path)
+    try:
+        db.log_request(
+            model_name=model_name,
+            prompt="[probe]",
+            status="probe_ok" if ok else "probe_error",
+            response=detail,
+            duration_ms=duration_ms,
+        )
+    finally:
+        db.close()
+
+
+def snapshot() -> list[BreakerState]:
+    with _registry_lock:
+        breakers = list(_breakers.values())
+    return [b.state() for b in breakers]
+
+
+def open_models() -> list[BreakerState]:
+    """Модели, которые сейчас пропускаются (разомкнутые и на проверке)."""
+    return [s for s in snapshot() if s.state != CLOSED]
@@ -0,0 +1,135 @@
+"""Кэш ответов моделей: LRU в памяти с лимитом по размеру + таблица response_cache с TTL."""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from adapters import detect_provider
+from db import Database
+from models import ActiveModel
+
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+DEFAULT_TTL_SEC = 7 * 24 * 3600
+
+
+@dataclass(frozen=True)
+class CacheStats:
+    hits: int
+    disk_hits: int
+    misses: int
+    entries: int
+    bytes: int
+
+
+def cache_key(model: ActiveModel, payload: dict) -> str:
+    """Хэш (провайдер, URL, payload). Ключ API в хэш не входит."""
+    material = json.dumps(
+        {
+            "provider": detect_provider(model.api_url),
+            "api_url": model.api_url,
+            "payload": payload,
+        },
+        ensure_ascii=False,
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Потокобезопасный LRU; промах в памяти проверяется в БД вызывающего потока."""
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+        self.max_bytes = max_bytes
+        self.ttl_sec = DEFAULT_TTL_SEC
+        self._lock = threading.Lock()
+        self._items: OrderedDict[str, str] = OrderedDict()
+        self._bytes = 0
+        self._hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+
+    @staticmethod
+    def _size(value: str) -> int:
+        return len(value.encode("utf-8"))
+
+    def _remember(self, key: str, value: str) -> None:
+        old = self._items.pop(key, None)
+        if old is not None:
+            self._bytes -= self._size(old)
+        size = self._size(value)
+        if size > self.max_bytes:
+            return
+        self._items[key] = value
+        self._bytes += size
+        while self._bytes > self.max_bytes and self._items:
+            _, evicted = self._items.popitem(last=False)
+            self._bytes -= self._size(evicted)
+
+    def get(self, key: str, db: Database | None = None) -> str | None:
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+                self._hits += 1
+                return value
+        value = db.cache_get(key) if db is not None else None
+        with self._lock:
+            if value is None:
+                self._misses += 1
+                return None
+            self._disk_hits += 1
+            self._remember(key, value)
+            return value
+
+    def put(
+        self,
+        key: str,
+        value: str,
+        *,
+        model_name: str = "",
+        db: Database | None = None,
+    ) -> None:
+        with self._lock:
+            self._remember(key, value)
+        if db is not None:
+            db.cache_put(key, model_name, value, self.ttl_sec)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+            self._bytes = 0
+
+    def stats(self) -> CacheStats:
+        with self._lock:
+            return CacheStats(
+                hits=self._hits,
+                disk_hits=self._disk_hits,
+                misses=self._misses,
+                entries=len(self._items),
+                bytes=self._bytes,
+            )
+
+
+response_cache = ResponseCache()
+
+
+def configure_from_settings(db: Database) -> None:
+    """cache_max_mb и cache_ttl_sec из settings; заодно чистит просроченные записи."""
+    try:
+        max_mb = float(db.get_setting("cache_max_mb", "") or 0)
+    except ValueError:
+        max_mb = 0
+    try:
+        ttl = float(db.get_setting("cache_ttl_sec", "") or 0)
+    except ValueError:
+        ttl = 0
+    response_cache.max_bytes = (
+        int(max_mb * 1024 * 1024) if max_mb > 0 else DEFAULT_MAX_BYTES
+    )
+    response_cache.ttl_sec = ttl if ttl > 0 else DEFAULT_TTL_SEC
+    db.cache_purge_expired()
@@ -0,0 +1,573 @@
+"""
+Кассета HTTP-обмена с API: запись пар запрос/ответ с таймингами и чанками SSE
+и воспроизведение без сети — с исходной или масштабированной задержкой.
+
+Включается до первого запроса: флаги --record / --replay в chatlist и бенчмарках
+или переменные окружения для GUI:
+
+    CHATLIST_CASSETTE=runs/prod.jsonl.gz CHATLIST_CASSETTE_MODE=record python main.py
+    CHATLIST_CASSETTE=runs/prod.jsonl.gz CHATLIST_CASSETTE_SCALE=0.5 python main.py
+
+Проверка разбора записанных ответов (adapters.parse_*):
+
+    python -m cassette runs/prod.jsonl.gz
+"""
+
+from __future__ import annotations
+
+import argparse
+import base64
+import gzip
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from collections.abc import Callable, Iterator
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any
+from urllib.parse import urlsplit
+
+import httpx
+
+from adapters import (
+    SSE_DONE,
+    parse_chat_content,
+    parse_chat_delta,
+    parse_usage,
+    sse_data,
+)
+
+FORMAT_VERSION = 1
+PATH_ENV = "CHATLIST_CASSETTE"
+MODE_ENV = "CHATLIST_CASSETTE_MODE"
+SCALE_ENV = "CHATLIST_CASSETTE_SCALE"
+MODES = ("record", "replay")
+
+# Заголовки ответа, которые не пишутся: служебные для соединения и куки.
+_SKIP_HEADERS = frozenset(
+    {"connection", "content-length", "date", "keep-alive", "set-cookie", "transfer-encoding"}
+)
+
+# Пауза воспроизведения; True — запрос отменён.
+Wait = Callable[[float], bool]
+
+
+class CassetteMiss(httpx.TransportError):
+    """В кассете нет ответа на такой запрос (режим strict)."""
+
+
+@dataclass
+class Interaction:
+    """Один обмен: запрос без заголовков (ключи не пишутся) и ответ по чанкам."""
+
+    key: str
+    method: str
+    url: str
+    request: Any
+    status: int
+    headers: dict[str, str]
+    # Время до заголовков ответа и смещения чанков от начала запроса, мс.
+    ttfb_ms: float
+    chunks: list[tuple[float, bytes]] = field(default_factory=list)
+    # False — тело дочитано не до конца (отмена, проигравший дубль хеджа).
+    complete: bool = True
+    recorded_at: str = ""
+
+    @property
+    def model(self) -> str:
+        return _shape(self.request)[0]
+
+    @property
+    def body(self) -> bytes:
+        return b"".join(data for _offset, data in self.chunks)
+
+    def to_json(self) -> dict[str, Any]:
+        return {
+            "key": self.key,
+            "method": self.method,
+            "url": self.url,
+            "request": self.request,
+            "status": self.status,
+            "headers": self.headers,
+            "ttfb_ms": self.ttfb_ms,
+            "chunks": [[offset, _encode_chunk(data)] for offset, data in self.chunks],
+            "complete": self.complete,
+            "recorded_at": self.recorded_at,
+        }
+
+    @classmethod
+    def from_json(cls, row: dict[str, Any]) -> Interaction:
+        return cls(
+            key=row["key"],
+            method=row.get("method", "POST"),
+            url=row.get("url", ""),
+            request=row.get("request"),
+            status=int(row["status"]),
+            headers=dict(row.get("headers") or {}),
+            ttfb_ms=float(row.get("ttfb_ms") or 0.0),
+            chunks=[(float(offset), _decode_chunk(data)) for offset, data in row["chunks"]],
+            complete=bool(row.get("complete", True)),
+            recorded_at=row.get("recorded_at", ""),
+        )
+
+
+def _encode_chunk(data: bytes) -> str | dict[str, str]:
+    """Текст — как есть; сжатое тело или разрезанный UTF-8 — в base64."""
+    try:
+        return data.decode("utf-8")
+    except UnicodeDecodeError:
+        return {"b64": base64.b64encode(data).decode("ascii")}
+
+
+def _decode_chunk(data: str | dict[str, str]) -> bytes:
+    if isinstance(data, dict):
+        return base64.b64decode(data["b64"])
+    return data.encode("utf-8")
+
+
+def _request_body(request: httpx.Request) -> Any:
+    raw = request.read()
+    try:
+        return json.loads(raw) if raw else None
+    except ValueError:
+        return raw.decode("utf-8", "replace")
+
+
+def _shape(body: Any) -> tuple[str, bool]:
+    """Модель и stream запроса: подменный ответ должен совпасть по обоим."""
+    if not isinstance(body, dict):
+        return "", False
+    return str(body.get("model", "")), bool(body.get("stream"))
+
+
+def request_key(method: str, url: str, body: Any) -> str:
+    """
+    Ключ сопоставления: метод, путь и тело с отсортированными ключами.
+    Хост не входит — запись с mock_server на одном порту играет и на другом.
+    """
+    canonical = json.dumps(
+        [method.upper(), urlsplit(url).path, body],
+        ensure_ascii=False,
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def load(path: Path) -> list[Interaction]:
+    """Читает кассету; оборванный хвост (запись прервана) пропускается."""
+    interactions: list[Interaction] = []
+    with gzip.open(path, "rt", encoding="utf-8") as fh:
+        try:
+            for line in fh:
+                line = line.strip()
+                if not line:
+                    continue
+                row = json.loads(line)
+                if "cassette" in row:
+                    continue
+                interactions.append(Interaction.from_json(row))
+        except (EOFError, gzip.BadGzipFile, ValueError):
+            pass
+    return interactions
+
+
+class Cassette:
+    """
+    Файл .jsonl.gz: строка на обмен. При записи каждая строка сбрасывается
+    на диск сразу (Z_SYNC_FLUSH), так что кассета читается и после падения.
+    Повторы одного запроса воспроизводятся по кругу в порядке записи.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        mode: str,
+        *,
+        scale: float = 1.0,
+        strict: bool = False,
+    ) -> None:
+        if mode not in MODES:
+            raise ValueError(f"Неизвестный режим кассеты: {mode}")
+        self.path = Path(path)
+        self.mode = mode
+        self.scale = max(0.0, scale)
+        self.strict = strict
+        self._lock = threading.Lock()
+        self._writer: gzip.GzipFile | None = None
+        self._created = False
+        self.recorded = 0
+        self.replayed = 0
+        self.misses = 0
+        self._by_key: dict[str, list[Interaction]] = {}
+        self._by_model: dict[tuple[str, bool], list[Interaction]] = {}
+        self._by_stream: dict[bool, list[Interaction]] = {}
+        self._cursors: dict[object, int] = {}
+        if mode == "replay":
+            for item in load(self.path):
+                if not item.complete:
+                    continue
+                shape = _shape(item.request)
+                self._by_key.setdefault(item.key, []).append(item)
+                self._by_model.setdefault(shape, []).append(item)
+                self._by_stream.setdefault(shape[1], []).append(item)
+
+    def __len__(self) -> int:
+        if self.mode == "record":
+            return self.recorded
+        return sum(len(items) for items in self._by_key.values())
+
+    def models(self) -> list[str]:
+        """Модели, ответы которых есть в кассете."""
+        return sorted({model for model, _stream in self._by_model if model})
+
+    def append(self, item: Interaction) -> None:
+        line = json.dumps(item.to_json(), ensure_ascii=False, separators=(",", ":"))
+        with self._lock:
+            if self._writer is None:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                # Первая запись перезаписывает файл; после close() — дописывает.
+                fresh = not self._created
+                self._writer = gzip.open(self.path, "wb" if fresh else "ab")
+                if fresh:
+                    header = {"cassette": FORMAT_VERSION, "created_at": _now()}
+                    self._writer.write((json.dumps(header) + "\n").encode("utf-8"))
+                    self._created = True
+            self._writer.write((line + "\n").encode("utf-8"))
+            self._writer.flush()
+            self.recorded += 1
+
+    def _next(self, key: object, items: list[Interaction]) -> Interaction:
+        cursor = self._cursors.get(key, 0)
+        self._cursors[key] = cursor + 1
+        return items[cursor % len(items)]
+
+    def find(self, key: str, body: Any) -> Interaction | None:
+        """
+        Точное совпадение запроса; без strict — любой ответ той же модели
+        (или любой модели) с тем же stream: прогон 10 000 промтов по записи на 50.
+        """
+        shape = _shape(body)
+        with self._lock:
+            items = self._by_key.get(key)
+            if items:
+                self.replayed += 1
+                return self._next(key, items)
+            self.misses += 1
+            if self.strict:
+                return None
+            items = self._by_model.get(shape)
+            if items:
+                return self._next(shape, items)
+            items = self._by_stream.get(shape[1])
+            if items:
+                return self._next(shape[1], items)
+            return None
+
+    def close(self) -> None:
+        with self._lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+
+    def describe(self) -> str:
+        if self.mode == "record":
+            return f"кассета {self.path}: записано обменов {self.recorded}"
+        return (
+            f"кассета {self.path}: воспроизведено {self.replayed}, "
+            f"без точного совпадения {self.misses} (масштаб задержки {self.scale:g})"
+        )
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+def _response_headers(headers: httpx.Headers) -> dict[str, str]:
+    return {k: v for k, v in headers.items() if k.lower() not in _SKIP_HEADERS}
+
+
+class _RecordingStream(httpx.SyncByteStream):
+    def __init__(
+        self,
+        stream: httpx.SyncByteStream,
+        item: Interaction,
+        started: float,
+        cassette: Cassette,
+    ) -> None:
+        self._stream = stream
+        self._item = item
+        self._started = started
+        self._cassette = cassette
+        self._done = False
+        self._saved = False
+
+    def __iter__(self) -> Iterator[bytes]:
+        for data in self._stream:
+            offset = round((time.perf_counter() - self._started) * 1000, 1)
+            self._item.chunks.append((offset, data))
+            yield data
+        self._done = True
+
+    def close(self) -> None:
+        try:
+            self._stream.close()
+        finally:
+            if not self._saved:
+                self._saved = True
+                self._item.complete = self._done
+                self._cassette.append(self._item)
+
+
+class RecordingTransport(httpx.BaseTransport):
+    """Пропускает запросы в настоящий транспорт и пишет обмен в кассету."""
+
+    def __init__(self, transport: httpx.BaseTransport, cassette: Cassette) -> None:
+        self._transport = transport
+        self._cassette = cassette
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        body = _request_body(request)
+        url = str(request.url)
+        started = time.perf_counter()
+        response = self._transport.handle_request(request)
+        item = Interaction(
+            key=request_key(request.method, url, body),
+            method=request.method,
+            url=url,
+            request=body,
+            status=response.status_code,
+            headers=_response_headers(response.headers),
+            ttfb_ms=round((time.perf_counter() - started) * 1000, 1),
+            recorded_at=_now(),
+        )
+        return httpx.Response(
+            response.status_code,
+            headers=response.headers,
+            stream=_RecordingStream(response.stream, item, started, self._cassette),
+            extensions=response.extensions,
+        )
+
+    def close(self) -> None:
+        self._transport.close()
+
+
+class _ReplayStream(httpx.SyncByteStream):
+    def __init__(
+        self,
+        item: Interaction,
+        started: float,
+        scale: float,
+        wait: Wait,
+        read_timeout: float | None,
+    ) -> None:
+        self._item = item
+        self._started = started
+        self._scale = scale
+        self._wait = wait
+        self._read_timeout = read_timeout
+
+    def __iter__(self) -> Iterator[bytes]:
+        for offset, data in self._item.chunks:
+            _pause(
+                self._started + offset * self._scale / 1000.0,
+                self._wait,
+                self._read_timeout,
+            )
+            yield data
+
+
+def _pause(until: float, wait: Wait, read_timeout: float | None) -> None:
+    """Ждёт момента until (perf_counter); таймаут чтения и отмена — как у сокета."""
+    delay = until - time.perf_counter()
+    if delay <= 0:
+        return
+    if read_timeout is not None and delay > read_timeout:
+        if wait(read_timeout):
+            raise httpx.ReadError("cancelled")
+        raise httpx.ReadTimeout("cassette replay: read timed out")
+    if wait(delay):
+        raise httpx.ReadError("cancelled")
+
+
+class ReplayTransport(httpx.BaseTransport):
+    """Отвечает из кассеты, без сети; задержки — записанные × scale."""
+
+    def __init__(self, cassette: Cassette, wait: Wait) -> None:
+        self._cassette = cassette
+        self._wait = wait
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        started = time.perf_counter()
+        body = _request_body(request)
+        url = str(request.url)
+        item = self._cassette.find(request_key(request.method, url, body), body)
+        if item is None:
+            raise CassetteMiss(f"нет записи в кассете для {request.method} {url}", request=request)
+        timeouts = request.extensions.get("timeout") or {}
+        read_timeout = timeouts.get("read")
+        scale = self._cassette.scale
+        _pause(started + item.ttfb_ms * scale / 1000.0, self._wait, read_timeout)
+        return httpx.Response(
+            item.status,
+            headers=item.headers,
+            stream=_ReplayStream(item, started, scale, self._wait, read_timeout),
+        )
+
+
+_current: Cassette | None = None
+
+
+def current() -> Cassette | None:
+    return _current
+
+
+def configure(
+    path: Path | str | None,
+    mode: str = "replay",
+    *,
+    scale: float = 1.0,
+    strict: bool = False,
+) -> Cassette | None:
+    """Включает кассету (path=None — выключает). Вызывать до первого запроса."""
+    global _current
+    if _current is not None:
+        _current.close()
+    _current = Cassette(Path(path), mode, scale=scale, strict=strict) if path else None
+    return _current
+
+
+def configure_from_env() -> Cassette | None:
+    """CHATLIST_CASSETTE (файл), CHATLIST_CASSETTE_MODE (record/replay), CHATLIST_CASSETTE_SCALE."""
+    path = os.getenv(PATH_ENV, "").strip()
+    if not path:
+        return None
+    mode = os.getenv(MODE_ENV, "").strip().lower() or "replay"
+    try:
+        scale = float(os.getenv(SCALE_ENV, "") or 1.0)
+    except ValueError:
+        scale = 1.0
+    return configure(path, mode, scale=scale)
+
+
+def wrap_transport(transport: httpx.BaseTransport, wait: Wait) -> httpx.BaseTransport:
+    """Транспорт клиента с учётом текущей кассеты."""
+    if _current is None:
+        return transport
+    if _current.mode == "record":
+        return RecordingTransport(transport, _current)
+    return ReplayTransport(_current, wait)
+
+
+def close() -> None:
+    if _current is not None:
+        _current.close()
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--record", type=Path, metavar="FILE", help="записать обмен с API в кассету")
+    group.add_argument("--replay", type=Path, metavar="FILE", help="отвечать из кассеты, без сети")
+    parser.add_argument(
+        "--latency-scale",
+        type=float,
+        default=1.0,
+        help="множитель записанных задержек при --replay (0 — без задержек)",
+    )
+    parser.add_argument(
+        "--strict-replay",
+        action="store_true",
+        help="ошибка на запрос, которого нет в кассете (иначе — ответ той же модели)",
+    )
+
+
+def configure_from_args(args: argparse.Namespace) -> Cassette | None:
+    if args.record:
+        return configure(args.record, "record")
+    if args.replay:
+        return configure(
+            args.replay, "replay", scale=args.latency_scale, strict=args.strict_replay
+        )
+    return None
+
+
+@dataclass
+class CheckReport:
+    interactions: int = 0
+    json_ok: int = 0
+    stream_ok: int = 0
+    http_errors: int = 0
+    with_usage: int = 0
+    body_bytes: int = 0
+    failures: list[str] = field(default_factory=list)
+
+
+def _check_one(item: Interaction, report: CheckReport) -> None:
+    response = httpx.Response(item.status, headers=item.headers, content=item.body)
+    report.body_bytes += len(item.body)
+    if item.status >= 400:
+        report.http_errors += 1
+        return
+    if "text/event-stream" in response.headers.get("content-type", ""):
+        usage = None
+        for line in response.iter_lines():
+            data = sse_data(line)
+            if not data or data == SSE_DONE:
+                continue
+            chunk = json.loads(data)
+            usage = parse_usage(chunk) or usage
+            parse_chat_delta(chunk)
+        report.stream_ok += 1
+    else:
+        data = response.json()
+        parse_chat_content(data)
+        usage = parse_usage(data)
+        report.json_ok += 1
+    if usage is not None:
+        report.with_usage += 1
+
+
+def check(interactions: list[Interaction]) -> CheckReport:
+    """Прогоняет записанные ответы через разбор adapters, как network."""
+    report = CheckReport()
+    for item in interactions:
+        if not item.complete:
+            continue
+        report.interactions += 1
+        try:
+            _check_one(item, report)
+        except (KeyError, IndexError, TypeError, ValueError) as exc:
+            report.failures.append(f"{item.model or item.url}: {exc}")
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m cassette",
+        description="Проверка разбора ответов, записанных в кассету",
+    )
+    parser.add_argument("path", type=Path)
+    args = parser.parse_args()
+    interactions = load(args.path)
+    report = check(interactions)
+    size = args.path.stat().st_size
+    print(
+        f"{args.path}: обменов {len(interactions)} "
+        f"(полных {report.interactions}), файл {size / 1024:.1f} КБ, "
+        f"тела ответов {report.body_bytes / 1024:.1f} КБ"
+    )
+    print(
+        f"разобрано: JSON {report.json_ok}, SSE {report.stream_ok}, "
+        f"с usage {report.with_usage}, HTTP-ошибок {report.http_errors}"
+    )
+    for failure in report.failures:
+        print(f"ошибка разбора — {failure}", file=sys.stderr)
+    sys.exit(1 if report.failures else 0)
+
+
+if __name__ == "__main__":
+    main()
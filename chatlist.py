@@ -0,0 +1,169 @@
+"""
+Командная строка ChatList:
+
+    python -m chatlist batch --file prompts.jsonl
+    python -m chatlist maintain --keep-days 30
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+from dataclasses import replace
+from pathlib import Path
+
+import breaker
+import cache
+import cassette
+import maintenance
+import network
+import ratelimit
+from batch import Progress, load_prompts, run_batch
+from db import Database
+from models import MissingApiKeyError, get_active_models
+from network import DEFAULT_MAX_IN_FLIGHT, close_clients
+from retry import policy_from_settings
+from timeouts import timeouts_for
+
+
+def _int_setting(db: Database, key: str, fallback: int) -> int:
+    try:
+        return int(float(db.get_setting(key, "") or fallback))
+    except ValueError:
+        return fallback
+
+
+def _batch(args: argparse.Namespace) -> int:
+    db = Database(args.db)
+    try:
+        try:
+            models = get_active_models(db)
+        except MissingApiKeyError as exc:
+            print(exc, file=sys.stderr)
+            return 2
+        if not models:
+            print("Нет активных моделей в базе.", file=sys.stderr)
+            return 2
+        try:
+            prompts = load_prompts(db, path=args.file, tag=args.tag)
+        except (OSError, ValueError) as exc:
+            print(exc, file=sys.stderr)
+            return 2
+        if not prompts:
+            print("Нет промтов для прогона.", file=sys.stderr)
+            return 2
+
+        ratelimit.configure_from_settings(db)
+        breaker.configure_from_settings(db)
+        cache.configure_from_settings(db)
+        network.configure_from_settings(db)
+        try:
+            tape = cassette.configure_from_args(args)
+        except (OSError, ValueError) as exc:
+            print(f"Кассета: {exc}", file=sys.stderr)
+            return 2
+        concurrency = args.concurrency or _int_setting(
+            db, "max_parallel_requests", DEFAULT_MAX_IN_FLIGHT
+        )
+        timeout = args.timeout or _int_setting(db, "request_timeout_sec", 60)
+        # Явный --timeout — один на все модели; иначе таймаут по истории модели.
+        timeouts = None if args.timeout else timeouts_for(db, models, timeout)
+        print(
+            f"Промтов: {len(prompts)}, моделей: {len(models)}, "
+            f"параллельно: {concurrency}",
+            file=sys.stderr,
+        )
+        progress = None if args.quiet else Progress(len(prompts) * len(models))
+        try:
+            summary = run_batch(
+                db,
+                prompts,
+                models,
+                concurrency=concurrency,
+                per_provider=args.per_provider,
+                timeout_sec=timeout,
+                policy=policy_from_settings(db),
+                use_cache=not args.no_cache,
+                progress=progress,
+                timeouts=timeouts,
+            )
+        finally:
+            if progress is not None:
+                progress.close()
+        print(summary.format())
+        if tape is not None:
+            print(tape.describe(), file=sys.stderr)
+        if summary.errors:
+            return 1
+        return 3 if summary.skipped else 0
+    finally:
+        close_clients()
+        db.close()
+
+
+def _maintain(args: argparse.Namespace) -> int:
+    db = Database(args.db)
+    try:
+        policy = maintenance.policy_from_settings(db)
+        if args.keep_days is not None:
+            policy = replace(policy, max_age_days=max(0, args.keep_days))
+        if args.keep_rows is not None:
+            policy = replace(policy, max_rows=max(0, args.keep_rows))
+        report = maintenance.run_maintenance(db, policy, convert=True)
+        print(report.format())
+        return 0
+    finally:
+        db.close()
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m chatlist")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    batch = commands.add_parser(
+        "batch", help="прогнать промты по всем активным моделям"
+    )
+    source = batch.add_mutually_exclusive_group(required=True)
+    source.add_argument("--file", type=Path, help="промты из .jsonl или .csv")
+    source.add_argument("--tag", help="промты из базы с этим тегом")
+    batch.add_argument(
+        "--concurrency",
+        type=int,
+        default=0,
+        help="запросов одновременно (по умолчанию — из настроек)",
+    )
+    batch.add_argument(
+        "--per-provider",
+        type=int,
+        default=0,
+        help="запросов одновременно к одному провайдеру (0 — без отдельного лимита)",
+    )
+    batch.add_argument("--timeout", type=float, default=0, help="таймаут запроса, с (один на все модели)")
+    batch.add_argument("--no-cache", action="store_true", help="не брать ответы из кэша")
+    batch.add_argument("--db", type=Path, default=None, help="файл SQLite")
+    batch.add_argument("--quiet", action="store_true", help="без строки прогресса")
+    cassette.add_arguments(batch)
+    batch.set_defaults(handler=_batch)
+
+    maintain = commands.add_parser(
+        "maintain",
+        help="удалить старые логи (со сводками по часам) и вернуть место в файле",
+    )
+    maintain.add_argument(
+        "--keep-days", type=int, default=None, help="хранить логи, дней (0 — без срока)"
+    )
+    maintain.add_argument(
+        "--keep-rows", type=int, default=None, help="хранить логи, строк (0 — без лимита)"
+    )
+    maintain.add_argument("--db", type=Path, default=None, help="файл SQLite")
+    maintain.set_defaults(handler=_maintain)
+    return parser
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = build_parser().parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,8 +2,15 @@
 
 from __future__ import annotations
 
+import hashlib
+import re
 import sqlite3
-from datetime import datetime, timezone
+import unicodedata
+import zlib
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass, replace
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
 from typing import Any
 
@@ -13,10 +20,11 @@ SCHEMA_SQL = """
 PRAGMA foreign_keys = ON;
 
 CREATE TABLE IF NOT EXISTS prompts (
-    id         INTEGER PRIMARY KEY AUTOINCREMENT,
-    created_at TEXT    NOT NULL,
-    prompt     TEXT    NOT NULL,
-    tags       TEXT    NOT NULL DEFAULT ''
+    id           INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at   TEXT    NOT NULL,
+    prompt       TEXT    NOT NULL,
+    tags         TEXT    NOT NULL DEFAULT '',
+    content_hash TEXT
 );
 
 CREATE TABLE IF NOT EXISTS models (
@@ -24,7 +32,10 @@ CREATE TABLE IF NOT EXISTS models (
     name      TEXT    NOT NULL UNIQUE,
     api_url   TEXT    NOT NULL,
     api_id    TEXT    NOT NULL,
-    is_active INTEGER NOT NULL DEFAULT 1 CHECK (is_active IN (0, 1))
+    is_active INTEGER NOT NULL DEFAULT 1 CHECK (is_active IN (0, 1)),
+    price_input_per_mtok  REAL,
+    price_output_per_mtok REAL,
+    price_cached_per_mtok REAL
 );
 
 CREATE TABLE IF NOT EXISTS results (
@@ -33,6 +44,11 @@ CREATE TABLE IF NOT EXISTS results (
     model_id   INTEGER NOT NULL,
     response   TEXT    NOT NULL,
     created_at TEXT    NOT NULL,
+    prompt_tokens     INTEGER,
+    completion_tokens INTEGER,
+    cached_tokens     INTEGER,
+    cost_usd          REAL,
+    response_hash     TEXT,
     FOREIGN KEY (prompt_id) REFERENCES prompts(id) ON DELETE CASCADE,
     FOREIGN KEY (model_id)  REFERENCES models(id)  ON DELETE RESTRICT
 );
@@ -50,7 +66,51 @@ CREATE TABLE IF NOT EXISTS request_logs (
     status      TEXT    NOT NULL,
     response    TEXT    NOT NULL DEFAULT '',
     duration_ms INTEGER NOT NULL DEFAULT 0,
-    http_status INTEGER
+    http_status INTEGER,
+    ttft_ms     INTEGER,
+    attempt     INTEGER NOT NULL DEFAULT 1,
+    prompt_tokens     INTEGER,
+    completion_tokens INTEGER,
+    cached_tokens     INTEGER,
+    cost_usd          REAL,
+    response_bytes    INTEGER,
+    wire_bytes        INTEGER,
+    response_hash     TEXT,
+    timed_out         INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS model_health (
+    model_name           TEXT PRIMARY KEY,
+    consecutive_failures INTEGER NOT NULL DEFAULT 0,
+    last_failure_at      TEXT,
+    last_success_at      TEXT
+);
+
+CREATE TABLE IF NOT EXISTS request_log_rollups (
+    hour            TEXT    NOT NULL,
+    model_name      TEXT    NOT NULL,
+    requests        INTEGER NOT NULL DEFAULT 0,
+    errors          INTEGER NOT NULL DEFAULT 0,
+    duration_ms_sum INTEGER NOT NULL DEFAULT 0,
+    cost_usd        REAL,
+    latency_buckets TEXT    NOT NULL DEFAULT '',
+    PRIMARY KEY (hour, model_name)
+);
+
+CREATE TABLE IF NOT EXISTS blobs (
+    hash       TEXT    PRIMARY KEY,
+    codec      TEXT    NOT NULL,
+    size       INTEGER NOT NULL,
+    data       BLOB    NOT NULL,
+    created_at TEXT    NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS response_cache (
+    key        TEXT PRIMARY KEY,
+    model_name TEXT NOT NULL,
+    response   TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    expires_at TEXT NOT NULL
 );
 
 CREATE INDEX IF NOT EXISTS idx_prompts_created_at ON prompts(created_at);
@@ -59,13 +119,428 @@ CREATE INDEX IF NOT EXISTS idx_results_prompt_id ON results(prompt_id);
 CREATE INDEX IF NOT EXISTS idx_results_model_id ON results(model_id);
 CREATE INDEX IF NOT EXISTS idx_results_created_at ON results(created_at);
 CREATE INDEX IF NOT EXISTS idx_request_logs_created_at ON request_logs(created_at);
+CREATE INDEX IF NOT EXISTS idx_request_logs_model_name ON request_logs(model_name, status);
+CREATE INDEX IF NOT EXISTS idx_response_cache_expires_at ON response_cache(expires_at);
+"""
+
+# Полнотекстовый поиск: FTS5-индексы без копии текста (внешний content или
+# contentless), синхронизируются триггерами. Создаются, только если SQLite собран
+# с FTS5. results_fts и request_logs_fts — contentless: строки с response_hash
+# (полный текст в blobs) триггеры пропускают, их индексирует db.py
+# (_index_responses), а snippet считается в Python (_text_snippet). В схеме —
+# только встроенные функции SQLite: писать в БД может любой клиент, а строка,
+# удалённая в обход db.py, оставляет в индексе лишь rowid без строки.
+# У request_logs_fts нет prefix-индексов: на логах они удваивали индекс (больше
+# самой таблицы), а поиск по префиксу работает и без них, перебором термов.
+FTS_SCHEMA_SQL = """
+CREATE VIRTUAL TABLE IF NOT EXISTS prompts_fts USING fts5(
+    prompt, tags,
+    content = 'prompts', content_rowid = 'id',
+    tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+);
+CREATE TRIGGER IF NOT EXISTS prompts_fts_ai AFTER INSERT ON prompts BEGIN
+    INSERT INTO prompts_fts (rowid, prompt, tags) VALUES (new.id, new.prompt, new.tags);
+END;
+CREATE TRIGGER IF NOT EXISTS prompts_fts_ad AFTER DELETE ON prompts BEGIN
+    INSERT INTO prompts_fts (prompts_fts, rowid, prompt, tags)
+    VALUES ('delete', old.id, old.prompt, old.tags);
+END;
+CREATE TRIGGER IF NOT EXISTS prompts_fts_au AFTER UPDATE OF prompt, tags ON prompts BEGIN
+    INSERT INTO prompts_fts (prompts_fts, rowid, prompt, tags)
+    VALUES ('delete', old.id, old.prompt, old.tags);
+    INSERT INTO prompts_fts (rowid, prompt, tags) VALUES (new.id, new.prompt, new.tags);
+END;
+
+CREATE VIRTUAL TABLE IF NOT EXISTS models_fts USING fts5(
+    name, api_url, api_id,
+    content = 'models', content_rowid = 'id',
+    tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+);
+CREATE TRIGGER IF NOT EXISTS models_fts_ai AFTER INSERT ON models BEGIN
+    INSERT INTO models_fts (rowid, name, api_url, api_id)
+    VALUES (new.id, new.name, new.api_url, new.api_id);
+END;
+CREATE TRIGGER IF NOT EXISTS models_fts_ad AFTER DELETE ON models BEGIN
+    INSERT INTO models_fts (models_fts, rowid, name, api_url, api_id)
+    VALUES ('delete', old.id, old.name, old.api_url, old.api_id);
+END;
+CREATE TRIGGER IF NOT EXISTS models_fts_au AFTER UPDATE OF name, api_url, api_id ON models BEGIN
+    INSERT INTO models_fts (models_fts, rowid, name, api_url, api_id)
+    VALUES ('delete', old.id, old.name, old.api_url, old.api_id);
+    INSERT INTO models_fts (rowid, name, api_url, api_id)
+    VALUES (new.id, new.name, new.api_url, new.api_id);
+END;
+
+CREATE VIRTUAL TABLE IF NOT EXISTS results_fts USING fts5(
+    response,
+    content = '',
+    tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+);
+CREATE TRIGGER IF NOT EXISTS results_fts_ai AFTER INSERT ON results
+WHEN new.response_hash IS NULL BEGIN
+    INSERT INTO results_fts (rowid, response) VALUES (new.id, new.response);
+END;
+CREATE TRIGGER IF NOT EXISTS results_fts_ad AFTER DELETE ON results
+WHEN old.response_hash IS NULL BEGIN
+    INSERT INTO results_fts (results_fts, rowid, response)
+    VALUES ('delete', old.id, old.response);
+END;
+CREATE TRIGGER IF NOT EXISTS results_fts_au
+AFTER UPDATE OF response, response_hash ON results BEGIN
+    INSERT INTO results_fts (results_fts, rowid, response)
+    SELECT 'delete', old.id, old.response WHERE old.response_hash IS NULL;
+    INSERT INTO results_fts (rowid, response)
+    SELECT new.id, new.response WHERE new.response_hash IS NULL;
+END;
+
+CREATE VIRTUAL TABLE IF NOT EXISTS request_logs_fts USING fts5(
+    model_name, status, prompt, response,
+    content = '',
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS request_logs_fts_ai AFTER INSERT ON request_logs
+WHEN new.response_hash IS NULL BEGIN
+    INSERT INTO request_logs_fts (rowid, model_name, status, prompt, response)
+    VALUES (new.id, new.model_name, new.status, new.prompt, new.response);
+END;
+CREATE TRIGGER IF NOT EXISTS request_logs_fts_ad AFTER DELETE ON request_logs
+WHEN old.response_hash IS NULL BEGIN
+    INSERT INTO request_logs_fts (request_logs_fts, rowid, model_name, status, prompt, response)
+    VALUES ('delete', old.id, old.model_name, old.status, old.prompt, old.response);
+END;
+CREATE TRIGGER IF NOT EXISTS request_logs_fts_au
+AFTER UPDATE OF model_name, status, prompt, response, response_hash ON request_logs BEGIN
+    INSERT INTO request_logs_fts (request_logs_fts, rowid, model_name, status, prompt, response)
+    SELECT 'delete', old.id, old.model_name, old.status, old.prompt, old.response
+    WHERE old.response_hash IS NULL;
+    INSERT INTO request_logs_fts (rowid, model_name, status, prompt, response)
+    SELECT new.id, new.model_name, new.status, new.prompt, new.response
+    WHERE new.response_hash IS NULL;
+END;
 """
 
+# FTS-таблица → таблица, которую она индексирует. FTS-таблица или её триггеры,
+# не совпадающие с FTS_SCHEMA_SQL (старая версия схемы), пересоздаются; новая
+# таблица заполняется из уже накопленных строк.
+FTS_CONTENT = {
+    "prompts_fts": "prompts",
+    "models_fts": "models",
+    "results_fts": "results",
+    "request_logs_fts": "request_logs",
+}
+FTS_TABLES = tuple(FTS_CONTENT)
+# Колонки FTS таблиц с длинными ответами (response — последняя): их строки с
+# response_hash индексируются из Python с полным текстом из blobs.
+FTS_RESPONSE_COLUMNS = {
+    "results": ("response",),
+    "request_logs": ("model_name", "status", "prompt", "response"),
+}
+# Представления с blob_text() из прошлой версии схемы — удаляются при открытии.
+DROPPED_VIEWS = ("results_text", "request_logs_text")
+# Сколько слов вокруг совпадения показывать в snippet.
+SNIPPET_TOKENS = 12
+# Выделение совпадения в snippet (таблицы показывают обычный текст).
+SNIPPET_MARKS = ("[", "]")
+# Постраничные выборки (list_*_page): строк на страницу и сколько символов
+# длинного текста отдавать вместо полного (полный — get_*).
+PAGE_ROWS = 200
+PREVIEW_CHARS = 200
+
+# Частое слово совпадает с большей частью логов: bm25 считается только для
+# стольких самых новых совпадений, иначе поиск растёт вместе с таблицей.
+LOG_SEARCH_WINDOW = 2000
+
+
+# Уникальный индекс по content_hash: создаётся после слияния дублей в старой БД
+# (_dedupe_prompts), поэтому не в SCHEMA_SQL.
+PROMPT_HASH_INDEX_SQL = """
+CREATE UNIQUE INDEX IF NOT EXISTS idx_prompts_content_hash ON prompts(content_hash);
+"""
+
+# Длинные ответы: results и request_logs хранят в response только первые
+# PREVIEW_CHARS символов и ссылку response_hash на blobs (один раз на текст,
+# сжатый zlib). Полный текст — get_* / _with_full_responses. Индексы по
+# response_hash — после миграции колонок.
+BLOB_SCHEMA_SQL = """
+CREATE INDEX IF NOT EXISTS idx_results_response_hash
+    ON results(response_hash) WHERE response_hash IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_request_logs_response_hash
+    ON request_logs(response_hash) WHERE response_hash IS NOT NULL;
+"""
+
+# Ответ от стольких байт (UTF-8) уходит в blobs; короче — остаётся в строке.
+BLOB_MIN_BYTES = 1024
+BLOB_ZLIB_LEVEL = 6
+# Таблицы с response / response_hash.
+BLOB_TABLES = ("results", "request_logs")
+
+# Сводки request_logs по часам (request_log_rollups): верхние границы корзин
+# гистограммы длительности успешных запросов, мс; последняя корзина — от
+# LATENCY_BUCKETS_MS[-1] и дольше. Ошибками считаются ROLLUP_ERROR_STATUSES.
+LATENCY_BUCKETS_MS = (250, 500, 1000, 2000, 4000, 8000, 15000, 30000, 60000)
+ROLLUP_ERROR_STATUSES = ("error", "retry", "probe_error")
+
+# Колонки, добавленные после первой версии схемы: (таблица, колонка, определение).
+ADDED_COLUMNS: list[tuple[str, str, str]] = [
+    ("prompts", "content_hash", "TEXT"),
+    ("request_logs", "ttft_ms", "INTEGER"),
+    ("request_logs", "attempt", "INTEGER NOT NULL DEFAULT 1"),
+    ("request_logs", "prompt_tokens", "INTEGER"),
+    ("request_logs", "completion_tokens", "INTEGER"),
+    ("request_logs", "cached_tokens", "INTEGER"),
+    ("request_logs", "cost_usd", "REAL"),
+    ("results", "prompt_tokens", "INTEGER"),
+    ("results", "completion_tokens", "INTEGER"),
+    ("results", "cached_tokens", "INTEGER"),
+    ("results", "cost_usd", "REAL"),
+    ("models", "price_input_per_mtok", "REAL"),
+    ("models", "price_output_per_mtok", "REAL"),
+    ("models", "price_cached_per_mtok", "REAL"),
+    ("request_logs", "response_bytes", "INTEGER"),
+    ("request_logs", "wire_bytes", "INTEGER"),
+    ("results", "response_hash", "TEXT"),
+    ("request_logs", "response_hash", "TEXT"),
+    ("request_logs", "timed_out", "INTEGER NOT NULL DEFAULT 0"),
+]
+
+# Колонки токенов и стоимости в results и request_logs.
+USAGE_COLUMNS = ("prompt_tokens", "completion_tokens", "cached_tokens", "cost_usd")
+# Размер тела ответа в request_logs: после распаковки и по сети.
+SIZE_COLUMNS = ("response_bytes", "wire_bytes")
+# Цены моделей, $ за миллион токенов (NULL — не задана).
+PRICE_COLUMNS = ("price_input_per_mtok", "price_output_per_mtok", "price_cached_per_mtok")
+
+
+JOURNAL_MODES = ("WAL", "DELETE", "TRUNCATE", "PERSIST", "MEMORY")
+SYNCHRONOUS_MODES = ("OFF", "NORMAL", "FULL", "EXTRA")
+TEMP_STORES = ("DEFAULT", "FILE", "MEMORY")
+
+
+@dataclass(frozen=True)
+class ConnectionProfile:
+    """
+    PRAGMA соединения. WAL: читатели не ждут писателя, и GUI читает, пока
+    SendWorker пишет логи; synchronous=NORMAL в WAL не теряет целостности,
+    только последние транзакции при сбое питания.
+    """
+
+    journal_mode: str = "WAL"
+    synchronous: str = "NORMAL"
+    # Сколько ждать чужую блокировку записи, прежде чем «database is locked».
+    busy_timeout_ms: int = 5000
+    cache_size_kb: int = 16384
+    mmap_size_mb: int = 64
+    temp_store: str = "MEMORY"
+
+    def validated(self) -> ConnectionProfile:
+        """Проверка перед подстановкой в PRAGMA (параметры туда не передаются)."""
+        journal = self.journal_mode.upper()
+        synchronous = self.synchronous.upper()
+        temp_store = self.temp_store.upper()
+        if journal not in JOURNAL_MODES:
+            raise ValueError(f"Неизвестный journal_mode: {self.journal_mode}")
+        if synchronous not in SYNCHRONOUS_MODES:
+            raise ValueError(f"Неизвестный synchronous: {self.synchronous}")
+        if temp_store not in TEMP_STORES:
+            raise ValueError(f"Неизвестный temp_store: {self.temp_store}")
+        return replace(
+            self,
+            journal_mode=journal,
+            synchronous=synchronous,
+            temp_store=temp_store,
+            busy_timeout_ms=max(0, int(self.busy_timeout_ms)),
+            cache_size_kb=max(0, int(self.cache_size_kb)),
+            mmap_size_mb=max(0, int(self.mmap_size_mb)),
+        )
+
+
+DEFAULT_PROFILE = ConnectionProfile()
+
+# Ключи settings → поля ConnectionProfile.
+PROFILE_SETTINGS = {
+    "db_journal_mode": "journal_mode",
+    "db_synchronous": "synchronous",
+    "db_busy_timeout_ms": "busy_timeout_ms",
+    "db_cache_size_kb": "cache_size_kb",
+    "db_mmap_size_mb": "mmap_size_mb",
+    "db_temp_store": "temp_store",
+}
+
+
+# Статусы request_logs, которые учитываются в model_health (предохранитель).
+HEALTH_OK_STATUSES = ("ok", "probe_ok")
+HEALTH_ERROR_STATUSES = ("error", "probe_error")
+
 
 def _now_iso() -> str:
     return datetime.now(timezone.utc).replace(microsecond=0).isoformat()
 
 
+def fts_query(text: str) -> str:
+    """
+    Строка поиска → запрос FTS5: каждое слово — префикс, все слова обязательны.
+    Кавычки и операторы FTS5 из ввода не проходят; "" — искать нечего.
+    """
+    return " ".join(f'"{word}"*' for word in re.findall(r"\w+", text))
+
+
+def _fold(word: str) -> str:
+    """Слово без регистра и диакритики — как токенизатор unicode61 remove_diacritics."""
+    decomposed = unicodedata.normalize("NFKD", word.casefold())
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def _text_snippet(texts: list[str], query: str, tokens: int = SNIPPET_TOKENS) -> str:
+    """
+    Фрагмент вокруг слов запроса (префиксы, как в fts_query) с метками
+    SNIPPET_MARKS из того текста (колонки), где совпадений больше, — как
+    snippet(…, -1, …) FTS5, которого у contentless-индекса нет. Без совпадений —
+    начало первого текста.
+    """
+    words = [_fold(w) for w in re.findall(r"\w+", query)]
+    best: tuple[str, list[tuple[int, int]], list[int]] | None = None
+    for text in texts:
+        spans = [m.span() for m in re.finditer(r"\w+", text)]
+        hits = [
+            i
+            for i, (start, end) in enumerate(spans)
+            if any(_fold(text[start:end]).startswith(w) for w in words)
+        ]
+        if best is None or len(hits) > len(best[2]):
+            best = (text, spans, hits)
+    if best is None:
+        return ""
+    text, spans, hits = best
+    if not spans:
+        return text[:PREVIEW_CHARS]
+    first = 0
+    if hits:
+        # Окно в tokens слов с наибольшим числом совпадений; запас — поровну по краям.
+        window = max(
+            (hits[k:] for k in range(len(hits))),
+            key=lambda rest: sum(1 for h in rest if h < rest[0] + tokens),
+        )
+        inside = [h for h in window if h < window[0] + tokens]
+        spare = tokens - (inside[-1] - inside[0] + 1)
+        first = max(0, inside[0] - spare // 2)
+    last = min(len(spans), first + tokens)
+    first = max(0, min(first, last - tokens))
+    marked = set(hits)
+    parts = ["…" if first > 0 else ""]
+    for i in range(first, last):
+        start, end = spans[i]
+        if i > first:
+            parts.append(text[spans[i - 1][1] : start])
+        word = text[start:end]
+        parts.append(f"{SNIPPET_MARKS[0]}{word}{SNIPPET_MARKS[1]}" if i in marked else word)
+    parts.append("…" if last < len(spans) else "")
+    return "".join(parts)
+
+
+def normalize_prompt(text: str) -> str:
+    """
+    Текст промта для сравнения: NFC, переводы строк \\n, без пробелов в концах
+    строк и пустых строк по краям. Регистр и пробелы внутри строки значимы.
+    """
+    text = unicodedata.normalize("NFC", text).replace("\r\n", "\n").replace("\r", "\n")
+    return "\n".join(line.rstrip() for line in text.split("\n")).strip()
+
+
+def prompt_hash(text: str) -> str:
+    """SHA-256 нормализованного текста — prompts.content_hash."""
+    return hashlib.sha256(normalize_prompt(text).encode("utf-8")).hexdigest()
+
+
+def merge_tags(current: str, extra: str) -> str:
+    """Теги через запятую: к current добавляются новые из extra (без учёта регистра)."""
+    merged: list[str] = []
+    seen: set[str] = set()
+    for tag in f"{current},{extra}".split(","):
+        tag = tag.strip()
+        if tag and tag.lower() not in seen:
+            seen.add(tag.lower())
+            merged.append(tag)
+    return ", ".join(merged)
+
+
+def _pack_blob(raw: bytes) -> tuple[str, bytes]:
+    """(codec, data): zlib, если сжатие что-то даёт, иначе raw."""
+    packed = zlib.compress(raw, BLOB_ZLIB_LEVEL)
+    if len(packed) < len(raw):
+        return "zlib", packed
+    return "raw", raw
+
+
+def _blob_text(codec: str | None, data: bytes | None) -> str | None:
+    """
+    Текст из blobs; NULL — нет блоба. Как SQL-функция blob_text(codec, data) —
+    только в запросах этого модуля (поиск через LIKE), не в схеме: другие
+    клиенты SQLite её не знают.
+    """
+    if data is None:
+        return None
+    raw = zlib.decompress(data) if codec == "zlib" else bytes(data)
+    return raw.decode("utf-8")
+
+
+def _schema_objects(script: str) -> dict[str, str]:
+    """
+    CREATE … IF NOT EXISTS из скрипта схемы → {имя: sql}, как его хранит
+    sqlite_master (без IF NOT EXISTS и «;»).
+    """
+    return {
+        m.group(1): m.group(0).replace(" IF NOT EXISTS", "", 1)[:-1]
+        for m in re.finditer(
+            r"^CREATE (?:VIRTUAL TABLE|TRIGGER) IF NOT EXISTS (\w+).*?^(?:\);|END;)",
+            script,
+            re.M | re.S,
+        )
+    }
+
+
+def _sql_list(values: tuple[str, ...]) -> str:
+    """Константы-строки для IN (…) в SQL (только из кода, не из ввода)."""
+    return ", ".join(f"'{v}'" for v in values)
+
+
+def _latency_bucket_sql() -> str:
+    """Номер корзины LATENCY_BUCKETS_MS для успешного запроса, иначе NULL."""
+    cases = " ".join(
+        f"WHEN duration_ms < {bound} THEN {i}" for i, bound in enumerate(LATENCY_BUCKETS_MS)
+    )
+    return (
+        f"CASE WHEN status IN ({_sql_list(HEALTH_OK_STATUSES)}) "
+        f"THEN CASE {cases} ELSE {len(LATENCY_BUCKETS_MS)} END END"
+    )
+
+
+def _add_counts(current: str, extra: list[int]) -> str:
+    """Сложение гистограмм: latency_buckets (через запятую) + extra."""
+    counts = [int(c) for c in current.split(",") if c]
+    size = max(len(counts), len(extra))
+    counts += [0] * (size - len(counts))
+    extra = extra + [0] * (size - len(extra))
+    return ",".join(str(a + b) for a, b in zip(counts, extra))
+
+
+# Курсор постраничной выборки: (created_at, id) последней строки страницы.
+PageCursor = tuple[str, int]
+
+
+def page_cursor(row: dict[str, Any]) -> PageCursor:
+    return (str(row["created_at"]), int(row["id"]))
+
+
+def _after(alias: str, after: PageCursor | None) -> tuple[str, tuple[Any, ...]]:
+    """
+    Условие keyset-пагинации «строго после курсора» по убыванию (created_at, id):
+    идёт по индексу created_at (id в нём — rowid), без OFFSET.
+    """
+    if after is None:
+        return "", ()
+    return f"WHERE ({alias}.created_at, {alias}.id) < (?, ?)", tuple(after)
+
+
 def _row_to_dict(row: sqlite3.Row | None) -> dict[str, Any] | None:
     if row is None:
         return None
@@ -73,29 +548,581 @@ def _row_to_dict(row: sqlite3.Row | None) -> dict[str, Any] | None:
 
 
 class Database:
-    def __init__(self, db_path: str | Path | None = None) -> None:
+    def __init__(
+        self,
+        db_path: str | Path | None = None,
+        profile: ConnectionProfile | None = None,
+    ) -> None:
+        """
+        profile=None — DEFAULT_PROFILE с переопределениями из settings (db_*);
+        явный profile settings не читает (бенчмарки, тесты).
+        """
         self.db_path = Path(db_path) if db_path else DEFAULT_DB_PATH
-        self._conn = sqlite3.connect(self.db_path)
+        self._tx_depth = 0
+        # False — SQLite без FTS5: поиск через LIKE.
+        self.fts = False
+        # None — все ответы в строках, без blobs (сравнение в бенчмарке).
+        self.blob_min_bytes: int | None = BLOB_MIN_BYTES
+        base = (profile or DEFAULT_PROFILE).validated()
+        self._conn = sqlite3.connect(self.db_path, timeout=base.busy_timeout_ms / 1000)
         self._conn.row_factory = sqlite3.Row
+        self._conn.create_function("blob_text", 2, _blob_text, deterministic=True)
+        # Действует только на новый файл (до первой таблицы); старую БД переводит
+        # enable_incremental_vacuum.
+        self._conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
         self._conn.execute("PRAGMA foreign_keys = ON")
+        self._apply_profile(base)
         self.init_schema()
+        self.profile = base
+        if profile is None:
+            configured = self._profile_from_settings(base)
+            if configured != base:
+                self._apply_profile(configured)
+                self.profile = configured
+
+    def _apply_profile(self, profile: ConnectionProfile) -> None:
+        # busy_timeout — первым: смена journal_mode тоже может ждать блокировку.
+        self._conn.execute(f"PRAGMA busy_timeout = {profile.busy_timeout_ms}")
+        current = str(self._conn.execute("PRAGMA journal_mode").fetchone()[0])
+        if current.upper() != profile.journal_mode:
+            try:
+                self._conn.execute(f"PRAGMA journal_mode = {profile.journal_mode}")
+            except sqlite3.OperationalError:
+                # Из WAL не выйти, пока файл открыт другим соединением:
+                # режим сменится при следующем открытии.
+                pass
+        self._conn.execute(f"PRAGMA synchronous = {profile.synchronous}")
+        # Отрицательный cache_size — в КБ, а не в страницах.
+        self._conn.execute(f"PRAGMA cache_size = -{profile.cache_size_kb}")
+        self._conn.execute(f"PRAGMA mmap_size = {profile.mmap_size_mb * 1024 * 1024}")
+        self._conn.execute(f"PRAGMA temp_store = {profile.temp_store}")
+
+    def _profile_from_settings(self, base: ConnectionProfile) -> ConnectionProfile:
+        """Профиль с переопределениями из settings; некорректные значения пропускаются."""
+        rows = self._conn.execute(
+            f"""
+            SELECT key, value FROM settings
+            WHERE key IN ({", ".join("?" * len(PROFILE_SETTINGS))}) AND value != ''
+            """,
+            tuple(PROFILE_SETTINGS),
+        ).fetchall()
+        profile = base
+        for row in rows:
+            field_name = PROFILE_SETTINGS[row["key"]]
+            value: Any = row["value"]
+            if isinstance(getattr(base, field_name), int):
+                try:
+                    value = int(float(value))
+                except ValueError:
+                    continue
+            try:
+                profile = replace(profile, **{field_name: value}).validated()
+            except ValueError:
+                continue
+        return profile
+
+    def pragmas(self) -> dict[str, Any]:
+        """Фактические значения PRAGMA соединения (для настроек и бенчмарков)."""
+        return {
+            name: self._conn.execute(f"PRAGMA {name}").fetchone()[0]
+            for name in (
+                "journal_mode",
+                "synchronous",
+                "busy_timeout",
+                "cache_size",
+                "mmap_size",
+                "temp_store",
+            )
+        }
 
     def close(self) -> None:
         self._conn.close()
 
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        """
+        Несколько записей — одна транзакция и один commit (один fsync) в конце;
+        при исключении — откат всего блока. Вложенные блоки входят во внешний.
+        """
+        self._tx_depth += 1
+        try:
+            yield
+        except BaseException:
+            self._tx_depth -= 1
+            if self._tx_depth == 0:
+                self._conn.rollback()
+            raise
+        self._tx_depth -= 1
+        if self._tx_depth == 0:
+            self._conn.commit()
+
+    def _begin_write(self) -> None:
+        """
+        Блокировка записи сразу (BEGIN IMMEDIATE), если транзакция ещё не начата;
+        завершает её transaction() / _commit(). Открытая транзакция уже писала —
+        блокировка у неё есть.
+        """
+        if not self._conn.in_transaction:
+            self._conn.execute("BEGIN IMMEDIATE")
+
+    def _commit(self) -> None:
+        """commit после записи; внутри transaction() — в конце блока."""
+        if self._tx_depth == 0:
+            self._conn.commit()
+
     def init_schema(self) -> None:
         self._conn.executescript(SCHEMA_SQL)
+        added = self._migrate_columns()
+        self._conn.executescript(BLOB_SCHEMA_SQL)
+        self._drop_stale_fts()
+        self._dedupe_prompts()
+        self._init_fts()
+        for table in BLOB_TABLES:
+            if (table, "response_hash") in added:
+                self._move_responses_to_blobs(table)
+        self._commit()
+
+    def _drop_stale_fts(self) -> None:
+        """
+        Удаляет FTS-таблицы, у которых таблица или триггеры не совпадают с
+        FTS_SCHEMA_SQL (старая версия схемы), и представления DROPPED_VIEWS.
+        """
+        for view in DROPPED_VIEWS:
+            self._conn.execute(f"DROP VIEW IF EXISTS {view}")
+        expected = _schema_objects(FTS_SCHEMA_SQL)
+        stored = {
+            str(r["name"]): str(r["sql"])
+            for r in self._conn.execute(
+                "SELECT name, sql FROM sqlite_master WHERE type IN ('table', 'trigger')"
+            )
+        }
+        for table in FTS_TABLES:
+            if table not in stored:
+                continue
+            names = [name for name in expected if name == table or name.startswith(f"{table}_")]
+            if all(stored.get(name) == expected[name] for name in names):
+                continue
+            for suffix in ("ai", "ad", "au"):
+                self._conn.execute(f"DROP TRIGGER IF EXISTS {table}_{suffix}")
+            self._conn.execute(f"DROP TABLE {table}")
+
+    def _init_fts(self) -> None:
+        """FTS5-индексы и триггеры; новые индексы заполняются из существующих строк."""
+        existing = {
+            r["name"]
+            for r in self._conn.execute(
+                f"""
+                SELECT name FROM sqlite_master
+                WHERE name IN ({", ".join("?" * len(FTS_TABLES))})
+                """,
+                FTS_TABLES,
+            )
+        }
+        try:
+            self._conn.executescript(FTS_SCHEMA_SQL)
+        except sqlite3.OperationalError:
+            # no such module: fts5
+            return
+        self.fts = True
+        for table in FTS_TABLES:
+            if table in existing:
+                continue
+            source = FTS_CONTENT[table]
+            if source in FTS_RESPONSE_COLUMNS:
+                self._reindex_responses(source)
+            else:
+                self._conn.execute(f"INSERT INTO {table} ({table}) VALUES ('rebuild')")
+
+    def _reindex_responses(self, table: str, chunk: int = 500) -> None:
+        """
+        Заполняет пустой contentless FTS-индекс results / request_logs (без
+        'rebuild'): строки без response_hash — одним INSERT … SELECT, остальные —
+        с полным текстом из blobs.
+        """
+        columns = ", ".join(FTS_RESPONSE_COLUMNS[table])
+        with self.transaction():
+            self._conn.execute(
+                f"""
+                INSERT INTO {table}_fts (rowid, {columns})
+                SELECT id, {columns} FROM {table} WHERE response_hash IS NULL
+                """
+            )
+            last_id = 0
+            while True:
+                rows = self._long_rows(table, "id > ?", (last_id,), chunk)
+                if not rows:
+                    break
+                self._index_responses(table, rows)
+                last_id = int(rows[-1]["id"])
+
+    def _migrate_columns(self) -> set[tuple[str, str]]:
+        """
+        Добавляет недостающие колонки в БД, созданные старой версией схемы.
+        Возвращает добавленные (таблица, колонка).
+        """
+        added: set[tuple[str, str]] = set()
+        for table, column, definition in ADDED_COLUMNS:
+            existing = {
+                r["name"]
+                for r in self._conn.execute(f"PRAGMA table_info({table})")
+            }
+            if column not in existing:
+                self._conn.execute(
+                    f"ALTER TABLE {table} ADD COLUMN {column} {definition}"
+                )
+                added.add((table, column))
+        return added
+
+    def _move_responses_to_blobs(self, table: str, chunk: int = 500) -> int:
+        """Длинные ответы старой БД — в blobs (при добавлении response_hash)."""
+        if self.blob_min_bytes is None:
+            return 0
+        moved = 0
+        last_id = 0
+        with self.transaction():
+            while True:
+                rows = self._conn.execute(
+                    f"""
+                    SELECT id, {", ".join(FTS_RESPONSE_COLUMNS[table])} FROM {table}
+                    WHERE id > ? AND response_hash IS NULL
+                      AND length(CAST(response AS BLOB)) >= ?
+                    ORDER BY id
+                    LIMIT ?
+                    """,
+                    (last_id, self.blob_min_bytes, chunk),
+                ).fetchall()
+                if not rows:
+                    break
+                packed = self._store_responses([r["response"] for r in rows])
+                self._conn.executemany(
+                    f"UPDATE {table} SET response = ?, response_hash = ? WHERE id = ?",
+                    [(*p, r["id"]) for p, r in zip(packed, rows)],
+                )
+                # Триггер убрал из индекса полный текст строки, но не вернул его.
+                self._index_responses(table, [dict(r) for r in rows])
+                moved += len(rows)
+                last_id = int(rows[-1]["id"])
+        return moved
+
+    # --- blobs ---
+
+    def _store_responses(self, texts: list[str]) -> list[tuple[str, str | None]]:
+        """
+        (response, response_hash) для записи: длинный текст — в blobs (если такого
+        ещё нет), в строке остаётся начало; короткий — как есть, без хэша.
+        Вызывать внутри transaction() вместе с записью строк.
+        """
+        stored: list[tuple[str, str | None]] = []
+        new: dict[str, bytes] = {}
+        for text in texts:
+            raw = text.encode("utf-8")
+            if self.blob_min_bytes is None or len(raw) < self.blob_min_bytes:
+                stored.append((text, None))
+                continue
+            digest = hashlib.sha256(raw).hexdigest()
+            new.setdefault(digest, raw)
+            stored.append((text[:PREVIEW_CHARS], digest))
+        if new:
+            # Проверка «блоб уже есть» и строка со ссылкой на него — под одной
+            # блокировкой записи: иначе другое соединение (LogSink, обслуживание)
+            # может удалить блоб как неиспользуемый между SELECT и INSERT строки.
+            self._begin_write()
+            known = {
+                r["hash"]
+                for r in self._conn.execute(
+                    f"SELECT hash FROM blobs WHERE hash IN ({', '.join('?' * len(new))})",
+                    tuple(new),
+                )
+            }
+            now = _now_iso()
+            blobs = []
+            for digest, raw in new.items():
+                if digest not in known:
+                    codec, data = _pack_blob(raw)
+                    blobs.append((digest, codec, len(raw), data, now))
+            self._conn.executemany(
+                """
+                INSERT INTO blobs (hash, codec, size, data, created_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (hash) DO NOTHING
+                """,
+                blobs,
+            )
+        return stored
+
+    def _long_rows(
+        self, table: str, where: str, params: tuple[Any, ...], limit: int = -1
+    ) -> list[dict[str, Any]]:
+        """Строки table с response_hash: id и колонки FTS, response — полный текст."""
+        rows = self._conn.execute(
+            f"""
+            SELECT id, response_hash, {", ".join(FTS_RESPONSE_COLUMNS[table])}
+            FROM {table}
+            WHERE {where} AND response_hash IS NOT NULL
+            ORDER BY id
+            LIMIT ?
+            """,
+            (*params, limit),
+        ).fetchall()
+        return self._with_full_responses([dict(r) for r in rows])
+
+    def _index_responses(
+        self, table: str, rows: list[dict[str, Any]], *, delete: bool = False
+    ) -> None:
+        """
+        FTS для строк с response_hash (триггеры их пропускают): rows — id и
+        колонки FTS_RESPONSE_COLUMNS с полным response. delete — убрать из индекса
+        (FTS5 требует те же значения, что индексировались).
+        """
+        if not self.fts or not rows:
+            return
+        fts = f"{table}_fts"
+        columns = FTS_RESPONSE_COLUMNS[table]
+        values = ", ".join("?" * (len(columns) + 1))
+        if delete:
+            sql = f"INSERT INTO {fts} ({fts}, rowid, {', '.join(columns)}) VALUES ('delete', {values})"
+        else:
+            sql = f"INSERT INTO {fts} (rowid, {', '.join(columns)}) VALUES ({values})"
+        self._conn.executemany(sql, [(r["id"], *(r[c] for c in columns)) for r in rows])
+
+    def _delete_rows(self, table: str, where: str, params: tuple[Any, ...]) -> int:
+        """
+        DELETE строк results / request_logs: длинные ответы — из FTS (их триггер
+        не видит полный текст), затем неиспользуемые блобы. Возвращает число строк.
+        """
+        with self.transaction():
+            long_rows = self._long_rows(table, where, params)
+            self._index_responses(table, long_rows, delete=True)
+            deleted = self._conn.execute(f"DELETE FROM {table} WHERE {where}", params).rowcount
+            self._drop_unreferenced_blobs([r["response_hash"] for r in long_rows])
+        return deleted
+
+    def _with_full_responses(
+        self, rows: list[dict[str, Any]], chunk: int = 500
+    ) -> list[dict[str, Any]]:
+        """Подставляет в response полный текст из blobs (строки с response_hash)."""
+        hashes = list({r["response_hash"] for r in rows if r.get("response_hash")})
+        texts: dict[str, str] = {}
+        for start in range(0, len(hashes), chunk):
+            part = hashes[start : start + chunk]
+            for b in self._conn.execute(
+                f"SELECT hash, codec, data FROM blobs WHERE hash IN ({', '.join('?' * len(part))})",
+                part,
+            ):
+                texts[b["hash"]] = _blob_text(b["codec"], b["data"]) or ""
+        for row in rows:
+            text = texts.get(row.get("response_hash") or "")
+            if text is not None:
+                row["response"] = text
+        return rows
+
+    def _drop_unreferenced_blobs(self, hashes: list[str] | None = None) -> int:
+        """
+        Удаляет блобы, на которые больше не ссылаются results и request_logs:
+        из hashes (после удаления строк) или все (None).
+        """
+        unreferenced = """
+            NOT EXISTS (SELECT 1 FROM results WHERE response_hash = blobs.hash)
+            AND NOT EXISTS (SELECT 1 FROM request_logs WHERE response_hash = blobs.hash)
+        """
+        if hashes is None:
+            return self._conn.execute(f"DELETE FROM blobs WHERE {unreferenced}").rowcount
+        hashes = [h for h in set(hashes) if h]
+        if not hashes:
+            return 0
+        return self._conn.execute(
+            f"""
+            DELETE FROM blobs
+            WHERE hash IN ({", ".join("?" * len(hashes))}) AND {unreferenced}
+            """,
+            hashes,
+        ).rowcount
+
+    def blob_stats(self) -> dict[str, int]:
+        """
+        Хранилище длинных ответов: blobs — число текстов, text_bytes — их размер,
+        stored_bytes — на диске после сжатия, refs — строк results/request_logs
+        со ссылкой, ref_bytes — сколько текста занимали бы эти строки без blobs.
+        """
+        row = self._conn.execute(
+            """
+            SELECT COUNT(*) AS blobs,
+                   COALESCE(SUM(size), 0) AS text_bytes,
+                   COALESCE(SUM(length(data)), 0) AS stored_bytes
+            FROM blobs
+            """
+        ).fetchone()
+        refs = self._conn.execute(
+            """
+            SELECT COUNT(*) AS refs, COALESCE(SUM(b.size), 0) AS ref_bytes
+            FROM (
+                SELECT response_hash FROM results WHERE response_hash IS NOT NULL
+                UNION ALL
+                SELECT response_hash FROM request_logs WHERE response_hash IS NOT NULL
+            ) AS r
+            JOIN blobs b ON b.hash = r.response_hash
+            """
+        ).fetchone()
+        return {**dict(row), **dict(refs)}
+
+    def table_sizes(self) -> dict[str, int]:
+        """
+        Байт на диске по таблицам и индексам (dbstat), FTS-таблица — вместе со
+        своими служебными таблицами; {} — SQLite без dbstat.
+        """
+        try:
+            rows = self._conn.execute(
+                "SELECT name, SUM(pgsize) AS size FROM dbstat GROUP BY name"
+            ).fetchall()
+        except sqlite3.OperationalError:
+            return {}
+        sizes: dict[str, int] = {}
+        for row in rows:
+            name = str(row["name"])
+            for table in FTS_TABLES:
+                if name.startswith(f"{table}_"):
+                    name = table
+            sizes[name] = sizes.get(name, 0) + int(row["size"])
+        return dict(sorted(sizes.items(), key=lambda item: -item[1]))
+
+    def enable_incremental_vacuum(self) -> bool:
+        """
+        auto_vacuum = INCREMENTAL для БД, созданной без него: режим включается
+        только полным VACUUM (один раз). True — перевели сейчас.
+        """
+        if int(self._conn.execute("PRAGMA auto_vacuum").fetchone()[0]) == 2:
+            return False
+        self._conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        self.vacuum()
+        return True
+
+    def free_pages(self) -> int:
+        return int(self._conn.execute("PRAGMA freelist_count").fetchone()[0])
+
+    def incremental_vacuum(self, pages: int) -> int:
+        """Возвращает файлу до pages свободных страниц; сколько вернули."""
+        before = self.free_pages()
+        # incremental_vacuum отдаёт страницы, только пока читается его результат.
+        self._conn.execute(f"PRAGMA incremental_vacuum({max(1, int(pages))})").fetchall()
+        self._commit()
+        return before - self.free_pages()
+
+    def compact_log_index(self) -> None:
+        """
+        Слияние сегментов request_logs_fts: после удаления логов FTS5 хранит
+        метки удаления, пока сегменты не сольются, и место не освобождается.
+        """
+        if self.fts:
+            self._conn.execute(
+                "INSERT INTO request_logs_fts (request_logs_fts) VALUES ('optimize')"
+            )
+            self._commit()
+
+    def optimize(self) -> None:
+        """PRAGMA optimize: ANALYZE там, где статистика планировщика устарела."""
+        self._conn.execute("PRAGMA optimize").fetchall()
+
+    def vacuum(self) -> None:
+        """VACUUM: вернуть файлу место после удалений и переноса ответов в blobs."""
         self._conn.commit()
+        self._conn.execute("VACUUM")
+        # В WAL новый файл целиком в журнале, пока его не перенесёт checkpoint.
+        self.checkpoint("TRUNCATE")
+
+    def checkpoint(self, mode: str = "PASSIVE") -> None:
+        """
+        Перенос WAL в файл БД: только после него файл укорачивается на страницы
+        incremental_vacuum. PASSIVE не ждёт читателей и писателей.
+        """
+        if mode not in ("PASSIVE", "FULL", "RESTART", "TRUNCATE"):
+            raise ValueError(f"Неизвестный режим checkpoint: {mode}")
+        self._conn.execute(f"PRAGMA wal_checkpoint({mode})").fetchall()
+
+    def _dedupe_prompts(self) -> int:
+        """
+        Промты без content_hash (старая БД или запись старой версией): считает хэш,
+        сливает дубли в самый ранний промт — его results, объединённые теги — и
+        удаляет остальные. Затем создаёт уникальный индекс. Возвращает, сколько слито.
+        """
+        rows = self._conn.execute(
+            "SELECT id, prompt, tags FROM prompts WHERE content_hash IS NULL ORDER BY id"
+        ).fetchall()
+        merged = 0
+        with self.transaction():
+            keepers = {
+                str(r["content_hash"]): int(r["id"])
+                for r in self._conn.execute(
+                    "SELECT id, content_hash FROM prompts WHERE content_hash IS NOT NULL"
+                )
+            }
+            tags = {int(r["id"]): str(r["tags"] or "") for r in rows}
+            hashed: list[tuple[str, int]] = []
+            for row in rows:
+                prompt_id = int(row["id"])
+                content_hash = prompt_hash(row["prompt"])
+                keeper = keepers.get(content_hash)
+                if keeper is None:
+                    keepers[content_hash] = prompt_id
+                    hashed.append((content_hash, prompt_id))
+                    continue
+                self._conn.execute(
+                    "UPDATE results SET prompt_id = ? WHERE prompt_id = ?",
+                    (keeper, prompt_id),
+                )
+                if tags[prompt_id]:
+                    current = tags.get(keeper)
+                    if current is None:
+                        current = str(self.get_prompt(keeper)["tags"] or "")
+                    tags[keeper] = merge_tags(current, tags[prompt_id])
+                    self._conn.execute(
+                        "UPDATE prompts SET tags = ? WHERE id = ?", (tags[keeper], keeper)
+                    )
+                self._conn.execute("DELETE FROM prompts WHERE id = ?", (prompt_id,))
+                merged += 1
+            self._conn.executemany(
+                "UPDATE prompts SET content_hash = ? WHERE id = ?", hashed
+            )
+            self._conn.execute(PROMPT_HASH_INDEX_SQL)
+        return merged
 
     # --- prompts ---
 
     def create_prompt(self, prompt: str, tags: str = "") -> int:
-        cur = self._conn.execute(
-            "INSERT INTO prompts (created_at, prompt, tags) VALUES (?, ?, ?)",
-            (_now_iso(), prompt, tags),
-        )
-        self._conn.commit()
-        return int(cur.lastrowid)
+        """
+        Новый промт — или id уже сохранённого с тем же текстом (prompt_hash);
+        тогда tags добавляются к его тегам.
+        """
+        content_hash = prompt_hash(prompt)
+        existing = self._prompt_by_hash(content_hash)
+        if existing is None:
+            cur = self._conn.execute(
+                """
+                INSERT INTO prompts (created_at, prompt, tags, content_hash)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT (content_hash) DO NOTHING
+                """,
+                (_now_iso(), prompt, tags, content_hash),
+            )
+            if cur.rowcount:
+                self._commit()
+                return int(cur.lastrowid)
+            # Тот же промт только что записало другое соединение.
+            existing = self._prompt_by_hash(content_hash)
+            assert existing is not None
+        prompt_id = int(existing["id"])
+        merged = merge_tags(existing["tags"] or "", tags)
+        if merged != (existing["tags"] or ""):
+            self._conn.execute(
+                "UPDATE prompts SET tags = ? WHERE id = ?", (merged, prompt_id)
+            )
+            self._commit()
+        return prompt_id
+
+    def _prompt_by_hash(self, content_hash: str) -> dict[str, Any] | None:
+        row = self._conn.execute(
+            "SELECT id, tags FROM prompts WHERE content_hash = ?", (content_hash,)
+        ).fetchone()
+        return _row_to_dict(row)
 
     def get_prompt(self, prompt_id: int) -> dict[str, Any] | None:
         row = self._conn.execute(
@@ -109,21 +1136,78 @@ class Database:
         ).fetchall()
         return [dict(r) for r in rows]
 
-    def search_prompts(self, query: str) -> list[dict[str, Any]]:
+    def list_prompts_page(
+        self, after: PageCursor | None = None, limit: int = PAGE_ROWS
+    ) -> list[dict[str, Any]]:
+        """Страница промтов, новые первыми; prompt — первые PREVIEW_CHARS символов."""
+        where, params = _after("p", after)
+        rows = self._conn.execute(
+            f"""
+            SELECT p.id, p.created_at, p.tags,
+                   substr(p.prompt, 1, {PREVIEW_CHARS}) AS prompt
+            FROM prompts p
+            {where}
+            ORDER BY p.created_at DESC, p.id DESC
+            LIMIT ?
+            """,
+            (*params, limit),
+        ).fetchall()
+        return [dict(r) for r in rows]
+
+    def search_prompts(self, query: str, limit: int = 500) -> list[dict[str, Any]]:
+        """
+        Промты по словам из текста и тегов, лучшие (bm25) первыми; snippet —
+        фрагмент текста вокруг совпадения.
+        """
+        match = fts_query(query)
+        if not match:
+            return self.list_prompts_page(None, limit)
+        if not self.fts:
+            return self._search_prompts_like(query, limit)
+        rows = self._conn.execute(
+            f"""
+            SELECT p.*, bm25(prompts_fts) AS rank,
+                   snippet(prompts_fts, 0, ?, ?, '…', {SNIPPET_TOKENS}) AS snippet
+            FROM prompts_fts
+            JOIN prompts p ON p.id = prompts_fts.rowid
+            WHERE prompts_fts MATCH ?
+            ORDER BY rank
+            LIMIT ?
+            """,
+            (*SNIPPET_MARKS, match, limit),
+        ).fetchall()
+        return [dict(r) for r in rows]
+
+    def _search_prompts_like(self, query: str, limit: int) -> list[dict[str, Any]]:
         like = f"%{query}%"
         rows = self._conn.execute(
             """
             SELECT * FROM prompts
             WHERE prompt LIKE ? OR tags LIKE ?
             ORDER BY created_at DESC
+            LIMIT ?
             """,
-            (like, like),
+            (like, like, limit),
+        ).fetchall()
+        return [dict(r) for r in rows]
+
+    def list_prompts_by_tag(self, tag: str) -> list[dict[str, Any]]:
+        """Промты, у которых tag есть среди тегов через запятую (без учёта регистра)."""
+        rows = self._conn.execute(
+            """
+            SELECT * FROM prompts
+            WHERE ',' || lower(replace(tags, ' ', '')) || ',' LIKE ?
+            ORDER BY created_at, id
+            """,
+            (f"%,{tag.replace(' ', '').lower()},%",),
         ).fetchall()
         return [dict(r) for r in rows]
 
     def delete_prompt(self, prompt_id: int) -> None:
-        self._conn.execute("DELETE FROM prompts WHERE id = ?", (prompt_id,))
-        self._conn.commit()
+        with self.transaction():
+            # results удалились бы каскадом, но длинные ответы надо убрать из FTS.
+            self._delete_rows("results", "prompt_id = ?", (prompt_id,))
+            self._conn.execute("DELETE FROM prompts WHERE id = ?", (prompt_id,))
 
     def update_prompt(
         self,
@@ -135,15 +1219,21 @@ class Database:
         current = self.get_prompt(prompt_id)
         if current is None:
             raise ValueError(f"Промт id={prompt_id} не найден")
+        text = prompt if prompt is not None else current["prompt"]
+        content_hash = prompt_hash(text)
+        duplicate = self._prompt_by_hash(content_hash)
+        if duplicate is not None and int(duplicate["id"]) != prompt_id:
+            raise ValueError(f"Такой промт уже сохранён (id={duplicate['id']})")
         self._conn.execute(
-            "UPDATE prompts SET prompt = ?, tags = ? WHERE id = ?",
+            "UPDATE prompts SET prompt = ?, tags = ?, content_hash = ? WHERE id = ?",
             (
-                prompt if prompt is not None else current["prompt"],
+                text,
                 tags if tags is not None else current["tags"],
+                content_hash,
                 prompt_id,
             ),
         )
-        self._conn.commit()
+        self._commit()
 
     # --- models ---
 
@@ -153,15 +1243,29 @@ class Database:
         api_url: str,
         api_id: str,
         is_active: bool = True,
+        *,
+        price_input_per_mtok: float | None = None,
+        price_output_per_mtok: float | None = None,
+        price_cached_per_mtok: float | None = None,
     ) -> int:
         cur = self._conn.execute(
             """
-            INSERT INTO models (name, api_url, api_id, is_active)
-            VALUES (?, ?, ?, ?)
+            INSERT INTO models
+                (name, api_url, api_id, is_active,
+                 price_input_per_mtok, price_output_per_mtok, price_cached_per_mtok)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
             """,
-            (name, api_url, api_id, 1 if is_active else 0),
+            (
+                name,
+                api_url,
+                api_id,
+                1 if is_active else 0,
+                price_input_per_mtok,
+                price_output_per_mtok,
+                price_cached_per_mtok,
+            ),
         )
-        self._conn.commit()
+        self._commit()
         return int(cur.lastrowid)
 
     def get_model(self, model_id: int) -> dict[str, Any] | None:
@@ -189,14 +1293,23 @@ class Database:
         api_url: str | None = None,
         api_id: str | None = None,
         is_active: bool | None = None,
+        prices: dict[str, float | None] | None = None,
     ) -> None:
+        """prices: колонки PRICE_COLUMNS → новое значение (None — сбросить цену)."""
         current = self.get_model(model_id)
         if current is None:
             raise ValueError(f"Модель id={model_id} не найдена")
+        price_values = {column: current[column] for column in PRICE_COLUMNS}
+        for column, value in (prices or {}).items():
+            if column not in price_values:
+                raise ValueError(f"Неизвестная колонка цены: {column}")
+            price_values[column] = value
         self._conn.execute(
             """
             UPDATE models
-            SET name = ?, api_url = ?, api_id = ?, is_active = ?
+            SET name = ?, api_url = ?, api_id = ?, is_active = ?,
+                price_input_per_mtok = ?, price_output_per_mtok = ?,
+                price_cached_per_mtok = ?
             WHERE id = ?
             """,
             (
@@ -208,28 +1321,81 @@ class Database:
                     if is_active is not None
                     else current["is_active"]
                 ),
+                *(price_values[column] for column in PRICE_COLUMNS),
                 model_id,
             ),
         )
-        self._conn.commit()
+        self._commit()
 
     def delete_model(self, model_id: int) -> None:
         self._conn.execute("DELETE FROM models WHERE id = ?", (model_id,))
-        self._conn.commit()
+        self._commit()
 
     # --- results ---
 
-    def save_result(self, prompt_id: int, model_id: int, response: str) -> int:
-        cur = self._conn.execute(
-            """
-            INSERT INTO results (prompt_id, model_id, response, created_at)
-            VALUES (?, ?, ?, ?)
-            """,
-            (prompt_id, model_id, response, _now_iso()),
-        )
-        self._conn.commit()
+    def save_result(
+        self,
+        prompt_id: int,
+        model_id: int,
+        response: str,
+        *,
+        prompt_tokens: int | None = None,
+        completion_tokens: int | None = None,
+        cached_tokens: int | None = None,
+        cost_usd: float | None = None,
+    ) -> int:
+        with self.transaction():
+            ((stored, response_hash),) = self._store_responses([response])
+            cur = self._conn.execute(
+                """
+                INSERT INTO results
+                    (prompt_id, model_id, response, response_hash, created_at,
+                     prompt_tokens, completion_tokens, cached_tokens, cost_usd)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    prompt_id,
+                    model_id,
+                    stored,
+                    response_hash,
+                    _now_iso(),
+                    prompt_tokens,
+                    completion_tokens,
+                    cached_tokens,
+                    cost_usd,
+                ),
+            )
+            if response_hash is not None:
+                self._index_responses("results", [{"id": cur.lastrowid, "response": response}])
         return int(cur.lastrowid)
 
+    def save_results_many(self, rows: list[dict[str, Any]]) -> None:
+        """Пакетное сохранение одной транзакцией; ключи — аргументы save_result."""
+        now = _now_iso()
+        with self.transaction():
+            stored = self._store_responses([r["response"] for r in rows])
+            # По строке, а не executemany: id длинных ответов нужны для FTS.
+            long_rows: list[dict[str, Any]] = []
+            for r, packed in zip(rows, stored):
+                cur = self._conn.execute(
+                    """
+                    INSERT INTO results
+                        (prompt_id, model_id, response, response_hash, created_at,
+                         prompt_tokens, completion_tokens, cached_tokens, cost_usd)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    """,
+                    (
+                        r["prompt_id"],
+                        r["model_id"],
+                        *packed,
+                        now,
+                        *(r.get(column) for column in USAGE_COLUMNS),
+                    ),
+                )
+                if packed[1] is not None:
+                    long_rows.append({"id": cur.lastrowid, "response": r["response"]})
+            self._index_responses("results", long_rows)
+
     def list_results(self) -> list[dict[str, Any]]:
         rows = self._conn.execute(
             """
@@ -240,28 +1406,155 @@ class Database:
             ORDER BY r.created_at DESC
             """
         ).fetchall()
+        return self._with_full_responses([dict(r) for r in rows])
+
+    def list_results_page(
+        self, after: PageCursor | None = None, limit: int = PAGE_ROWS
+    ) -> list[dict[str, Any]]:
+        """
+        Страница результатов, новые первыми; response и prompt_text — первые
+        PREVIEW_CHARS символов (полные — get_results).
+        """
+        where, params = _after("r", after)
+        rows = self._conn.execute(
+            f"""
+            SELECT r.id, r.prompt_id, r.model_id, r.created_at,
+                   r.prompt_tokens, r.completion_tokens, r.cached_tokens, r.cost_usd,
+                   substr(r.response, 1, {PREVIEW_CHARS}) AS response,
+                   substr(p.prompt, 1, {PREVIEW_CHARS}) AS prompt_text,
+                   m.name AS model_name
+            FROM results r
+            JOIN prompts p ON p.id = r.prompt_id
+            JOIN models m ON m.id = r.model_id
+            {where}
+            ORDER BY r.created_at DESC, r.id DESC
+            LIMIT ?
+            """,
+            (*params, limit),
+        ).fetchall()
         return [dict(r) for r in rows]
 
+    def get_results(self, result_ids: list[int]) -> list[dict[str, Any]]:
+        """Полные строки результатов (как list_results) в порядке result_ids."""
+        if not result_ids:
+            return []
+        rows = self._conn.execute(
+            f"""
+            SELECT r.*, p.prompt AS prompt_text, m.name AS model_name
+            FROM results r
+            JOIN prompts p ON p.id = r.prompt_id
+            JOIN models m ON m.id = r.model_id
+            WHERE r.id IN ({", ".join("?" * len(result_ids))})
+            """,
+            tuple(result_ids),
+        ).fetchall()
+        full = self._with_full_responses([dict(r) for r in rows])
+        by_id = {int(r["id"]): r for r in full}
+        return [by_id[i] for i in result_ids if i in by_id]
+
     def delete_result(self, result_id: int) -> None:
-        self._conn.execute("DELETE FROM results WHERE id = ?", (result_id,))
-        self._conn.commit()
+        self._delete_rows("results", "id = ?", (result_id,))
 
-    def search_results(self, query: str) -> list[dict[str, Any]]:
+    def search_results(self, query: str, limit: int = 500) -> list[dict[str, Any]]:
+        """
+        Результаты, где слова есть в ответе, промте или имени модели; лучшие
+        (bm25) первыми, snippet — из самого подходящего из этих текстов.
+        """
+        match = fts_query(query)
+        if not match:
+            return self.list_results_page(None, limit)
+        if not self.fts:
+            return self._search_results_like(query, limit)
+        rows = self._conn.execute(
+            f"""
+            WITH hits (id, rank, snippet, in_response) AS (
+                SELECT rowid, bm25(results_fts), NULL, 1
+                FROM results_fts WHERE results_fts MATCH :match
+                UNION ALL
+                SELECT r.id, bm25(prompts_fts),
+                       snippet(prompts_fts, 0, :open, :close, '…', {SNIPPET_TOKENS}), 0
+                FROM prompts_fts JOIN results r ON r.prompt_id = prompts_fts.rowid
+                WHERE prompts_fts MATCH :match
+                UNION ALL
+                SELECT r.id, bm25(models_fts),
+                       snippet(models_fts, 0, :open, :close, '…', {SNIPPET_TOKENS}), 0
+                FROM models_fts JOIN results r ON r.model_id = models_fts.rowid
+                WHERE models_fts MATCH :match
+            ),
+            best AS (
+                -- MIN() отдаёт snippet той же строки, что и лучший rank.
+                SELECT id, MIN(rank) AS rank, snippet, in_response FROM hits GROUP BY id
+            )
+            SELECT r.*, p.prompt AS prompt_text, m.name AS model_name,
+                   best.rank, best.snippet, best.in_response
+            FROM best
+            JOIN results r ON r.id = best.id
+            JOIN prompts p ON p.id = r.prompt_id
+            JOIN models m ON m.id = r.model_id
+            ORDER BY best.rank, r.created_at DESC
+            LIMIT :limit
+            """,
+            {
+                "open": SNIPPET_MARKS[0],
+                "close": SNIPPET_MARKS[1],
+                "match": match,
+                "limit": limit,
+            },
+        ).fetchall()
+        result = [dict(r) for r in rows]
+        # Лучшее совпадение в ответе: results_fts без content, snippet — по тексту.
+        self._add_snippets("results", [r for r in result if r.pop("in_response")], query)
+        return result
+
+    def _add_snippets(self, table: str, rows: list[dict[str, Any]], query: str) -> None:
+        """snippet найденных строк по колонкам FTS (ответ — полный, из blobs)."""
+        columns = FTS_RESPONSE_COLUMNS[table]
+        full = self._with_full_responses(
+            [{"response": r["response"], "response_hash": r["response_hash"]} for r in rows]
+        )
+        for row, text in zip(rows, full):
+            row["snippet"] = _text_snippet(
+                [str(row[c] or "") for c in columns[:-1]] + [text["response"]], query
+            )
+
+    def _search_results_like(self, query: str, limit: int) -> list[dict[str, Any]]:
         like = f"%{query}%"
         rows = self._conn.execute(
             """
             SELECT r.*, p.prompt AS prompt_text, m.name AS model_name
             FROM results r
+            LEFT JOIN blobs b ON b.hash = r.response_hash
             JOIN prompts p ON p.id = r.prompt_id
             JOIN models m ON m.id = r.model_id
-            WHERE p.prompt LIKE ? OR r.response LIKE ? OR m.name LIKE ?
+            WHERE p.prompt LIKE ? OR m.name LIKE ?
+               OR COALESCE(blob_text(b.codec, b.data), r.response) LIKE ?
             ORDER BY r.created_at DESC
+            LIMIT ?
             """,
-            (like, like, like),
+            (like, like, like, limit),
         ).fetchall()
         return [dict(r) for r in rows]
 
     def search_models(self, query: str) -> list[dict[str, Any]]:
+        """Модели по словам из имени, URL и переменной ключа, лучшие (bm25) первыми."""
+        match = fts_query(query)
+        if not match:
+            return self.list_models()
+        if not self.fts:
+            return self._search_models_like(query)
+        rows = self._conn.execute(
+            """
+            SELECT m.*, bm25(models_fts) AS rank
+            FROM models_fts
+            JOIN models m ON m.id = models_fts.rowid
+            WHERE models_fts MATCH ?
+            ORDER BY rank, m.name
+            """,
+            (match,),
+        ).fetchall()
+        return [dict(r) for r in rows]
+
+    def _search_models_like(self, query: str) -> list[dict[str, Any]]:
         like = f"%{query}%"
         rows = self._conn.execute(
             """
@@ -283,26 +1576,135 @@ class Database:
         response: str = "",
         duration_ms: int = 0,
         http_status: int | None = None,
+        ttft_ms: int | None = None,
+        attempt: int = 1,
+        *,
+        prompt_tokens: int | None = None,
+        completion_tokens: int | None = None,
+        cached_tokens: int | None = None,
+        cost_usd: float | None = None,
+        response_bytes: int | None = None,
+        wire_bytes: int | None = None,
+        timed_out: bool = False,
     ) -> int:
-        cur = self._conn.execute(
-            """
-            INSERT INTO request_logs
-                (created_at, model_name, prompt, status, response, duration_ms, http_status)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-            """,
-            (
-                _now_iso(),
-                model_name,
-                prompt,
-                status,
-                response,
-                duration_ms,
-                http_status,
-            ),
-        )
-        self._conn.commit()
+        with self.transaction():
+            ((stored, response_hash),) = self._store_responses([response])
+            cur = self._conn.execute(
+                """
+                INSERT INTO request_logs
+                    (created_at, model_name, prompt, status, response, response_hash,
+                     duration_ms, http_status, ttft_ms, attempt,
+                     prompt_tokens, completion_tokens, cached_tokens, cost_usd,
+                     response_bytes, wire_bytes, timed_out)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    _now_iso(),
+                    model_name,
+                    prompt,
+                    status,
+                    stored,
+                    response_hash,
+                    duration_ms,
+                    http_status,
+                    ttft_ms,
+                    attempt,
+                    prompt_tokens,
+                    completion_tokens,
+                    cached_tokens,
+                    cost_usd,
+                    response_bytes,
+                    wire_bytes,
+                    int(timed_out),
+                ),
+            )
+            if response_hash is not None:
+                self._index_responses(
+                    "request_logs",
+                    [
+                        {
+                            "id": cur.lastrowid,
+                            "model_name": model_name,
+                            "status": status,
+                            "prompt": prompt,
+                            "response": response,
+                        }
+                    ],
+                )
+            self._record_health(model_name, status)
         return int(cur.lastrowid)
 
+    def log_requests_many(self, rows: list[dict[str, Any]]) -> None:
+        """
+        Пакетная запись логов одной транзакцией; ключи — аргументы log_request
+        и необязательный created_at (время события, если запись отложена).
+        """
+        now = _now_iso()
+        with self.transaction():
+            stored = self._store_responses([r.get("response", "") for r in rows])
+            # По строке, а не executemany: id длинных ответов нужны для FTS.
+            long_rows: list[dict[str, Any]] = []
+            for r, packed in zip(rows, stored):
+                cur = self._conn.execute(
+                    """
+                    INSERT INTO request_logs
+                        (created_at, model_name, prompt, status, response, response_hash,
+                         duration_ms, http_status, ttft_ms, attempt,
+                         prompt_tokens, completion_tokens, cached_tokens, cost_usd,
+                         response_bytes, wire_bytes, timed_out)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    """,
+                    (
+                        r.get("created_at") or now,
+                        r["model_name"],
+                        r["prompt"],
+                        r["status"],
+                        *packed,
+                        r.get("duration_ms", 0),
+                        r.get("http_status"),
+                        r.get("ttft_ms"),
+                        r.get("attempt", 1),
+                        *(r.get(column) for column in USAGE_COLUMNS),
+                        *(r.get(column) for column in SIZE_COLUMNS),
+                        int(r.get("timed_out", False)),
+                    ),
+                )
+                if packed[1] is not None:
+                    long_rows.append({**r, "id": cur.lastrowid})
+            self._index_responses("request_logs", long_rows)
+            for r in rows:
+                self._record_health(r["model_name"], r["status"])
+
+    def _record_health(self, model_name: str, status: str) -> None:
+        if status in HEALTH_OK_STATUSES:
+            self._conn.execute(
+                """
+                INSERT INTO model_health (model_name, consecutive_failures, last_success_at)
+                VALUES (?, 0, ?)
+                ON CONFLICT(model_name) DO UPDATE SET
+                    consecutive_failures = 0,
+                    last_success_at = excluded.last_success_at
+                """,
+                (model_name, _now_iso()),
+            )
+        elif status in HEALTH_ERROR_STATUSES:
+            self._conn.execute(
+                """
+                INSERT INTO model_health (model_name, consecutive_failures, last_failure_at)
+                VALUES (?, 1, ?)
+                ON CONFLICT(model_name) DO UPDATE SET
+                    consecutive_failures = consecutive_failures + 1,
+                    last_failure_at = excluded.last_failure_at
+                """,
+                (model_name, _now_iso()),
+            )
+
+    def list_model_health(self) -> list[dict[str, Any]]:
+        rows = self._conn.execute(
+            "SELECT * FROM model_health ORDER BY model_name"
+        ).fetchall()
+        return [dict(r) for r in rows]
+
     def list_logs(self, limit: int = 500) -> list[dict[str, Any]]:
         rows = self._conn.execute(
             """
@@ -312,28 +1714,317 @@ class Database:
             """,
             (limit,),
         ).fetchall()
+        return self._with_full_responses([dict(r) for r in rows])
+
+    def list_logs_page(
+        self, after: PageCursor | None = None, limit: int = PAGE_ROWS
+    ) -> list[dict[str, Any]]:
+        """
+        Страница логов, новые первыми; prompt и response — первые PREVIEW_CHARS
+        символов (полные — get_log).
+        """
+        where, params = _after("l", after)
+        rows = self._conn.execute(
+            f"""
+            SELECT l.id, l.created_at, l.model_name, l.status, l.duration_ms,
+                   l.http_status, l.ttft_ms, l.attempt,
+                   l.prompt_tokens, l.completion_tokens, l.cached_tokens, l.cost_usd,
+                   l.response_bytes, l.wire_bytes,
+                   substr(l.prompt, 1, {PREVIEW_CHARS}) AS prompt,
+                   substr(l.response, 1, {PREVIEW_CHARS}) AS response
+            FROM request_logs l
+            {where}
+            ORDER BY l.created_at DESC, l.id DESC
+            LIMIT ?
+            """,
+            (*params, limit),
+        ).fetchall()
         return [dict(r) for r in rows]
 
+    def get_log(self, log_id: int) -> dict[str, Any] | None:
+        row = _row_to_dict(
+            self._conn.execute("SELECT * FROM request_logs WHERE id = ?", (log_id,)).fetchone()
+        )
+        return None if row is None else self._with_full_responses([row])[0]
+
     def search_logs(self, query: str, limit: int = 500) -> list[dict[str, Any]]:
+        """
+        Логи по словам из модели, статуса, промта и ответа, лучшие (bm25) первыми
+        среди LOG_SEARCH_WINDOW самых новых совпадений; snippet — фрагмент вокруг
+        совпадения.
+        """
+        match = fts_query(query)
+        if not match:
+            return self.list_logs(limit)
+        if not self.fts:
+            return self._search_logs_like(query, limit)
+        rows = self._conn.execute(
+            """
+            SELECT l.*, hits.rank
+            FROM (
+                SELECT rowid AS id, rank
+                FROM request_logs_fts
+                WHERE request_logs_fts MATCH :match
+                ORDER BY rowid DESC
+                LIMIT :window
+            ) AS hits
+            JOIN request_logs l ON l.id = hits.id
+            ORDER BY hits.rank
+            LIMIT :limit
+            """,
+            {
+                "match": match,
+                "window": max(limit, LOG_SEARCH_WINDOW),
+                "limit": limit,
+            },
+        ).fetchall()
+        result = [dict(r) for r in rows]
+        self._add_snippets("request_logs", result, query)
+        return result
+
+    def _search_logs_like(self, query: str, limit: int) -> list[dict[str, Any]]:
         like = f"%{query}%"
         rows = self._conn.execute(
             """
-            SELECT * FROM request_logs
-            WHERE model_name LIKE ? OR prompt LIKE ? OR status LIKE ? OR response LIKE ?
-            ORDER BY created_at DESC
+            SELECT l.* FROM request_logs l
+            LEFT JOIN blobs b ON b.hash = l.response_hash
+            WHERE l.model_name LIKE ? OR l.prompt LIKE ? OR l.status LIKE ?
+               OR COALESCE(blob_text(b.codec, b.data), l.response) LIKE ?
+            ORDER BY l.created_at DESC
             LIMIT ?
             """,
             (like, like, like, like, limit),
         ).fetchall()
         return [dict(r) for r in rows]
 
+    def recent_durations(self, model_name: str, limit: int = 200) -> list[int]:
+        """Длительности последних успешных запросов модели (для перцентилей)."""
+        rows = self._conn.execute(
+            """
+            SELECT duration_ms FROM request_logs
+            WHERE model_name = ? AND status = 'ok'
+            ORDER BY id DESC
+            LIMIT ?
+            """,
+            (model_name, limit),
+        ).fetchall()
+        return [int(r["duration_ms"]) for r in rows]
+
+    def latency_samples(
+        self, since: datetime, limit_per_model: int = 200
+    ) -> dict[str, list[int]]:
+        """
+        Длительности успешных запросов и попыток, оборванных таймаутом
+        (timed_out), после since, не больше limit_per_model последних на модель: model_name →
+        [duration_ms, …] (от новых к старым). Таймаут входит со своей
+        длительностью — ответ был бы не раньше: без него выборка из одних
+        успешных смещена к быстрым и бюджет по ней сжимается.
+        """
+        rows = self._conn.execute(
+            """
+            SELECT model_name, duration_ms FROM (
+                SELECT model_name, duration_ms,
+                       ROW_NUMBER() OVER (PARTITION BY model_name ORDER BY id DESC) AS n
+                FROM request_logs
+                WHERE created_at >= ? AND (status = 'ok' OR timed_out = 1)
+            )
+            WHERE n <= ?
+            """,
+            (
+                since.astimezone(timezone.utc).replace(microsecond=0).isoformat(),
+                limit_per_model,
+            ),
+        ).fetchall()
+        result: dict[str, list[int]] = {}
+        for r in rows:
+            result.setdefault(r["model_name"], []).append(int(r["duration_ms"]))
+        return result
+
+    def log_prune_cutoff(self, max_age_days: int = 0, max_rows: int = 0) -> PageCursor | None:
+        """
+        Граница срока хранения логов: строки с (created_at, id) меньше неё старше
+        max_age_days дней или не входят в max_rows самых новых (0 — без
+        ограничения). None — удалять нечего.
+        """
+        cutoffs: list[PageCursor] = []
+        if max_age_days > 0:
+            since = datetime.now(timezone.utc) - timedelta(days=max_age_days)
+            cutoffs.append((since.replace(microsecond=0).isoformat(), 0))
+        if max_rows > 0:
+            row = self._conn.execute(
+                """
+                SELECT created_at, id FROM request_logs
+                ORDER BY created_at DESC, id DESC
+                LIMIT 1 OFFSET ?
+                """,
+                (max_rows - 1,),
+            ).fetchone()
+            if row is not None:
+                cutoffs.append(page_cursor(dict(row)))
+        return max(cutoffs) if cutoffs else None
+
+    def prune_logs(self, before: PageCursor, limit: int = 5000) -> tuple[int, int]:
+        """
+        Удаляет до limit самых старых логов с (created_at, id) < before, сначала
+        добавив их в request_log_rollups, — одной транзакцией. Возвращает
+        (удалено строк, затронуто сводок); 0 строк — до границы всё удалено.
+        """
+        bound = self._conn.execute(
+            """
+            SELECT created_at, id FROM request_logs
+            WHERE (created_at, id) < (?, ?)
+            ORDER BY created_at, id
+            LIMIT 1 OFFSET ?
+            """,
+            (*before, limit),
+        ).fetchone()
+        upto = before if bound is None else page_cursor(dict(bound))
+        where = "(created_at, id) < (?, ?)"
+        with self.transaction():
+            rollups = self._rollup_logs(where, upto)
+            pruned = self._delete_rows("request_logs", where, upto)
+        return pruned, rollups
+
+    def _rollup_logs(self, where: str, params: tuple[Any, ...]) -> int:
+        """Добавляет логи из WHERE в сводки по (час, модель); возвращает число сводок."""
+        buckets = len(LATENCY_BUCKETS_MS) + 1
+        rows = self._conn.execute(
+            f"""
+            SELECT hour, model_name, COUNT(*) AS requests, SUM(is_error) AS errors,
+                   SUM(duration_ms) AS duration_ms_sum, SUM(cost_usd) AS cost_usd,
+                   {", ".join(f"SUM(bucket IS {i}) AS b{i}" for i in range(buckets))}
+            FROM (
+                SELECT substr(created_at, 1, 13) || ':00:00+00:00' AS hour,
+                       model_name, duration_ms, cost_usd,
+                       status IN ({_sql_list(ROLLUP_ERROR_STATUSES)}) AS is_error,
+                       {_latency_bucket_sql()} AS bucket
+                FROM request_logs
+                WHERE {where}
+            )
+            GROUP BY hour, model_name
+            """,
+            params,
+        ).fetchall()
+        for row in rows:
+            current = self._conn.execute(
+                "SELECT latency_buckets FROM request_log_rollups WHERE hour = ? AND model_name = ?",
+                (row["hour"], row["model_name"]),
+            ).fetchone()
+            counts = _add_counts(
+                current["latency_buckets"] if current else "",
+                [int(row[f"b{i}"]) for i in range(buckets)],
+            )
+            self._conn.execute(
+                """
+                INSERT INTO request_log_rollups
+                    (hour, model_name, requests, errors, duration_ms_sum, cost_usd,
+                     latency_buckets)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (hour, model_name) DO UPDATE SET
+                    requests = requests + excluded.requests,
+                    errors = errors + excluded.errors,
+                    duration_ms_sum = duration_ms_sum + excluded.duration_ms_sum,
+                    cost_usd = CASE
+                        WHEN cost_usd IS NULL THEN excluded.cost_usd
+                        WHEN excluded.cost_usd IS NULL THEN cost_usd
+                        ELSE cost_usd + excluded.cost_usd
+                    END,
+                    latency_buckets = excluded.latency_buckets
+                """,
+                (
+                    row["hour"],
+                    row["model_name"],
+                    row["requests"],
+                    row["errors"],
+                    row["duration_ms_sum"],
+                    row["cost_usd"],
+                    counts,
+                ),
+            )
+        return len(rows)
+
+    def list_log_rollups(
+        self, since: datetime | None = None, model_name: str | None = None
+    ) -> list[dict[str, Any]]:
+        """
+        Сводки удалённых логов, новые часы первыми; latency_buckets — список
+        счётчиков по LATENCY_BUCKETS_MS (последний — дольше последней границы).
+        """
+        conditions: list[str] = []
+        params: list[Any] = []
+        if since is not None:
+            conditions.append("hour >= ?")
+            params.append(since.astimezone(timezone.utc).replace(microsecond=0).isoformat())
+        if model_name is not None:
+            conditions.append("model_name = ?")
+            params.append(model_name)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        rows = self._conn.execute(
+            f"""
+            SELECT * FROM request_log_rollups
+            {where}
+            ORDER BY hour DESC, model_name
+            """,
+            params,
+        ).fetchall()
+        result = []
+        for r in rows:
+            row = dict(r)
+            row["latency_buckets"] = [int(c) for c in row["latency_buckets"].split(",") if c]
+            result.append(row)
+        return result
+
     def delete_log(self, log_id: int) -> None:
-        self._conn.execute("DELETE FROM request_logs WHERE id = ?", (log_id,))
-        self._conn.commit()
+        self._delete_rows("request_logs", "id = ?", (log_id,))
 
     def clear_logs(self) -> None:
-        self._conn.execute("DELETE FROM request_logs")
-        self._conn.commit()
+        with self.transaction():
+            self._conn.execute("DELETE FROM request_logs")
+            if self.fts:
+                # Триггер убрал короткие ответы; длинные — вместе со всем индексом.
+                self._conn.execute(
+                    "INSERT INTO request_logs_fts (request_logs_fts) VALUES ('delete-all')"
+                )
+            self._drop_unreferenced_blobs()
+
+    # --- response_cache ---
+
+    def cache_get(self, key: str) -> str | None:
+        row = self._conn.execute(
+            "SELECT response FROM response_cache WHERE key = ? AND expires_at > ?",
+            (key, _now_iso()),
+        ).fetchone()
+        return None if row is None else str(row["response"])
+
+    def cache_put(
+        self, key: str, model_name: str, response: str, ttl_sec: float
+    ) -> None:
+        now = datetime.now(timezone.utc).replace(microsecond=0)
+        expires = now + timedelta(seconds=ttl_sec)
+        self._conn.execute(
+            """
+            INSERT INTO response_cache (key, model_name, response, created_at, expires_at)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(key) DO UPDATE SET
+                model_name = excluded.model_name,
+                response = excluded.response,
+                created_at = excluded.created_at,
+                expires_at = excluded.expires_at
+            """,
+            (key, model_name, response, now.isoformat(), expires.isoformat()),
+        )
+        self._commit()
+
+    def cache_purge_expired(self) -> int:
+        cur = self._conn.execute(
+            "DELETE FROM response_cache WHERE expires_at <= ?", (_now_iso(),)
+        )
+        self._commit()
+        return cur.rowcount
+
+    def cache_clear(self) -> None:
+        self._conn.execute("DELETE FROM response_cache")
+        self._commit()
 
     # --- settings ---
 
@@ -353,7 +2044,7 @@ class Database:
             """,
             (key, value),
         )
-        self._conn.commit()
+        self._commit()
 
     def seed_default_models(self) -> None:
         """Сиды: четыре бесплатные модели OpenRouter (:free)."""
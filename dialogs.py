@@ -3,8 +3,10 @@
 from __future__ import annotations
 
 from pathlib import Path
+from typing import Any
 
-from PyQt6.QtCore import Qt, pyqtSignal
+from PyQt6.QtCore import Qt, QTimer, pyqtSignal
+from PyQt6.QtGui import QDoubleValidator
 from PyQt6.QtWidgets import (
     QCheckBox,
     QComboBox,
@@ -25,9 +27,29 @@ from PyQt6.QtWidgets import (
     QVBoxLayout,
 )
 
+import maintenance
 from adapters import PROVIDERS
-from db import Database
+from cache import DEFAULT_TTL_SEC, response_cache
+from db import PRICE_COLUMNS, Database
 from export import results_to_json, results_to_markdown
+from lazy_table import (
+    Column,
+    PagedTableModel,
+    make_paged_view,
+    select_id,
+    selected_rows,
+)
+from network import DEFAULT_MAX_RESPONSE_KB
+from pricing import format_cost, tokens_per_sec
+from timeouts import (
+    DEFAULT_CEILING_SEC,
+    DEFAULT_FLOOR_SEC,
+    DEFAULT_PERCENTILE,
+    planner,
+)
+
+# Пауза после ввода в строке поиска, прежде чем искать в БД.
+SEARCH_DELAY_MS = 250
 
 
 def configure_table(table: QTableWidget) -> None:
@@ -51,19 +73,75 @@ def apply_table_filter(table: QTableWidget, query: str) -> None:
         table.setRowHidden(row, q not in " ".join(parts))
 
 
-def make_search_box(placeholder: str, on_change) -> QLineEdit:
+def make_search_box(placeholder: str, on_change, delay_ms: int = 0) -> QLineEdit:
+    """delay_ms > 0 — on_change после паузы в наборе (поиск в БД, а не в таблице)."""
     search = QLineEdit()
     search.setPlaceholderText(placeholder)
-    search.textChanged.connect(on_change)
+    if delay_ms <= 0:
+        search.textChanged.connect(on_change)
+        return search
+    timer = QTimer(search)
+    timer.setSingleShot(True)
+    timer.setInterval(delay_ms)
+    timer.timeout.connect(lambda: on_change(search.text()))
+    search.textChanged.connect(lambda _text: timer.start())
     return search
 
 
+def keep_rank_order(table: QTableWidget) -> None:
+    """Снимает сортировку по колонке: строки поиска идут по релевантности."""
+    table.horizontalHeader().setSortIndicator(-1, Qt.SortOrder.AscendingOrder)
+
+
 def id_item(value: int) -> QTableWidgetItem:
     item = QTableWidgetItem()
     item.setData(Qt.ItemDataRole.DisplayRole, value)
     return item
 
 
+class _NumberItem(QTableWidgetItem):
+    """Сортируется по числу из UserRole, а не по тексту; пустые — в начале."""
+
+    def __lt__(self, other: QTableWidgetItem) -> bool:
+        mine = self.data(Qt.ItemDataRole.UserRole)
+        theirs = other.data(Qt.ItemDataRole.UserRole)
+        if mine is None or theirs is None:
+            return mine is None and theirs is not None
+        return mine < theirs
+
+
+def number_item(value: float | None, text: str | None = None) -> QTableWidgetItem:
+    """Ячейка с числовой сортировкой и отформатированным текстом."""
+    item = _NumberItem("" if value is None else text or str(value))
+    if value is not None:
+        item.setData(Qt.ItemDataRole.UserRole, value)
+    return item
+
+
+def _format_price(value: float | None) -> str:
+    return "" if value is None else f"{value:g}"
+
+
+def _format_kb(value: int | None) -> str:
+    return "" if value is None else f"{value / 1024:.1f}"
+
+
+def _one_line(text: str | None, limit: int) -> str:
+    text = (text or "").replace("\n", " ")
+    return text if len(text) <= limit else text[: limit - 3] + "…"
+
+
+def _optional(value: Any) -> str:
+    return "" if value is None else str(value)
+
+
+def _log_speed(row: dict) -> str:
+    speed = tokens_per_sec(
+        row.get("completion_tokens"), row.get("duration_ms"), row.get("ttft_ms")
+    )
+    return "" if speed is None else f"{speed:.1f}"
+
+
 def export_rows(parent, rows: list, prompt_text: str = "") -> None:
     if not rows:
         QMessageBox.information(parent, "Экспорт", "Нет строк для экспорта.")
@@ -128,7 +206,7 @@ class ModelEditDialog(QDialog):
     def __init__(self, parent=None, data: dict | None = None) -> None:
         super().__init__(parent)
         self.setWindowTitle("Модель" if data else "Новая модель")
-        self.resize(560, 240)
+        self.resize(560, 320)
 
         self.provider_combo = QComboBox()
         self.provider_combo.addItem("Другой / вручную", None)
@@ -148,6 +226,16 @@ class ModelEditDialog(QDialog):
         self.active_check.setChecked(
             bool(data["is_active"]) if data else True
         )
+        # Цены $ за 1M токенов; пустое поле — цена не задана, стоимость не считается.
+        self.price_edits: dict[str, QLineEdit] = {}
+        for column in PRICE_COLUMNS:
+            edit = QLineEdit(_format_price(data.get(column)) if data else "")
+            validator = QDoubleValidator(0.0, 1_000_000.0, 6, edit)
+            validator.setNotation(QDoubleValidator.Notation.StandardNotation)
+            edit.setValidator(validator)
+            edit.setPlaceholderText("не задана")
+            self.price_edits[column] = edit
+        self.price_edits["price_cached_per_mtok"].setPlaceholderText("как вход")
 
         if data:
             url = (data.get("api_url") or "").lower()
@@ -163,6 +251,11 @@ class ModelEditDialog(QDialog):
         form.addRow("API URL:", self.url_edit)
         form.addRow("api_id (.env):", self.api_id_edit)
         form.addRow("", self.active_check)
+        form.addRow("Цена входа, $/1M токенов:", self.price_edits["price_input_per_mtok"])
+        form.addRow("Цена выхода, $/1M токенов:", self.price_edits["price_output_per_mtok"])
+        form.addRow(
+            "Цена кэшированного входа:", self.price_edits["price_cached_per_mtok"]
+        )
 
         buttons = QDialogButtonBox(
             QDialogButtonBox.StandardButton.Ok
@@ -193,6 +286,13 @@ class ModelEditDialog(QDialog):
             self.active_check.isChecked(),
         )
 
+    def prices(self) -> dict[str, float | None]:
+        result: dict[str, float | None] = {}
+        for column, edit in self.price_edits.items():
+            text = edit.text().strip().replace(",", ".")
+            result[column] = float(text) if text else None
+        return result
+
 
 class ModelsDialog(QDialog):
     def __init__(self, db: Database, parent=None) -> None:
@@ -203,11 +303,20 @@ class ModelsDialog(QDialog):
 
         self.search = make_search_box(
             "Поиск по имени, URL, api_id…",
-            lambda text: apply_table_filter(self.table, text),
+            lambda _text: self._reload(),
+            SEARCH_DELAY_MS,
         )
-        self.table = QTableWidget(0, 5)
+        self.table = QTableWidget(0, 7)
         self.table.setHorizontalHeaderLabels(
-            ["ID", "Имя", "API URL", "api_id", "Активна"]
+            [
+                "ID",
+                "Имя",
+                "API URL",
+                "api_id",
+                "Активна",
+                "$/1M вход / выход",
+                "Таймаут, с",
+            ]
         )
         configure_table(self.table)
         self.table.setColumnWidth(1, 220)
@@ -247,7 +356,11 @@ class ModelsDialog(QDialog):
 
     def _reload(self) -> None:
         self.table.setSortingEnabled(False)
-        models = self.db.list_models()
+        query = self.search.text().strip()
+        models = self.db.search_models(query) if query else self.db.list_models()
+        if query:
+            keep_rank_order(self.table)
+        budgets = planner.plan(self.db, [m["name"] for m in models])
         self.table.setRowCount(len(models))
         for i, m in enumerate(models):
             self.table.setItem(i, 0, id_item(int(m["id"])))
@@ -257,8 +370,22 @@ class ModelsDialog(QDialog):
             self.table.setItem(
                 i, 4, QTableWidgetItem("да" if m["is_active"] else "нет")
             )
+            price_in = m.get("price_input_per_mtok")
+            price_out = m.get("price_output_per_mtok")
+            self.table.setItem(
+                i,
+                5,
+                QTableWidgetItem(
+                    ""
+                    if price_in is None and price_out is None
+                    else f"{_format_price(price_in) or '—'} / {_format_price(price_out) or '—'}"
+                ),
+            )
+            budget = budgets[m["name"]]
+            timeout_item = number_item(budget.timeout_sec, f"{budget.timeout_sec:g}")
+            timeout_item.setToolTip(budget.describe())
+            self.table.setItem(i, 6, timeout_item)
         self.table.setSortingEnabled(True)
-        apply_table_filter(self.table, self.search.text())
 
     def _add(self) -> None:
         dlg = ModelEditDialog(self)
@@ -269,7 +396,7 @@ class ModelsDialog(QDialog):
             QMessageBox.warning(self, "Модели", "Заполните все поля.")
             return
         try:
-            self.db.create_model(name, url, api_id, active)
+            self.db.create_model(name, url, api_id, active, **dlg.prices())
         except Exception as exc:
             QMessageBox.critical(self, "Модели", str(exc))
             return
@@ -292,7 +419,12 @@ class ModelsDialog(QDialog):
             return
         try:
             self.db.update_model(
-                model_id, name=name, api_url=url, api_id=api_id, is_active=active
+                model_id,
+                name=name,
+                api_url=url,
+                api_id=api_id,
+                is_active=active,
+                prices=dlg.prices(),
             )
         except Exception as exc:
             QMessageBox.critical(self, "Модели", str(exc))
@@ -368,14 +500,24 @@ class PromptsDialog(QDialog):
 
         self.search = make_search_box(
             "Поиск по тексту и тегам…",
-            lambda text: apply_table_filter(self.table, text),
+            lambda _text: self._reload(),
+            SEARCH_DELAY_MS,
         )
-        self.table = QTableWidget(0, 4)
-        self.table.setHorizontalHeaderLabels(["ID", "Дата", "Теги", "Промт"])
-        configure_table(self.table)
-        self.table.setColumnWidth(1, 160)
-        self.table.setColumnWidth(2, 120)
-        self.table.setColumnWidth(3, 420)
+        self.model = PagedTableModel(
+            [
+                Column("ID", lambda p: str(p["id"]), numeric=True),
+                Column("Дата", lambda p: p["created_at"], width=160),
+                Column("Теги", lambda p: p["tags"] or "", width=120),
+                Column(
+                    "Промт",
+                    lambda p: _one_line(p.get("snippet") or p["prompt"], 80),
+                    width=420,
+                ),
+            ],
+            self.db.list_prompts_page,
+            parent=self,
+        )
+        self.table = make_paged_view(self.model)
 
         self.preview = QTextEdit()
         self.preview.setReadOnly(True)
@@ -414,32 +556,21 @@ class PromptsDialog(QDialog):
         del_btn.clicked.connect(self._delete)
         use_btn.clicked.connect(self._use)
         close_btn.clicked.connect(self.reject)
-        self.table.itemSelectionChanged.connect(self._on_select)
+        self.table.selectionModel().selectionChanged.connect(lambda *_: self._on_select())
         self.table.doubleClicked.connect(lambda _: self._edit())
 
         self._reload()
 
     def _selected_id(self) -> int | None:
-        rows = self.table.selectionModel().selectedRows()
-        if not rows:
-            return None
-        item = self.table.item(rows[0].row(), 0)
-        return int(item.text()) if item else None
+        rows = selected_rows(self.table)
+        return int(rows[0]["id"]) if rows else None
 
     def _reload(self) -> None:
-        self.table.setSortingEnabled(False)
-        prompts = self.db.list_prompts()
-        self.table.setRowCount(len(prompts))
-        for i, p in enumerate(prompts):
-            preview = p["prompt"].replace("\n", " ")
-            if len(preview) > 80:
-                preview = preview[:77] + "…"
-            self.table.setItem(i, 0, id_item(int(p["id"])))
-            self.table.setItem(i, 1, QTableWidgetItem(p["created_at"]))
-            self.table.setItem(i, 2, QTableWidgetItem(p["tags"] or ""))
-            self.table.setItem(i, 3, QTableWidgetItem(preview))
-        self.table.setSortingEnabled(True)
-        apply_table_filter(self.table, self.search.text())
+        query = self.search.text().strip()
+        if query:
+            self.model.set_rows(self.db.search_prompts(query))
+        else:
+            self.model.reset()
 
     def _on_select(self) -> None:
         prompt_id = self._selected_id()
@@ -501,12 +632,7 @@ class PromptsDialog(QDialog):
         self._select_id(prompt_id)
 
     def _select_id(self, prompt_id: int) -> None:
-        for i in range(self.table.rowCount()):
-            item = self.table.item(i, 0)
-            if item and int(item.text()) == prompt_id:
-                self.table.selectRow(i)
-                self._on_select()
-                return
+        select_id(self.table, prompt_id)
         self._on_select()
 
     def _delete(self) -> None:
@@ -533,21 +659,29 @@ class ResultsDialog(QDialog):
         self.db = db
         self.setWindowTitle("Сохранённые результаты")
         self.resize(900, 500)
-        self._rows: list[dict] = []
 
         self.search = make_search_box(
             "Поиск по модели, промту, ответу…",
-            lambda text: apply_table_filter(self.table, text),
+            lambda _text: self._reload(),
+            SEARCH_DELAY_MS,
         )
-        self.table = QTableWidget(0, 5)
-        self.table.setHorizontalHeaderLabels(
-            ["ID", "Дата", "Модель", "Промт", "Ответ"]
+        self.model = PagedTableModel(
+            [
+                Column("ID", lambda r: str(r["id"]), numeric=True),
+                Column("Дата", lambda r: r["created_at"], width=150),
+                Column("Модель", lambda r: r.get("model_name") or "", width=180),
+                Column("Промт", lambda r: _one_line(r.get("prompt_text"), 50), width=220),
+                Column("Ответ", lambda r: _one_line(r.get("response"), 60), width=280),
+                Column(
+                    "Совпадение",
+                    lambda r: _one_line(r.get("snippet"), 200),
+                    width=320,
+                ),
+            ],
+            self.db.list_results_page,
+            parent=self,
         )
-        configure_table(self.table)
-        self.table.setColumnWidth(1, 150)
-        self.table.setColumnWidth(2, 180)
-        self.table.setColumnWidth(3, 220)
-        self.table.setColumnWidth(4, 280)
+        self.table = make_paged_view(self.model)
 
         self.preview = QTextEdit()
         self.preview.setReadOnly(True)
@@ -574,86 +708,71 @@ class ResultsDialog(QDialog):
         open_btn.clicked.connect(self._open_markdown)
         del_btn.clicked.connect(self._delete)
         close_btn.clicked.connect(self.accept)
-        self.table.itemSelectionChanged.connect(self._on_select)
+        self.table.selectionModel().selectionChanged.connect(lambda *_: self._on_select())
         self.table.doubleClicked.connect(lambda _: self._open_markdown())
 
         self._reload()
 
     def _selected_id(self) -> int | None:
-        rows = self.table.selectionModel().selectedRows()
-        if not rows:
-            return None
-        item = self.table.item(rows[0].row(), 0)
-        return int(item.text()) if item else None
+        rows = selected_rows(self.table)
+        return int(rows[0]["id"]) if rows else None
 
-    def _visible_rows(self) -> list[dict]:
-        by_id = {int(r["id"]): r for r in self._rows}
-        visible: list[dict] = []
-        for i in range(self.table.rowCount()):
-            if self.table.isRowHidden(i):
-                continue
-            item = self.table.item(i, 0)
-            if item is None:
-                continue
-            data = by_id.get(int(item.text()))
-            if data:
-                visible.append(data)
-        selected_ids = set()
-        for idx in self.table.selectionModel().selectedRows():
-            item = self.table.item(idx.row(), 0)
-            if item:
-                selected_ids.add(int(item.text()))
-        if selected_ids:
-            return [r for r in visible if int(r["id"]) in selected_ids]
-        return visible
+    def _selected_data(self) -> dict | None:
+        """Полная строка выделенного результата (в таблице — только начало текста)."""
+        result_id = self._selected_id()
+        if result_id is None:
+            return None
+        rows = self.db.get_results([result_id])
+        return rows[0] if rows else None
+
+    def _export_rows(self) -> list[dict]:
+        """Выделенные строки; без выделения — найденные или все результаты."""
+        selected = selected_rows(self.table)
+        if selected:
+            return self.db.get_results([int(r["id"]) for r in selected])
+        if self.search.text().strip():
+            # Найденные строки несут только начало длинных ответов.
+            return self.db.get_results([int(r["id"]) for r in self.model.rows()])
+        return self.db.list_results()
 
     def _reload(self) -> None:
-        self.table.setSortingEnabled(False)
-        results = self.db.list_results()
-        self._rows = results
-        self.table.setRowCount(len(results))
-        for i, r in enumerate(results):
-            prompt_preview = (r.get("prompt_text") or "").replace("\n", " ")
-            if len(prompt_preview) > 50:
-                prompt_preview = prompt_preview[:47] + "…"
-            resp_preview = (r.get("response") or "").replace("\n", " ")
-            if len(resp_preview) > 60:
-                resp_preview = resp_preview[:57] + "…"
-            item0 = id_item(int(r["id"]))
-            self.table.setItem(i, 0, item0)
-            self.table.setItem(i, 1, QTableWidgetItem(r["created_at"]))
-            self.table.setItem(i, 2, QTableWidgetItem(r.get("model_name") or ""))
-            self.table.setItem(i, 3, QTableWidgetItem(prompt_preview))
-            self.table.setItem(i, 4, QTableWidgetItem(resp_preview))
-        self.table.setSortingEnabled(True)
-        apply_table_filter(self.table, self.search.text())
+        query = self.search.text().strip()
+        if query:
+            self.model.set_rows(self.db.search_results(query))
+        else:
+            self.model.reset()
+        self.table.setColumnHidden(5, not query)
 
     def _on_select(self) -> None:
-        result_id = self._selected_id()
-        if result_id is None:
-            self.preview.clear()
-            return
-        data = next((r for r in self._rows if int(r["id"]) == result_id), None)
+        data = self._selected_data()
         if not data:
             self.preview.clear()
             return
+        usage = ""
+        if data.get("completion_tokens") is not None:
+            usage = (
+                f"Токены: промт {data.get('prompt_tokens')}, "
+                f"ответ {data.get('completion_tokens')}"
+            )
+            if data.get("cost_usd") is not None:
+                usage += f", стоимость {format_cost(data.get('cost_usd'))}"
+            usage += "\n"
         text = (
             f"Модель: {data.get('model_name')}\n"
+            f"{usage}"
             f"Промт:\n{data.get('prompt_text')}\n\n"
             f"Ответ:\n{data.get('response')}"
         )
         self.preview.setPlainText(text)
 
     def _export(self) -> None:
-        rows = self._visible_rows()
-        export_rows(self, rows)
+        export_rows(self, self._export_rows())
 
     def _open_markdown(self) -> None:
-        result_id = self._selected_id()
-        if result_id is None:
+        if self._selected_id() is None:
             QMessageBox.information(self, "Результаты", "Выберите строку.")
             return
-        data = next((r for r in self._rows if int(r["id"]) == result_id), None)
+        data = self._selected_data()
         if not data:
             return
         MarkdownViewDialog(
@@ -683,19 +802,35 @@ class LogsDialog(QDialog):
         self.db = db
         self.setWindowTitle("Логи запросов")
         self.resize(900, 500)
-        self._rows: list[dict] = []
 
         self.search = make_search_box(
-            "Поиск по модели, статусу, промту…",
-            lambda text: apply_table_filter(self.table, text),
+            "Поиск по модели, статусу, промту, ответу…",
+            lambda _text: self._reload(),
+            SEARCH_DELAY_MS,
         )
-        self.table = QTableWidget(0, 6)
-        self.table.setHorizontalHeaderLabels(
-            ["ID", "Дата", "Модель", "Статус", "HTTP", "мс"]
+        self.model = PagedTableModel(
+            [
+                Column("ID", lambda r: str(r["id"]), numeric=True),
+                Column("Дата", lambda r: r["created_at"], width=170),
+                Column("Модель", lambda r: r["model_name"], width=280),
+                Column("Статус", lambda r: r["status"]),
+                Column("HTTP", lambda r: _optional(r.get("http_status"))),
+                Column("мс", lambda r: str(r.get("duration_ms") or 0), numeric=True),
+                Column("TTFT мс", lambda r: _optional(r.get("ttft_ms")), numeric=True),
+                Column("Токены", lambda r: _optional(r.get("completion_tokens")), numeric=True),
+                Column("ток/с", _log_speed, numeric=True),
+                Column("$", lambda r: format_cost(r.get("cost_usd")), numeric=True),
+                Column("КБ", lambda r: _format_kb(r.get("response_bytes")), numeric=True),
+                Column(
+                    "Совпадение",
+                    lambda r: _one_line(r.get("snippet"), 200),
+                    width=320,
+                ),
+            ],
+            self.db.list_logs_page,
+            parent=self,
         )
-        configure_table(self.table)
-        self.table.setColumnWidth(1, 170)
-        self.table.setColumnWidth(2, 280)
+        self.table = make_paged_view(self.model)
 
         self.preview = QTextEdit()
         self.preview.setReadOnly(True)
@@ -716,46 +851,54 @@ class LogsDialog(QDialog):
 
         clear_btn.clicked.connect(self._clear)
         close_btn.clicked.connect(self.accept)
-        self.table.itemSelectionChanged.connect(self._on_select)
+        self.table.selectionModel().selectionChanged.connect(lambda *_: self._on_select())
         self._reload()
 
     def _selected_id(self) -> int | None:
-        rows = self.table.selectionModel().selectedRows()
-        if not rows:
-            return None
-        item = self.table.item(rows[0].row(), 0)
-        return int(item.text()) if item else None
+        rows = selected_rows(self.table)
+        return int(rows[0]["id"]) if rows else None
 
     def _reload(self) -> None:
-        self.table.setSortingEnabled(False)
-        self._rows = self.db.list_logs()
-        self.table.setRowCount(len(self._rows))
-        for i, r in enumerate(self._rows):
-            http_status = r.get("http_status")
-            self.table.setItem(i, 0, id_item(int(r["id"])))
-            self.table.setItem(i, 1, QTableWidgetItem(r["created_at"]))
-            self.table.setItem(i, 2, QTableWidgetItem(r["model_name"]))
-            self.table.setItem(i, 3, QTableWidgetItem(r["status"]))
-            self.table.setItem(
-                i, 4, QTableWidgetItem("" if http_status is None else str(http_status))
-            )
-            self.table.setItem(i, 5, id_item(int(r.get("duration_ms") or 0)))
-        self.table.setSortingEnabled(True)
-        apply_table_filter(self.table, self.search.text())
+        query = self.search.text().strip()
+        if query:
+            self.model.set_rows(self.db.search_logs(query))
+        else:
+            self.model.reset()
+        self.table.setColumnHidden(11, not query)
 
     def _on_select(self) -> None:
         log_id = self._selected_id()
-        if log_id is None:
-            self.preview.clear()
-            return
-        data = next((r for r in self._rows if int(r["id"]) == log_id), None)
+        # В таблице — только начало промта и ответа; полные — отдельным запросом.
+        data = self.db.get_log(log_id) if log_id is not None else None
         if not data:
             self.preview.clear()
             return
+        tokens = "—"
+        if data.get("completion_tokens") is not None:
+            tokens = (
+                f"промт {data.get('prompt_tokens')} "
+                f"(из кэша {data.get('cached_tokens') or 0}), "
+                f"ответ {data.get('completion_tokens')}"
+            )
+            speed = tokens_per_sec(
+                data.get("completion_tokens"), data.get("duration_ms"), data.get("ttft_ms")
+            )
+            if speed is not None:
+                tokens += f", {speed:.1f} ток/с"
+        size = "—"
+        if data.get("response_bytes") is not None:
+            size = (
+                f"{_format_kb(data.get('response_bytes'))} КБ "
+                f"(по сети {_format_kb(data.get('wire_bytes') or 0)} КБ)"
+            )
         self.preview.setPlainText(
             f"Статус: {data.get('status')}\n"
             f"HTTP: {data.get('http_status')}\n"
-            f"Длительность: {data.get('duration_ms')} мс\n\n"
+            f"Длительность: {data.get('duration_ms')} мс\n"
+            f"До первого токена: {data.get('ttft_ms') or '—'} мс\n"
+            f"Токены: {tokens}\n"
+            f"Стоимость: {format_cost(data.get('cost_usd')) or '—'}\n"
+            f"Размер ответа: {size}\n\n"
             f"Промт:\n{data.get('prompt')}\n\n"
             f"Ответ / ошибка:\n{data.get('response')}"
         )
@@ -779,6 +922,21 @@ class SettingsDialog(QDialog):
         self.resize(520, 340)
 
         timeout = db.get_setting("request_timeout_sec", "60") or "60"
+        deadline = db.get_setting("send_deadline_sec", "0") or "0"
+        first_k = db.get_setting("send_first_k", "0") or "0"
+        keep_stragglers = db.get_setting("keep_stragglers", "0") or "0"
+        adaptive_timeout = db.get_setting("adaptive_timeout", "0") or "0"
+        timeout_percentile = db.get_setting("timeout_percentile", "") or ""
+        timeout_floor = db.get_setting("timeout_floor_sec", "") or ""
+        timeout_ceiling = db.get_setting("timeout_ceiling_sec", "") or ""
+        parallel = db.get_setting("max_parallel_requests", "8") or "8"
+        adaptive_concurrency = db.get_setting("adaptive_concurrency", "1") or "1"
+        stream = db.get_setting("stream_responses", "1") or "1"
+        retries = db.get_setting("retry_max_attempts", "3") or "3"
+        hedge = db.get_setting("hedge_percentile", "0") or "0"
+        cache_ttl = db.get_setting("cache_ttl_sec", "") or str(DEFAULT_TTL_SEC)
+        max_response = db.get_setting("max_response_kb", "") or str(DEFAULT_MAX_RESPONSE_KB)
+        retention = maintenance.policy_from_settings(db)
         width = db.get_setting("window_width", "900") or "900"
         height = db.get_setting("window_height", "600") or "600"
         theme = db.get_setting("theme", "light") or "light"
@@ -795,6 +953,132 @@ class SettingsDialog(QDialog):
             self.timeout_spin.setValue(int(float(timeout)))
         except ValueError:
             self.timeout_spin.setValue(60)
+        self.timeout_spin.setToolTip(
+            "Для всех моделей или, если таймаут считается по истории, "
+            "для моделей, у которых её пока мало"
+        )
+        self.adaptive_timeout_check = QCheckBox("по истории модели:")
+        self.adaptive_timeout_check.setChecked(adaptive_timeout == "1")
+        self.timeout_percentile_spin = QSpinBox()
+        self.timeout_percentile_spin.setRange(50, 99)
+        self.timeout_percentile_spin.setPrefix("p")
+        self.timeout_floor_spin = QSpinBox()
+        self.timeout_floor_spin.setRange(1, 600)
+        self.timeout_floor_spin.setPrefix("от ")
+        self.timeout_floor_spin.setSuffix(" с")
+        self.timeout_ceiling_spin = QSpinBox()
+        self.timeout_ceiling_spin.setRange(1, 3600)
+        self.timeout_ceiling_spin.setPrefix("до ")
+        self.timeout_ceiling_spin.setSuffix(" с")
+        for spin, raw, fallback in (
+            (self.timeout_percentile_spin, timeout_percentile, DEFAULT_PERCENTILE),
+            (self.timeout_floor_spin, timeout_floor, DEFAULT_FLOOR_SEC),
+            (self.timeout_ceiling_spin, timeout_ceiling, DEFAULT_CEILING_SEC),
+        ):
+            try:
+                spin.setValue(int(float(raw or fallback)))
+            except ValueError:
+                spin.setValue(int(fallback))
+        adaptive_row = QHBoxLayout()
+        adaptive_row.addWidget(self.adaptive_timeout_check)
+        adaptive_row.addWidget(self.timeout_percentile_spin)
+        adaptive_row.addWidget(self.timeout_floor_spin)
+        adaptive_row.addWidget(self.timeout_ceiling_spin)
+        adaptive_row.addStretch()
+        self.deadline_spin = QSpinBox()
+        self.deadline_spin.setRange(0, 600)
+        self.deadline_spin.setSpecialValueText("выкл.")
+        try:
+            self.deadline_spin.setValue(int(float(deadline)))
+        except ValueError:
+            self.deadline_spin.setValue(0)
+        self.first_k_spin = QSpinBox()
+        self.first_k_spin.setRange(0, 32)
+        self.first_k_spin.setSpecialValueText("все")
+        try:
+            self.first_k_spin.setValue(int(first_k))
+        except ValueError:
+            self.first_k_spin.setValue(0)
+        self.keep_stragglers_check = QCheckBox("Дожидаться опоздавших в фоне")
+        self.keep_stragglers_check.setChecked(keep_stragglers == "1")
+        self.parallel_spin = QSpinBox()
+        self.parallel_spin.setRange(1, 32)
+        try:
+            self.parallel_spin.setValue(int(parallel))
+        except ValueError:
+            self.parallel_spin.setValue(8)
+        self.adaptive_concurrency_check = QCheckBox("подстраивать под провайдера")
+        self.adaptive_concurrency_check.setToolTip(
+            "Меньше одновременных запросов к провайдеру при 429, 5xx и росте "
+            "задержки, больше — пока он отвечает быстро"
+        )
+        self.adaptive_concurrency_check.setChecked(adaptive_concurrency == "1")
+        parallel_row = QHBoxLayout()
+        parallel_row.addWidget(self.parallel_spin)
+        parallel_row.addWidget(self.adaptive_concurrency_check)
+        parallel_row.addStretch()
+        self.stream_check = QCheckBox("Показывать ответы по мере генерации")
+        self.stream_check.setChecked(stream == "1")
+        self.retries_spin = QSpinBox()
+        self.retries_spin.setRange(1, 10)
+        try:
+            self.retries_spin.setValue(int(float(retries)))
+        except ValueError:
+            self.retries_spin.setValue(3)
+        self.hedge_spin = QSpinBox()
+        self.hedge_spin.setRange(0, 99)
+        self.hedge_spin.setSpecialValueText("выкл.")
+        try:
+            self.hedge_spin.setValue(int(float(hedge)))
+        except ValueError:
+            self.hedge_spin.setValue(0)
+        self.max_response_spin = QSpinBox()
+        self.max_response_spin.setRange(0, 1024 * 1024)
+        self.max_response_spin.setSingleStep(256)
+        self.max_response_spin.setSuffix(" КБ")
+        self.max_response_spin.setSpecialValueText("без лимита")
+        self.max_response_spin.setToolTip(
+            "Ответ длиннее обрезается с пометкой — и в таблице, и в логах, и в базе"
+        )
+        try:
+            self.max_response_spin.setValue(int(float(max_response)))
+        except ValueError:
+            self.max_response_spin.setValue(DEFAULT_MAX_RESPONSE_KB)
+        self.cache_ttl_spin = QSpinBox()
+        self.cache_ttl_spin.setRange(1, 24 * 365)
+        self.cache_ttl_spin.setSuffix(" ч")
+        try:
+            self.cache_ttl_spin.setValue(max(1, round(float(cache_ttl) / 3600)))
+        except ValueError:
+            self.cache_ttl_spin.setValue(DEFAULT_TTL_SEC // 3600)
+        self.retention_days_spin = QSpinBox()
+        self.retention_days_spin.setRange(0, 3650)
+        self.retention_days_spin.setSuffix(" дн.")
+        self.retention_days_spin.setSpecialValueText("без срока")
+        self.retention_days_spin.setValue(retention.max_age_days)
+        self.retention_rows_spin = QSpinBox()
+        self.retention_rows_spin.setRange(0, 100_000_000)
+        self.retention_rows_spin.setSingleStep(10_000)
+        self.retention_rows_spin.setSuffix(" строк")
+        self.retention_rows_spin.setSpecialValueText("без лимита")
+        self.retention_rows_spin.setValue(retention.max_rows)
+        retention_row = QHBoxLayout()
+        retention_row.addWidget(self.retention_days_spin)
+        retention_row.addWidget(self.retention_rows_spin)
+        retention_row.addStretch()
+        self.retention_days_spin.setToolTip(
+            "Старые записи «Логов запросов» удаляются в фоне раз в час; "
+            "перед удалением они сводятся по часам и моделям, сами записи "
+            "не восстановить. По умолчанию логи хранятся без ограничений"
+        )
+        self.retention_rows_spin.setToolTip(self.retention_days_spin.toolTip())
+        self.cache_stats_label = QLabel()
+        self._update_cache_stats()
+        self.cache_clear_btn = QPushButton("Очистить кэш")
+        self.cache_clear_btn.clicked.connect(self._on_clear_cache)
+        cache_row = QHBoxLayout()
+        cache_row.addWidget(self.cache_stats_label, stretch=1)
+        cache_row.addWidget(self.cache_clear_btn)
         self.width_spin = QSpinBox()
         self.width_spin.setRange(400, 3000)
         try:
@@ -836,6 +1120,18 @@ class SettingsDialog(QDialog):
         form = QFormLayout()
         form.addRow("Путь к БД:", self.db_path_label)
         form.addRow("Таймаут запроса (сек):", self.timeout_spin)
+        form.addRow("Таймаут модели:", adaptive_row)
+        form.addRow("Общий срок рассылки (сек):", self.deadline_spin)
+        form.addRow("Ждать первых ответов:", self.first_k_spin)
+        form.addRow("Опоздавшие модели:", self.keep_stragglers_check)
+        form.addRow("Параллельных запросов:", parallel_row)
+        form.addRow("Потоковый вывод:", self.stream_check)
+        form.addRow("Попыток на запрос:", self.retries_spin)
+        form.addRow("Дубль запроса после перцентиля:", self.hedge_spin)
+        form.addRow("Максимальный размер ответа:", self.max_response_spin)
+        form.addRow("Хранить ответы в кэше:", self.cache_ttl_spin)
+        form.addRow("Кэш ответов:", cache_row)
+        form.addRow("Хранить логи запросов:", retention_row)
         form.addRow("Ширина окна:", self.width_spin)
         form.addRow("Высота окна:", self.height_spin)
         form.addRow("Тема:", self.theme_combo)
@@ -855,6 +1151,38 @@ class SettingsDialog(QDialog):
 
     def apply(self) -> None:
         self.db.set_setting("request_timeout_sec", str(self.timeout_spin.value()))
+        self.db.set_setting(
+            "adaptive_timeout", "1" if self.adaptive_timeout_check.isChecked() else "0"
+        )
+        self.db.set_setting(
+            "timeout_percentile", str(self.timeout_percentile_spin.value())
+        )
+        floor = self.timeout_floor_spin.value()
+        self.db.set_setting("timeout_floor_sec", str(floor))
+        self.db.set_setting(
+            "timeout_ceiling_sec", str(max(floor, self.timeout_ceiling_spin.value()))
+        )
+        self.db.set_setting("send_deadline_sec", str(self.deadline_spin.value()))
+        self.db.set_setting("send_first_k", str(self.first_k_spin.value()))
+        self.db.set_setting(
+            "keep_stragglers", "1" if self.keep_stragglers_check.isChecked() else "0"
+        )
+        self.db.set_setting(
+            "max_parallel_requests", str(self.parallel_spin.value())
+        )
+        self.db.set_setting(
+            "adaptive_concurrency",
+            "1" if self.adaptive_concurrency_check.isChecked() else "0",
+        )
+        self.db.set_setting(
+            "stream_responses", "1" if self.stream_check.isChecked() else "0"
+        )
+        self.db.set_setting("retry_max_attempts", str(self.retries_spin.value()))
+        self.db.set_setting("hedge_percentile", str(self.hedge_spin.value()))
+        self.db.set_setting("max_response_kb", str(self.max_response_spin.value()))
+        self.db.set_setting("cache_ttl_sec", str(self.cache_ttl_spin.value() * 3600))
+        self.db.set_setting("log_retention_days", str(self.retention_days_spin.value()))
+        self.db.set_setting("log_retention_rows", str(self.retention_rows_spin.value()))
         self.db.set_setting("window_width", str(self.width_spin.value()))
         self.db.set_setting("window_height", str(self.height_spin.value()))
         self.db.set_setting("db_path", str(self.db.db_path))
@@ -865,6 +1193,18 @@ class SettingsDialog(QDialog):
             self.improve_model_combo.currentData() or "",
         )
 
+    def _update_cache_stats(self) -> None:
+        stats = response_cache.stats()
+        self.cache_stats_label.setText(
+            f"в памяти {stats.entries} ({stats.bytes // 1024} КБ), "
+            f"попаданий {stats.hits + stats.disk_hits}, промахов {stats.misses}"
+        )
+
+    def _on_clear_cache(self) -> None:
+        self.db.cache_clear()
+        response_cache.clear()
+        self._update_cache_stats()
+
 
 class ImproveDialog(QDialog):
     """Показывает результат улучшения промта с кнопками «Подставить»."""
@@ -0,0 +1,153 @@
+"""
+Табличная модель Qt с подгрузкой страниц (canFetchMore / fetchMore): окно
+открывается за одну страницу keyset-выборки, сколько бы строк ни было в БД.
+"""
+
+from __future__ import annotations
+
+from collections.abc import Callable
+from dataclasses import dataclass
+from typing import Any
+
+from PyQt6.QtCore import QAbstractTableModel, QModelIndex, Qt
+from PyQt6.QtWidgets import QAbstractItemView, QTableView
+
+from db import PAGE_ROWS, PageCursor, page_cursor
+
+# Страница: курсор последней загруженной строки (None — с начала) и лимит.
+FetchPage = Callable[[PageCursor | None, int], list[dict[str, Any]]]
+
+
+@dataclass(frozen=True)
+class Column:
+    title: str
+    text: Callable[[dict[str, Any]], str]
+    numeric: bool = False
+    width: int | None = None
+
+
+class PagedTableModel(QAbstractTableModel):
+    """
+    Строки — dict из list_*_page. Следующая страница запрашивается, когда вид
+    докрутили до конца; reset() начинает заново, set_rows() показывает готовый
+    список (результаты поиска) без подгрузки.
+    """
+
+    def __init__(
+        self,
+        columns: list[Column],
+        fetch: FetchPage,
+        page_rows: int = PAGE_ROWS,
+        parent=None,
+    ) -> None:
+        super().__init__(parent)
+        self.columns = columns
+        self.page_rows = page_rows
+        self._fetch = fetch
+        self._rows: list[dict[str, Any]] = []
+        self._cursor: PageCursor | None = None
+        self._exhausted = False
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:  # noqa: N802
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent: QModelIndex = QModelIndex()) -> int:  # noqa: N802
+        return 0 if parent.isValid() else len(self.columns)
+
+    def data(self, index: QModelIndex, role: int = Qt.ItemDataRole.DisplayRole) -> Any:
+        if not index.isValid():
+            return None
+        column = self.columns[index.column()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return column.text(self._rows[index.row()])
+        if role == Qt.ItemDataRole.TextAlignmentRole and column.numeric:
+            return Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter
+        return None
+
+    def headerData(  # noqa: N802
+        self, section: int, orientation: Qt.Orientation, role: int = Qt.ItemDataRole.DisplayRole
+    ) -> Any:
+        if role != Qt.ItemDataRole.DisplayRole:
+            return None
+        if orientation == Qt.Orientation.Horizontal:
+            return self.columns[section].title
+        return section + 1
+
+    def canFetchMore(self, parent: QModelIndex = QModelIndex()) -> bool:  # noqa: N802
+        return not parent.isValid() and not self._exhausted
+
+    def fetchMore(self, parent: QModelIndex = QModelIndex()) -> None:  # noqa: N802
+        if parent.isValid() or self._exhausted:
+            return
+        rows = self._fetch(self._cursor, self.page_rows)
+        if len(rows) < self.page_rows:
+            self._exhausted = True
+        if not rows:
+            return
+        start = len(self._rows)
+        self.beginInsertRows(QModelIndex(), start, start + len(rows) - 1)
+        self._rows.extend(rows)
+        self.endInsertRows()
+        self._cursor = page_cursor(rows[-1])
+
+    def reset(self) -> None:
+        """Сначала: первая страница заново (после изменений в БД)."""
+        self.beginResetModel()
+        self._rows = []
+        self._cursor = None
+        self._exhausted = False
+        self.endResetModel()
+        self.fetchMore()
+
+    def set_rows(self, rows: list[dict[str, Any]]) -> None:
+        self.beginResetModel()
+        self._rows = list(rows)
+        self._cursor = None
+        self._exhausted = True
+        self.endResetModel()
+
+    def row(self, row: int) -> dict[str, Any]:
+        return self._rows[row]
+
+    def rows(self) -> list[dict[str, Any]]:
+        """Загруженные строки (не вся таблица БД)."""
+        return list(self._rows)
+
+    def find_id(self, row_id: int) -> int | None:
+        """Номер загруженной строки с таким id."""
+        for i, row in enumerate(self._rows):
+            if int(row["id"]) == row_id:
+                return i
+        return None
+
+
+def make_paged_view(model: PagedTableModel) -> QTableView:
+    """Вид для PagedTableModel: выбор строками, без сортировки по колонкам."""
+    view = QTableView()
+    view.setModel(model)
+    view.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+    view.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+    # Порядок задаёт keyset-выборка (новые первыми) или релевантность поиска;
+    # сортировка по колонке видела бы только загруженные страницы.
+    view.setSortingEnabled(False)
+    view.setAlternatingRowColors(True)
+    for i, column in enumerate(model.columns):
+        if column.width is not None:
+            view.setColumnWidth(i, column.width)
+    return view
+
+
+def selected_rows(view: QTableView) -> list[dict[str, Any]]:
+    model = view.model()
+    indexes = sorted(view.selectionModel().selectedRows(), key=lambda i: i.row())
+    return [model.row(i.row()) for i in indexes]
+
+
+def select_id(view: QTableView, row_id: int) -> bool:
+    """Выделяет загруженную строку с таким id; False — её нет среди загруженных."""
+    row = view.model().find_id(row_id)
+    if row is None:
+        view.clearSelection()
+        return False
+    view.selectRow(row)
+    return True
@@ -0,0 +1,215 @@
+"""
+Фоновая запись request_logs: один поток-писатель со своим соединением,
+ограниченная очередь и вставка пачками — запись на диск не задерживает
+доставку ответов.
+"""
+
+from __future__ import annotations
+
+import queue
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any
+
+from db import Database
+
+DEFAULT_MAX_ROWS = 10_000
+DEFAULT_BATCH_ROWS = 200
+# Сколько после первой строки пачки ждать остальные.
+DEFAULT_FLUSH_INTERVAL_SEC = 0.5
+# Сколько ждать места в полной очереди, прежде чем отбросить строку (0 — сразу).
+DEFAULT_BLOCK_SEC = 0.05
+
+
+@dataclass(frozen=True)
+class LogSinkStats:
+    written: int
+    dropped: int
+    batches: int
+    errors: int
+    pending: int
+
+
+def _now_iso() -> str:
+    return datetime.now(timezone.utc).replace(microsecond=0).isoformat()
+
+
+class _Flush:
+    """Метка в очереди: всё, что стояло до неё, записано."""
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+
+
+_STOP = object()
+
+
+class LogSink:
+    """
+    Совместим с Database.log_request / log_requests_many, но только ставит строки
+    в очередь (id записи не возвращает). Поток-писатель вставляет их пачками по
+    batch_rows или через flush_interval_sec после первой строки — одна транзакция
+    на пачку. Полная очередь: ждём block_sec, затем строка отбрасывается и
+    учитывается в stats().dropped.
+    """
+
+    def __init__(
+        self,
+        db_path: str | Path | None = None,
+        *,
+        max_rows: int = DEFAULT_MAX_ROWS,
+        batch_rows: int = DEFAULT_BATCH_ROWS,
+        flush_interval_sec: float = DEFAULT_FLUSH_INTERVAL_SEC,
+        block_sec: float = DEFAULT_BLOCK_SEC,
+    ) -> None:
+        self.db_path = db_path
+        self.batch_rows = max(1, batch_rows)
+        self.flush_interval_sec = max(0.0, flush_interval_sec)
+        self.block_sec = max(0.0, block_sec)
+        self._queue: queue.Queue[Any] = queue.Queue(maxsize=max(1, max_rows))
+        self._lock = threading.Lock()
+        self._written = 0
+        self._dropped = 0
+        self._batches = 0
+        self._errors = 0
+        self._closed = False
+        self._thread = threading.Thread(
+            target=self._run, daemon=True, name="log-sink"
+        )
+        self._thread.start()
+
+    def log_request(
+        self,
+        model_name: str,
+        prompt: str,
+        status: str,
+        response: str = "",
+        duration_ms: int = 0,
+        http_status: int | None = None,
+        ttft_ms: int | None = None,
+        attempt: int = 1,
+        **columns: Any,
+    ) -> None:
+        """Аргументы — как у Database.log_request (токены, стоимость, размер)."""
+        self._put(
+            {
+                "model_name": model_name,
+                "prompt": prompt,
+                "status": status,
+                "response": response,
+                "duration_ms": duration_ms,
+                "http_status": http_status,
+                "ttft_ms": ttft_ms,
+                "attempt": attempt,
+                **columns,
+            }
+        )
+
+    def log_requests_many(self, rows: list[dict[str, Any]]) -> None:
+        for row in rows:
+            self._put(row)
+
+    def _put(self, row: dict[str, Any]) -> bool:
+        # Время события, а не записи: пачка может лечь на диск позже.
+        return self._enqueue({"created_at": _now_iso(), **row})
+
+    def _enqueue(self, item: Any) -> bool:
+        if self._closed:
+            self._drop()
+            return False
+        try:
+            if self.block_sec > 0:
+                self._queue.put(item, timeout=self.block_sec)
+            else:
+                self._queue.put_nowait(item)
+        except queue.Full:
+            self._drop()
+            return False
+        return True
+
+    def _drop(self) -> None:
+        with self._lock:
+            self._dropped += 1
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Ждёт записи всего, что уже в очереди. False — не успели за timeout."""
+        if self._closed or not self._thread.is_alive():
+            return self._queue.empty()
+        marker = _Flush()
+        try:
+            self._queue.put(marker, timeout=timeout)
+        except queue.Full:
+            return False
+        return marker.done.wait(timeout)
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Дописывает очередь и останавливает поток (при выходе из приложения)."""
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            pass
+        self._thread.join(timeout)
+
+    def stats(self) -> LogSinkStats:
+        with self._lock:
+            return LogSinkStats(
+                written=self._written,
+                dropped=self._dropped,
+                batches=self._batches,
+                errors=self._errors,
+                pending=self._queue.qsize(),
+            )
+
+    def _write(self, db: Database, rows: list[dict[str, Any]]) -> None:
+        if not rows:
+            return
+        try:
+            db.log_requests_many(rows)
+        except sqlite3.Error:
+            with self._lock:
+                self._errors += 1
+                self._dropped += len(rows)
+            return
+        with self._lock:
+            self._written += len(rows)
+            self._batches += 1
+
+    def _run(self) -> None:
+        db = Database(self.db_path)
+        try:
+            stop = False
+            while not stop:
+                item = self._queue.get()
+                rows: list[dict[str, Any]] = []
+                markers: list[_Flush] = []
+                deadline = time.monotonic() + self.flush_interval_sec
+                while True:
+                    if item is _STOP:
+                        stop = True
+                    elif isinstance(item, _Flush):
+                        markers.append(item)
+                    else:
+                        rows.append(item)
+                    if stop or markers or len(rows) >= self.batch_rows:
+                        break
+                    remaining = deadline - time.monotonic()
+                    try:
+                        item = (
+                            self._queue.get(timeout=remaining)
+                            if remaining > 0
+                            else self._queue.get_nowait()
+                        )
+                    except queue.Empty:
+                        break
+                self._write(db, rows)
+                for marker in markers:
+                    marker.done.set()
+        finally:
+            db.close()
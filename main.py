@@ -3,19 +3,22 @@
 from __future__ import annotations
 
 import sys
+import threading
 import time
 from pathlib import Path
 
-from PyQt6.QtCore import Qt, QThread, pyqtSignal
+from PyQt6.QtCore import Qt, QThread, QTimer, pyqtSignal
 from PyQt6.QtGui import QIcon
 from PyQt6.QtWidgets import (
     QApplication,
+    QCheckBox,
     QComboBox,
     QHBoxLayout,
     QHeaderView,
     QLabel,
     QLineEdit,
     QMainWindow,
+    QMenu,
     QMessageBox,
     QPushButton,
     QTableWidget,
@@ -25,7 +28,14 @@ from PyQt6.QtWidgets import (
     QWidget,
 )
 
-from db import Database
+import breaker
+import cache
+import cassette
+import network
+import ratelimit
+from adapters import chat_payload
+from cache import cache_key, response_cache
+from db import Database, normalize_prompt
 from dialogs import (
     ImproveDialog,
     LogsDialog,
@@ -38,23 +48,115 @@ from dialogs import (
     configure_table,
     export_rows,
 )
-from models import MissingApiKeyError, get_active_models, validate_active_models
-from network import NetworkError, send_prompt
+from logsink import LogSink
+from maintenance import Maintenance
+from models import (
+    ActiveModel,
+    MissingApiKeyError,
+    get_active_models,
+    validate_active_models,
+)
+from network import (
+    DEFAULT_MAX_IN_FLIGHT,
+    CancelToken,
+    close_clients,
+    send_to_models,
+)
+from pricing import usage_columns
 from prompt_improver import ImproveResult, improve_prompt
+from retry import hedge_delay_sec, policy_from_settings
 from temp_results import TempResultsTable
+from timeouts import timeouts_for
+
+
+PARTIAL_EMIT_INTERVAL_SEC = 0.15
+# Как часто обновлять метрику параллельности во время рассылки.
+LIMITS_REFRESH_MS = 500
+# Текст строки модели, пока ответа ещё нет.
+PENDING_TEXT = "…"
 
 
 class SendWorker(QThread):
     finished_ok = pyqtSignal(list)
     finished_err = pyqtSignal(str)
-
-    def __init__(self, prompt_text: str, timeout_sec: float) -> None:
+    # model_id, model_name, накопленный текст ответа
+    partial = pyqtSignal(int, str, str)
+    # model_id, токены и стоимость ответа (аргументы save_result)
+    usage = pyqtSignal(int, dict)
+
+    def __init__(
+        self,
+        prompt_text: str,
+        timeout_sec: float,
+        max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+        stream: bool = False,
+        use_cache: bool = True,
+        db_path: Path | None = None,
+        deadline_sec: float | None = None,
+        first_k: int = 0,
+        keep_stragglers: bool = False,
+        log_sink: LogSink | None = None,
+    ) -> None:
         super().__init__()
         self.prompt_text = prompt_text
+        self.db_path = db_path
+        # Фоновый писатель request_logs; None — писать сразу в своё соединение.
+        self.log_sink = log_sink
         self.timeout_sec = timeout_sec
+        self.max_in_flight = max_in_flight
+        self.stream = stream
+        self.use_cache = use_cache
+        self.deadline_sec = deadline_sec
+        self.first_k = first_k
+        self.keep_stragglers = keep_stragglers
+        self.cache_hits = 0
+        self.coalesced = 0
+        self.deadline_missed = 0
+        self.late_answers = 0
+        self.cancelled_models = 0
+        self.not_sent = 0
+        # model_id → таймаут запроса по истории модели (timeouts.py).
+        self.timeouts: dict[int, float] = {}
+        self._last_emit: dict[int, float] = {}
+        # Модели с окончательным текстом в таблице: их поздние части не показываем.
+        self._settled: set[int] = set()
+        self._emit_lock = threading.Lock()
+        self._token = CancelToken()
+        self._model_tokens: dict[int, CancelToken] = {}
+
+    def _token_for(self, model_id: int) -> CancelToken:
+        with self._emit_lock:
+            token = self._model_tokens.get(model_id)
+            if token is None:
+                token = CancelToken(self._token)
+                self._model_tokens[model_id] = token
+            return token
+
+    def cancel(self) -> None:
+        """Стоп: обрывает все запросы; полученные ответы остаются."""
+        self._token.cancel()
+
+    def cancel_model(self, model_id: int) -> None:
+        self._token_for(model_id).cancel()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._token.cancelled
+
+    def _emit_partial(self, model: ActiveModel, text: str) -> None:
+        """Троттлинг: не чаще раза в PARTIAL_EMIT_INTERVAL_SEC на модель."""
+        now = time.monotonic()
+        with self._emit_lock:
+            if model.id in self._settled:
+                return
+            if now - self._last_emit.get(model.id, 0.0) < PARTIAL_EMIT_INTERVAL_SEC:
+                return
+            self._last_emit[model.id] = now
+            self.partial.emit(model.id, model.name, text)
 
     def run(self) -> None:
-        db = Database()
+        db = Database(self.db_path)
+        logs = self.log_sink or db
         try:
             try:
                 active = get_active_models(db)
@@ -65,44 +167,137 @@ class SendWorker(QThread):
             if not active:
                 self.finished_err.emit("Нет активных моделей в базе.")
                 return
-
-            items: list[tuple[int, str, str]] = []
+            ratelimit.configure_from_settings(db)
+            breaker.configure_from_settings(db)
+            cache.configure_from_settings(db)
+            network.configure_from_settings(db)
+            policy = policy_from_settings(db)
+
+            answers: dict[int, str] = {}
+            keys = {
+                model.id: cache_key(model, chat_payload(model.name, self.prompt_text))
+                for model in active
+            }
+            pending: list[ActiveModel] = []
+            cached_logs: list[dict] = []
             for model in active:
                 started = time.perf_counter()
-                http_status: int | None = None
-                try:
-                    answer = send_prompt(
-                        model, self.prompt_text, timeout_sec=self.timeout_sec
-                    )
-                    status = "ok"
-                except NetworkError as exc:
-                    answer = f"[Ошибка] {exc}"
-                    status = "error"
-                    http_status = exc.http_status
-                duration_ms = int((time.perf_counter() - started) * 1000)
-                db.log_request(
-                    model_name=model.name,
-                    prompt=self.prompt_text,
-                    status=status,
-                    response=answer,
-                    duration_ms=duration_ms,
-                    http_status=http_status,
+                hit = response_cache.get(keys[model.id], db) if self.use_cache else None
+                if hit is None:
+                    pending.append(model)
+                    continue
+                cached_logs.append(
+                    {
+                        "model_name": model.name,
+                        "prompt": self.prompt_text,
+                        "status": "cached",
+                        "response": hit,
+                        "duration_ms": int((time.perf_counter() - started) * 1000),
+                    }
                 )
-                items.append((model.id, model.name, answer))
-            self.finished_ok.emit(items)
+                answers[model.id] = hit
+                self.cache_hits += 1
+                self.partial.emit(model.id, model.name, hit)
+            if cached_logs:
+                logs.log_requests_many(cached_logs)
+            # Ответы из кэша идут в счёт first_k; набрано — рассылки нет,
+            # остальным моделям запрос не отправляется (и в лог не пишется).
+            first_k = max(self.first_k - self.cache_hits, 0) if self.first_k else 0
+            if self.first_k and not first_k:
+                for model in pending:
+                    answers[model.id] = (
+                        f"[Не отправлено] {model.name}: "
+                        f"получено первых ответов из кэша: {self.cache_hits}"
+                    )
+                    self.not_sent += 1
+                    self.partial.emit(model.id, model.name, answers[model.id])
+                pending = []
+
+            for model in pending:
+                self.partial.emit(model.id, model.name, PENDING_TEXT)
+            hedge_after = {
+                model.id: delay
+                for model in pending
+                if (delay := hedge_delay_sec(db, model.name, policy)) is not None
+            }
+            self.timeouts = timeouts_for(db, pending, self.timeout_sec)
+            outcomes = send_to_models(
+                pending,
+                self.prompt_text,
+                timeout_sec=self.timeout_sec,
+                max_in_flight=self.max_in_flight,
+                on_partial=self._emit_partial if self.stream else None,
+                policy=policy,
+                hedge_after=hedge_after,
+                deadline_sec=self.deadline_sec,
+                first_k=first_k,
+                keep_stragglers=self.keep_stragglers,
+                tokens={model.id: self._token_for(model.id) for model in pending},
+                timeouts=self.timeouts,
+            )
+            emitted = False
+            for outcome in outcomes:
+                # Логи попыток уходят фоновому писателю; без него — вместе
+                # с ответом в кэш одной транзакцией на модель.
+                with db.transaction():
+                    logs.log_requests_many(outcome.log_rows(self.prompt_text))
+                    if outcome.status == "ok":
+                        response_cache.put(
+                            keys[outcome.model.id],
+                            outcome.answer,
+                            model_name=outcome.model.name,
+                            db=db,
+                        )
+                if outcome.coalesced:
+                    self.coalesced += 1
+                if outcome.status == "deadline":
+                    self.deadline_missed += 1
+                elif outcome.status == "cancelled":
+                    self.cancelled_models += 1
+                elif outcome.model.id in answers:
+                    self.late_answers += 1
+                if outcome.status != "deadline" or not self.keep_stragglers:
+                    with self._emit_lock:
+                        self._settled.add(outcome.model.id)
+                answers[outcome.model.id] = outcome.answer
+                self.partial.emit(outcome.model.id, outcome.model.name, outcome.answer)
+                if outcome.usage is not None:
+                    self.usage.emit(
+                        outcome.model.id,
+                        usage_columns(outcome.usage, outcome.model.price),
+                    )
+                if not emitted and len(answers) == len(active):
+                    # Итог по всем моделям есть (опоздавшие могут ещё досылаться).
+                    emitted = True
+                    self.finished_ok.emit(self._items(active, answers))
+            if not emitted:
+                self.finished_ok.emit(self._items(active, answers))
         finally:
             db.close()
 
+    @staticmethod
+    def _items(
+        active: list[ActiveModel], answers: dict[int, str]
+    ) -> list[tuple[int, str, str]]:
+        return [(model.id, model.name, answers[model.id]) for model in active]
+
 
 class ImproveWorker(QThread):
     finished_ok = pyqtSignal(object)
     finished_err = pyqtSignal(str)
 
-    def __init__(self, prompt_text: str, timeout_sec: float, model_id: int | None) -> None:
+    def __init__(
+        self,
+        prompt_text: str,
+        timeout_sec: float,
+        model_id: int | None,
+        use_cache: bool = True,
+    ) -> None:
         super().__init__()
         self.prompt_text = prompt_text
         self.timeout_sec = timeout_sec
         self.model_id = model_id
+        self.use_cache = use_cache
 
     def run(self) -> None:
         db = Database()
@@ -115,6 +310,9 @@ class ImproveWorker(QThread):
             if not active:
                 self.finished_err.emit("Нет активных моделей.")
                 return
+            ratelimit.configure_from_settings(db)
+            cache.configure_from_settings(db)
+            network.configure_from_settings(db)
 
             model = None
             if self.model_id is not None:
@@ -122,7 +320,14 @@ class ImproveWorker(QThread):
             if model is None:
                 model = active[0]
 
-            result = improve_prompt(model, self.prompt_text, timeout_sec=self.timeout_sec)
+            result = improve_prompt(
+                model,
+                self.prompt_text,
+                timeout_sec=self.timeout_sec,
+                policy=policy_from_settings(db),
+                db=db,
+                use_cache=self.use_cache,
+            )
             self.finished_ok.emit(result)
         except Exception as exc:
             self.finished_err.emit(str(exc))
@@ -140,6 +345,10 @@ class MainWindow(QMainWindow):
 
         self.db = Database()
         self.db.seed_default_models()
+        self.log_sink = LogSink(self.db.db_path)
+        # Срок хранения логов, сводки и VACUUM — в своём потоке.
+        self.maintenance = Maintenance(self.db.db_path)
+        breaker.configure_from_settings(self.db)
         self._ensure_default_settings()
         self._apply_visual_settings()
         self._apply_window_size()
@@ -161,13 +370,27 @@ class MainWindow(QMainWindow):
         self._reload_improve_models()
 
         self.send_btn = QPushButton("Отправить")
+        self.stop_btn = QPushButton("Стоп")
+        self.stop_btn.setToolTip("Прервать запросы; полученные ответы останутся")
+        self.stop_btn.setEnabled(False)
         self.save_btn = QPushButton("Сохранить")
         self.save_btn.setEnabled(False)
         self.export_btn = QPushButton("Экспорт…")
         self.export_btn.setEnabled(False)
         self.open_btn = QPushButton("Open")
         self.open_btn.setEnabled(False)
+        self.bypass_cache_check = QCheckBox("Без кэша")
+        self.bypass_cache_check.setToolTip(
+            "Запросить модели заново, не используя сохранённые ответы"
+        )
         self.status_label = QLabel("")
+        self.limits_label = QLabel("")
+        self.limits_label.setToolTip(
+            "Запросов в работе / адаптивный лимит параллельности по провайдерам"
+        )
+        self.limits_timer = QTimer(self)
+        self.limits_timer.setInterval(LIMITS_REFRESH_MS)
+        self.limits_timer.timeout.connect(self._refresh_limits)
 
         self.search = QLineEdit()
         self.search.setPlaceholderText("Поиск по таблице результатов…")
@@ -191,13 +414,16 @@ class MainWindow(QMainWindow):
 
         buttons = QHBoxLayout()
         buttons.addWidget(self.send_btn)
+        buttons.addWidget(self.stop_btn)
         buttons.addWidget(self.improve_btn)
         buttons.addWidget(self.improve_model_combo)
         buttons.addWidget(self.save_btn)
         buttons.addWidget(self.export_btn)
         buttons.addWidget(self.open_btn)
+        buttons.addWidget(self.bypass_cache_check)
         buttons.addStretch()
         buttons.addWidget(self.status_label)
+        buttons.addWidget(self.limits_label)
 
         layout = QVBoxLayout()
         layout.addLayout(top)
@@ -214,6 +440,9 @@ class MainWindow(QMainWindow):
 
         self.prompt_combo.currentIndexChanged.connect(self._on_prompt_chosen)
         self.send_btn.clicked.connect(self._on_send)
+        self.stop_btn.clicked.connect(self._on_stop)
+        self.table.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
+        self.table.customContextMenuRequested.connect(self._on_table_menu)
         self.improve_btn.clicked.connect(self._on_improve)
         self.save_btn.clicked.connect(self._on_save)
         self.export_btn.clicked.connect(self._on_export)
@@ -241,6 +470,10 @@ class MainWindow(QMainWindow):
     def _ensure_default_settings(self) -> None:
         if self.db.get_setting("request_timeout_sec") is None:
             self.db.set_setting("request_timeout_sec", "60")
+        if self.db.get_setting("max_parallel_requests") is None:
+            self.db.set_setting("max_parallel_requests", str(DEFAULT_MAX_IN_FLIGHT))
+        if self.db.get_setting("stream_responses") is None:
+            self.db.set_setting("stream_responses", "1")
         if self.db.get_setting("window_width") is None:
             self.db.set_setting("window_width", "900")
         if self.db.get_setting("window_height") is None:
@@ -322,6 +555,7 @@ class MainWindow(QMainWindow):
         ResultsDialog(self.db, self).exec()
 
     def _open_logs(self) -> None:
+        self.log_sink.flush()
         LogsDialog(self.db, self).exec()
 
     def _open_settings(self) -> None:
@@ -347,6 +581,12 @@ class MainWindow(QMainWindow):
         )
 
     def closeEvent(self, event) -> None:  # noqa: N802
+        if self.worker is not None and self.worker.isRunning():
+            self.worker.cancel()
+            self.worker.wait(5000)
+        close_clients()
+        self.maintenance.close()
+        self.log_sink.close()
         self.db.close()
         super().closeEvent(event)
 
@@ -358,7 +598,11 @@ class MainWindow(QMainWindow):
             )
         else:
             active_n = len(self.db.list_models(active_only=True))
-            self.status_label.setText(f"Активных моделей: {active_n}")
+            status = f"Активных моделей: {active_n}"
+            unhealthy = breaker.open_models()
+            if unhealthy:
+                status += f" · отключены: {len(unhealthy)}"
+            self.status_label.setText(status)
 
     def _reload_prompts(self) -> None:
         current = self.prompt_combo.currentData()
@@ -392,6 +636,28 @@ class MainWindow(QMainWindow):
         except ValueError:
             return 60.0
 
+    def _max_in_flight(self) -> int:
+        raw = self.db.get_setting("max_parallel_requests", "") or ""
+        try:
+            return max(1, int(raw))
+        except ValueError:
+            return DEFAULT_MAX_IN_FLIGHT
+
+    def _deadline_sec(self) -> float | None:
+        raw = self.db.get_setting("send_deadline_sec", "") or ""
+        try:
+            value = float(raw)
+        except ValueError:
+            return None
+        return value if value > 0 else None
+
+    def _first_k(self) -> int:
+        raw = self.db.get_setting("send_first_k", "") or ""
+        try:
+            return max(0, int(raw))
+        except ValueError:
+            return 0
+
     def _on_send(self) -> None:
         text = self.prompt_edit.toPlainText().strip()
         if not text:
@@ -412,7 +678,8 @@ class MainWindow(QMainWindow):
                 self.prompt_combo.setCurrentIndex(idx)
         else:
             stored = self.db.get_prompt(self.current_prompt_id)
-            if stored and stored["prompt"] != text:
+            # Правка только пробелов/переводов строк — тот же промт (prompt_hash).
+            if stored and normalize_prompt(stored["prompt"]) != normalize_prompt(text):
                 self.current_prompt_id = self.db.create_prompt(text)
                 self._reload_prompts()
                 idx = self.prompt_combo.findData(self.current_prompt_id)
@@ -420,13 +687,48 @@ class MainWindow(QMainWindow):
                     self.prompt_combo.setCurrentIndex(idx)
 
         self.send_btn.setEnabled(False)
+        self.stop_btn.setEnabled(True)
         self.status_label.setText("Отправка…")
 
-        self.worker = SendWorker(text, self._timeout_sec())
+        self.worker = SendWorker(
+            text,
+            self._timeout_sec(),
+            self._max_in_flight(),
+            stream=self.db.get_setting("stream_responses", "1") == "1",
+            use_cache=not self.bypass_cache_check.isChecked(),
+            deadline_sec=self._deadline_sec(),
+            first_k=self._first_k(),
+            keep_stragglers=self.db.get_setting("keep_stragglers", "0") == "1",
+            log_sink=self.log_sink,
+        )
+        self.worker.partial.connect(self._on_send_partial)
+        self.worker.usage.connect(self.temp.set_usage)
         self.worker.finished_ok.connect(self._on_send_ok)
         self.worker.finished_err.connect(self._on_send_err)
-        self.worker.finished.connect(lambda: self.send_btn.setEnabled(True))
+        self.worker.finished.connect(self._on_send_done)
         self.worker.start()
+        self.limits_timer.start()
+
+    def _on_send_partial(self, model_id: int, model_name: str, text: str) -> None:
+        is_new = self.temp.update_response(
+            model_id=model_id,
+            model_name=model_name,
+            response=text,
+            prompt_id=self.current_prompt_id,
+            prompt_text=self.prompt_edit.toPlainText().strip(),
+        )
+        if is_new:
+            self._fill_table()
+            return
+        for i in range(self.table.rowCount()):
+            name_item = self.table.item(i, 0)
+            if name_item and name_item.data(Qt.ItemDataRole.UserRole) == model_id:
+                resp_item = self.table.item(i, 1)
+                if resp_item is not None:
+                    self.table.blockSignals(True)
+                    resp_item.setText(text)
+                    self.table.blockSignals(False)
+                return
 
     def _on_send_ok(self, items: list) -> None:
         text = self.prompt_edit.toPlainText().strip()
@@ -440,7 +742,68 @@ class MainWindow(QMainWindow):
         self.save_btn.setEnabled(has_rows)
         self.export_btn.setEnabled(has_rows)
         self.open_btn.setEnabled(has_rows)
-        self.status_label.setText(f"Получено ответов: {len(items)}")
+        missed = self.worker.deadline_missed if self.worker is not None else 0
+        cancelled = self.worker.cancelled_models if self.worker is not None else 0
+        not_sent = self.worker.not_sent if self.worker is not None else 0
+        status = f"Получено ответов: {len(items) - missed - cancelled - not_sent}"
+        if cancelled:
+            status += f" · отменено: {cancelled}"
+        if self.worker is not None and self.worker.cache_hits:
+            status += f" (из кэша: {self.worker.cache_hits})"
+        if not_sent:
+            status += f" · не отправлено: {not_sent}"
+        if self.worker is not None and self.worker.coalesced:
+            status += f" · объединено одинаковых: {self.worker.coalesced}"
+        if missed:
+            status += f" · не дождались: {missed}"
+            if self.worker.keep_stragglers:
+                status += " (ждём в фоне)"
+        skipped = breaker.open_models()
+        if skipped:
+            names = ", ".join(s.model_name for s in skipped)
+            status += f" · отключены: {names}"
+        self.status_label.setText(status)
+
+    def _on_stop(self) -> None:
+        if self.worker is not None and self.worker.isRunning():
+            self.worker.cancel()
+            self.stop_btn.setEnabled(False)
+            self.status_label.setText("Отмена…")
+
+    def _on_table_menu(self, pos) -> None:
+        item = self.table.itemAt(pos)
+        worker = self.worker
+        if item is None or worker is None or not worker.isRunning():
+            return
+        name_item = self.table.item(item.row(), 0)
+        if name_item is None:
+            return
+        model_id = name_item.data(Qt.ItemDataRole.UserRole)
+        menu = QMenu(self)
+        action = menu.addAction(f"Отменить запрос к {name_item.text()}")
+        if menu.exec(self.table.viewport().mapToGlobal(pos)) is action:
+            worker.cancel_model(int(model_id))
+
+    def _refresh_limits(self) -> None:
+        text = ratelimit.format_concurrency()
+        self.limits_label.setText(f"· {text}" if text else "")
+
+    def _on_send_done(self) -> None:
+        self.send_btn.setEnabled(True)
+        self.stop_btn.setEnabled(False)
+        self.limits_timer.stop()
+        self._refresh_limits()
+        worker = self.worker
+        if worker is not None and worker.keep_stragglers and worker.deadline_missed:
+            text = self.status_label.text().replace(" (ждём в фоне)", "")
+            if text == "Отмена…":
+                text = "Остановлено"
+            self.status_label.setText(f"{text} · дошло позже: {worker.late_answers}")
+        dropped = self.log_sink.stats().dropped
+        if dropped:
+            self.status_label.setText(
+                f"{self.status_label.text()} · не записано в лог: {dropped}"
+            )
 
     def _on_send_err(self, message: str) -> None:
         self.status_label.setText("")
@@ -552,7 +915,12 @@ class MainWindow(QMainWindow):
         self.improve_btn.setEnabled(False)
         self.status_label.setText("Улучшение промта…")
 
-        self.improve_worker = ImproveWorker(text, self._timeout_sec(), model_id)
+        self.improve_worker = ImproveWorker(
+            text,
+            self._timeout_sec(),
+            model_id,
+            use_cache=not self.bypass_cache_check.isChecked(),
+        )
         self.improve_worker.finished_ok.connect(self._on_improve_ok)
         self.improve_worker.finished_err.connect(self._on_improve_err)
         self.improve_worker.finished.connect(
@@ -561,7 +929,9 @@ class MainWindow(QMainWindow):
         self.improve_worker.start()
 
     def _on_improve_ok(self, result: ImproveResult) -> None:
-        self.status_label.setText("Промт улучшен")
+        self.status_label.setText(
+            "Промт улучшен (из кэша)" if result.cached else "Промт улучшен"
+        )
         original = self.prompt_edit.toPlainText().strip()
         dlg = ImproveDialog(original, result, self)
         dlg.applied.connect(self._apply_improved)
@@ -590,8 +960,17 @@ class MainWindow(QMainWindow):
             prompt_id = self.db.create_prompt(text)
             self.current_prompt_id = prompt_id
 
-        for row in selected:
-            self.db.save_result(prompt_id, row.model_id, row.response)
+        self.db.save_results_many(
+            [
+                {
+                    "prompt_id": prompt_id,
+                    "model_id": row.model_id,
+                    "response": row.response,
+                    **row.usage,
+                }
+                for row in selected
+            ]
+        )
 
         self.temp.clear()
         self._fill_table()
@@ -605,6 +984,8 @@ class MainWindow(QMainWindow):
 
 
 def main() -> None:
+    # Запись/воспроизведение обмена с API — из CHATLIST_CASSETTE* (см. cassette.py).
+    cassette.configure_from_env()
     app = QApplication(sys.argv)
     window = MainWindow()
     window.show()
@@ -0,0 +1,203 @@
+"""
+Обслуживание БД в фоне: срок хранения request_logs (по возрасту и числу
+строк) со сводками по часам перед удалением, возврат места файлу
+(auto_vacuum = INCREMENTAL) и PRAGMA optimize. Свой поток и своё соединение —
+GUI не ждёт; удаление идёт пачками, и запись логов не блокируется надолго.
+"""
+
+from __future__ import annotations
+
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+from db import Database
+
+# Срок хранения по умолчанию выключен: удалённые логи не восстановить (остаются
+# только сводки), поэтому его включает пользователь в настройках.
+DEFAULT_RETENTION_DAYS = 0
+DEFAULT_RETENTION_ROWS = 0
+# Первый проход — не сразу после запуска, дальше раз в интервал.
+DEFAULT_START_DELAY_SEC = 60.0
+DEFAULT_INTERVAL_SEC = 3600.0
+# Строк логов на транзакцию удаления и страниц на шаг incremental_vacuum.
+PRUNE_BATCH_ROWS = 5000
+VACUUM_STEP_PAGES = 2048
+
+
+@dataclass(frozen=True)
+class RetentionPolicy:
+    """Сколько хранить request_logs; 0 — без ограничения."""
+
+    max_age_days: int = DEFAULT_RETENTION_DAYS
+    max_rows: int = DEFAULT_RETENTION_ROWS
+
+
+@dataclass(frozen=True)
+class MaintenanceReport:
+    pruned: int
+    rollups: int
+    freed_pages: int
+    # БД переведена в auto_vacuum = INCREMENTAL (полный VACUUM) в этом проходе.
+    converted: bool
+    seconds: float
+
+    def format(self) -> str:
+        text = (
+            f"Логов удалено: {self.pruned} (сводок по часам: {self.rollups}), "
+            f"страниц возвращено: {self.freed_pages}, {self.seconds:.1f} с"
+        )
+        if self.converted:
+            text += "; БД переведена в auto_vacuum=INCREMENTAL"
+        return text
+
+
+def _int_setting(db: Database, key: str, fallback: int) -> int:
+    try:
+        return max(0, int(float(db.get_setting(key, "") or fallback)))
+    except ValueError:
+        return fallback
+
+
+def policy_from_settings(db: Database) -> RetentionPolicy:
+    """log_retention_days и log_retention_rows из settings (0 — без ограничения)."""
+    return RetentionPolicy(
+        max_age_days=_int_setting(db, "log_retention_days", DEFAULT_RETENTION_DAYS),
+        max_rows=_int_setting(db, "log_retention_rows", DEFAULT_RETENTION_ROWS),
+    )
+
+
+def run_maintenance(
+    db: Database,
+    policy: RetentionPolicy | None = None,
+    *,
+    batch_rows: int = PRUNE_BATCH_ROWS,
+    stop: threading.Event | None = None,
+    convert: bool = False,
+) -> MaintenanceReport:
+    """
+    Один проход: удалить логи сверх policy со сводками, слить FTS-индекс
+    логов, вернуть свободные страницы шагами incremental_vacuum (и checkpoint
+    WAL, чтобы файл укоротился), PRAGMA optimize. stop прерывает проход между
+    пачками.
+
+    convert — перевести старую БД в auto_vacuum = INCREMENTAL полным VACUUM
+    (уже без удалённых строк, и только если есть что вернуть). VACUUM держит
+    блокировку записи всё время перезаписи, поэтому его делает только
+    python -m chatlist maintain, а не фоновый поток GUI.
+    """
+    started = time.perf_counter()
+    policy = policy or policy_from_settings(db)
+    pruned = rollups = freed = 0
+    cutoff = db.log_prune_cutoff(policy.max_age_days, policy.max_rows)
+    while cutoff is not None and not (stop is not None and stop.is_set()):
+        rows, touched = db.prune_logs(cutoff, batch_rows)
+        if rows == 0:
+            break
+        pruned += rows
+        rollups += touched
+    if pruned:
+        db.compact_log_index()
+    converted = False
+    free = db.free_pages()
+    if convert and free and not (stop is not None and stop.is_set()):
+        converted = db.enable_incremental_vacuum()
+        if converted:
+            freed = free
+    while not converted and not (stop is not None and stop.is_set()):
+        step = db.incremental_vacuum(VACUUM_STEP_PAGES)
+        if step <= 0:
+            break
+        freed += step
+    if freed:
+        db.checkpoint()
+    db.optimize()
+    return MaintenanceReport(
+        pruned=pruned,
+        rollups=rollups,
+        freed_pages=freed,
+        converted=converted,
+        seconds=time.perf_counter() - started,
+    )
+
+
+class Maintenance:
+    """
+    Поток обслуживания: первый проход через start_delay_sec, дальше каждые
+    interval_sec; run_now() — внеочередной. Ошибки SQLite (например, занятая
+    БД) не останавливают поток: проход повторится в следующий раз.
+    """
+
+    def __init__(
+        self,
+        db_path: str | Path | None = None,
+        *,
+        start_delay_sec: float = DEFAULT_START_DELAY_SEC,
+        interval_sec: float = DEFAULT_INTERVAL_SEC,
+    ) -> None:
+        self.db_path = db_path
+        self.start_delay_sec = max(0.0, start_delay_sec)
+        self.interval_sec = max(1.0, interval_sec)
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._last: MaintenanceReport | None = None
+        self._last_error = ""
+        self._passes = 0
+        self._thread = threading.Thread(
+            target=self._run, daemon=True, name="db-maintenance"
+        )
+        self._thread.start()
+
+    def run_now(self) -> None:
+        self._wake.set()
+
+    def last_report(self) -> MaintenanceReport | None:
+        with self._lock:
+            return self._last
+
+    def last_error(self) -> str:
+        with self._lock:
+            return self._last_error
+
+    def passes(self) -> int:
+        with self._lock:
+            return self._passes
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Прерывает проход между пачками и останавливает поток."""
+        self._stop.set()
+        self._wake.set()
+        self._thread.join(timeout)
+
+    def _run(self) -> None:
+        delay = self.start_delay_sec
+        while True:
+            self._wake.wait(delay)
+            self._wake.clear()
+            if self._stop.is_set():
+                return
+            self._pass()
+            delay = self.interval_sec
+
+    def _pass(self) -> None:
+        try:
+            db = Database(self.db_path)
+        except sqlite3.Error as exc:
+            with self._lock:
+                self._last_error = str(exc)
+            return
+        try:
+            report = run_maintenance(db, stop=self._stop)
+        except sqlite3.Error as exc:
+            with self._lock:
+                self._last_error = str(exc)
+        else:
+            with self._lock:
+                self._last = report
+                self._last_error = ""
+                self._passes += 1
+        finally:
+            db.close()
@@ -0,0 +1,363 @@
+"""
+Локальный OpenAI-совместимый сервер-заглушка для бенчмарков и ручной проверки.
+
+    python -m mock_server --port 8765 --latency lognormal:300,0.6 --error-rate 0.02
+
+Отвечает на POST …/chat/completions: обычный JSON или SSE (stream: true),
+с заданным распределением задержки, долей ошибок 500 и ответов 429;
+--capacity — 429 на запросы сверх стольких одновременных; --gzip — сжатие
+ответов для клиентов с Accept-Encoding: gzip.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import random
+import sys
+import threading
+import time
+import zlib
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WORDS = (
+    "lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod "
+    "tempor incididunt ut labore et dolore magna aliqua"
+).split()
+
+Latency = Callable[[random.Random], float]
+
+
+def parse_latency(spec: str) -> Latency:
+    """
+    Задержка ответа в секундах по описанию (значения в мс):
+    fixed:100, uniform:50,300, normal:200,50, lognormal:<медиана>,<sigma>, exp:<среднее>.
+    """
+    kind, _, raw = spec.partition(":")
+    try:
+        args = [float(x) for x in raw.split(",") if x.strip()]
+    except ValueError as exc:
+        raise ValueError(f"Некорректная задержка: {spec}") from exc
+    kind = kind.strip().lower()
+    if kind == "fixed" and len(args) == 1:
+        return lambda _rng: args[0] / 1000.0
+    if kind == "uniform" and len(args) == 2:
+        return lambda rng: rng.uniform(args[0], args[1]) / 1000.0
+    if kind == "normal" and len(args) == 2:
+        return lambda rng: max(0.0, rng.gauss(args[0], args[1])) / 1000.0
+    if kind == "lognormal" and len(args) == 2:
+        mu = math.log(max(args[0], 1e-3))
+        return lambda rng: rng.lognormvariate(mu, args[1]) / 1000.0
+    if kind == "exp" and len(args) == 1 and args[0] > 0:
+        return lambda rng: rng.expovariate(1000.0 / args[0])
+    raise ValueError(f"Некорректная задержка: {spec}")
+
+
+@dataclass
+class MockConfig:
+    latency: str = "fixed:50"
+    # Доли запросов, получающих 500 и 429 (0–1).
+    error_rate: float = 0.0
+    rate_limit_rate: float = 0.0
+    retry_after_sec: float = 1.0
+    answer_words: int = 40
+    # На сколько SSE-событий делится ответ; задержка — до первого события.
+    stream_chunks: int = 8
+    chunk_delay_ms: float = 5.0
+    seed: int | None = None
+    # Сколько запросов сервер держит одновременно; сверх — 429 (0 — без предела).
+    capacity: int = 0
+    # Сжимать ответы gzip, если клиент их принимает.
+    gzip: bool = False
+
+
+@dataclass
+class MockStats:
+    requests: int = 0
+    connections: int = 0
+    by_status: dict[int, int] = field(default_factory=dict)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    server: _MockHTTPServer
+
+    def setup(self) -> None:
+        super().setup()
+        with self.server.lock:
+            self.server.stats.connections += 1
+
+    def log_message(self, *_args) -> None:
+        pass
+
+    def _count(self, status: int) -> None:
+        with self.server.lock:
+            self.server.stats.requests += 1
+            by_status = self.server.stats.by_status
+            by_status[status] = by_status.get(status, 0) + 1
+
+    def _compressor(self):
+        """gzip-компрессор, если сжатие включено и клиент его принимает."""
+        accepted = self.headers.get("Accept-Encoding") or ""
+        if not self.server.config.gzip or "gzip" not in accepted.lower():
+            return None
+        self.send_header("Content-Encoding", "gzip")
+        return zlib.compressobj(6, zlib.DEFLATED, 31)
+
+    def _send_json(self, status: int, body: dict, headers: dict[str, str] | None = None) -> None:
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        compressor = self._compressor()
+        if compressor is not None:
+            data = compressor.compress(data) + compressor.flush()
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+        self._count(status)
+
+    def _chunk(self, data: bytes) -> None:
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_POST(self) -> None:  # noqa: N802
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            self._send_json(400, {"error": {"message": "invalid JSON"}})
+            return
+        if not self.path.rstrip("/").endswith("chat/completions"):
+            self._send_json(404, {"error": {"message": f"unknown path {self.path}"}})
+            return
+
+        config = self.server.config
+        with self.server.lock:
+            over_capacity = 0 < config.capacity <= self.server.active
+            if not over_capacity:
+                self.server.active += 1
+        if over_capacity:
+            self._send_json(
+                429,
+                {"error": {"message": "over capacity"}},
+                {"Retry-After": f"{config.retry_after_sec:g}"},
+            )
+            return
+        try:
+            self._respond(payload, config)
+        finally:
+            with self.server.lock:
+                self.server.active -= 1
+
+    def _respond(self, payload: dict, config: MockConfig) -> None:
+        with self.server.lock:
+            roll = self.server.rng.random()
+            delay = self.server.latency(self.server.rng)
+            words = [
+                self.server.rng.choice(WORDS) for _ in range(max(config.answer_words, 1))
+            ]
+        if roll < config.rate_limit_rate:
+            self._send_json(
+                429,
+                {"error": {"message": "rate limited"}},
+                {"Retry-After": f"{config.retry_after_sec:g}"},
+            )
+            return
+        time.sleep(delay)
+        if roll < config.rate_limit_rate + config.error_rate:
+            self._send_json(500, {"error": {"message": "mock upstream error"}})
+            return
+
+        model = str(payload.get("model", ""))
+        answer = f"[{model}] " + " ".join(words)
+        usage = {
+            "prompt_tokens": sum(
+                len(str(m.get("content", "")).split())
+                for m in payload.get("messages", [])
+                if isinstance(m, dict)
+            ),
+            "completion_tokens": len(words) + 1,
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+
+        if not payload.get("stream"):
+            self._send_json(
+                200,
+                {
+                    "id": "mock",
+                    "object": "chat.completion",
+                    "model": model,
+                    "choices": [
+                        {
+                            "index": 0,
+                            "message": {"role": "assistant", "content": answer},
+                            "finish_reason": "stop",
+                        }
+                    ],
+                    "usage": usage,
+                },
+            )
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        compressor = self._compressor()
+        self.end_headers()
+
+        def send_event(data: bytes) -> None:
+            if compressor is not None:
+                # Z_SYNC_FLUSH — клиент распаковывает событие сразу, не дожидаясь конца.
+                data = compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            self._chunk(data)
+
+        pieces = max(config.stream_chunks, 1)
+        step = math.ceil(len(answer) / pieces)
+        for i in range(0, len(answer), step):
+            if i:
+                time.sleep(config.chunk_delay_ms / 1000.0)
+            event = {"choices": [{"index": 0, "delta": {"content": answer[i : i + step]}}]}
+            send_event(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+        final = {"choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}], "usage": usage}
+        send_event(f"data: {json.dumps(final)}\n\n".encode("utf-8"))
+        send_event(b"data: [DONE]\n\n")
+        if compressor is not None:
+            self._chunk(compressor.flush())
+        self._chunk(b"")
+        self._count(200)
+
+
+class _MockHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Очередь listen() по умолчанию (5) сбрасывает соединения при десятках клиентов.
+    request_queue_size = 128
+
+    def __init__(self, address: tuple[str, int], config: MockConfig) -> None:
+        super().__init__(address, _Handler)
+        self.config = config
+        self.latency = parse_latency(config.latency)
+        self.rng = random.Random(config.seed)
+        self.lock = threading.Lock()
+        self.stats = MockStats()
+        self.active = 0
+
+    def handle_error(self, request, client_address) -> None:
+        # Клиент оборвал соединение (отмена, проигравший дубль) — не ошибка сервера.
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            return
+        super().handle_error(request, client_address)
+
+
+class MockServer:
+    """Сервер в фоновом потоке: with MockServer(config) as server: server.url …"""
+
+    def __init__(
+        self, config: MockConfig | None = None, host: str = "127.0.0.1", port: int = 0
+    ) -> None:
+        self._server = _MockHTTPServer((host, port), config or MockConfig())
+        self._thread: threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1/chat/completions"
+
+    def start(self) -> MockServer:
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, daemon=True, name="mock-server"
+        )
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def serve_forever(self) -> None:
+        """Обслуживание в текущем потоке до KeyboardInterrupt."""
+        try:
+            self._server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self._server.server_close()
+
+    def stats(self) -> MockStats:
+        with self._server.lock:
+            current = self._server.stats
+            return MockStats(
+                current.requests, current.connections, dict(current.by_status)
+            )
+
+    def reset_stats(self) -> None:
+        with self._server.lock:
+            self._server.stats = MockStats()
+
+    def __enter__(self) -> MockServer:
+        return self.start()
+
+    def __exit__(self, *_exc) -> None:
+        self.stop()
+
+
+def add_config_arguments(parser: argparse.ArgumentParser) -> None:
+    defaults = MockConfig()
+    parser.add_argument("--latency", default=defaults.latency, help="распределение задержки, мс")
+    parser.add_argument("--error-rate", type=float, default=defaults.error_rate)
+    parser.add_argument("--rate-limit-rate", type=float, default=defaults.rate_limit_rate)
+    parser.add_argument("--retry-after", type=float, default=defaults.retry_after_sec)
+    parser.add_argument("--answer-words", type=int, default=defaults.answer_words)
+    parser.add_argument("--stream-chunks", type=int, default=defaults.stream_chunks)
+    parser.add_argument("--chunk-delay-ms", type=float, default=defaults.chunk_delay_ms)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument(
+        "--capacity",
+        type=int,
+        default=defaults.capacity,
+        help="одновременных запросов до ответа 429 (0 — без предела)",
+    )
+    parser.add_argument("--gzip", action="store_true", help="сжимать ответы gzip")
+
+
+def config_from_args(args: argparse.Namespace) -> MockConfig:
+    config = MockConfig(
+        latency=args.latency,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        retry_after_sec=args.retry_after,
+        answer_words=args.answer_words,
+        stream_chunks=args.stream_chunks,
+        chunk_delay_ms=args.chunk_delay_ms,
+        seed=args.seed,
+        capacity=args.capacity,
+        gzip=args.gzip,
+    )
+    parse_latency(config.latency)
+    return config
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_config_arguments(parser)
+    args = parser.parse_args()
+    try:
+        config = config_from_args(args)
+    except ValueError as exc:
+        parser.error(str(exc))
+    server = MockServer(config, args.host, args.port)
+    print(f"Mock API: {server.url}  (Ctrl+C — стоп)")
+    server.serve_forever()
+    stats = server.stats()
+    print(f"Запросов: {stats.requests}, соединений: {stats.connections}, {stats.by_status}")
+
+
+if __name__ == "__main__":
+    main()
@@ -9,6 +9,7 @@ from pathlib import Path
 from dotenv import load_dotenv
 
 from db import Database
+from pricing import ModelPrice, price_from_row
 
 
 @dataclass(frozen=True)
@@ -18,6 +19,8 @@ class ActiveModel:
     api_url: str
     api_id: str
     api_key: str
+    # Цена для подсчёта стоимости запросов; None — не задана.
+    price: ModelPrice | None = None
 
 
 class MissingApiKeyError(Exception):
@@ -67,6 +70,7 @@ def get_active_models(db: Database) -> list[ActiveModel]:
                 api_url=row["api_url"],
                 api_id=api_id,
                 api_key=key,
+                price=price_from_row(row),
             )
         )
     return result
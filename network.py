@@ -2,18 +2,819 @@
 
 from __future__ import annotations
 
+import hashlib
+import importlib.util
+import json
+import math
+import socket
+import threading
+import time
+from collections.abc import Callable, Iterator, Mapping, Sequence
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ThreadPoolExecutor,
+    as_completed,
+    wait,
+)
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, TypeVar
+from urllib.parse import urlsplit
+
+import httpcore
 import httpx
 
-from adapters import chat_payload, extra_headers, parse_chat_content
+from adapters import (
+    SSE_DONE,
+    Usage,
+    chat_payload,
+    detect_provider,
+    extra_headers,
+    parse_chat_content,
+    parse_chat_delta,
+    parse_usage,
+    sse_data,
+    stream_options,
+    truncated_chat_content,
+)
+import breaker
+import cassette
+from db import Database
 from models import ActiveModel
+from pricing import usage_columns
+from ratelimit import AcquireCancelled, ProviderLimiter, RateLimitTimeout, limiter_for
+from retry import NO_RETRY, RetryPolicy
+
+DEFAULT_MAX_IN_FLIGHT = 8
+PROBE_TIMEOUT_SEC = 15.0
+
+# Ответ больше этого обрезается с пометкой (тело JSON или текст потока в памяти).
+DEFAULT_MAX_RESPONSE_KB = 2048
+# Сколько байт тела ошибки читается для сообщения.
+ERROR_DETAIL_BYTES = 4096
+# Поток: накопленный текст собирается и рассылается не чаще раза в столько секунд.
+PUBLISH_INTERVAL_SEC = 0.05
+
+POOL_LIMITS = httpx.Limits(
+    max_connections=32,
+    max_keepalive_connections=16,
+    keepalive_expiry=120.0,
+)
+
+_clients: dict[str, httpx.Client] = {}
+_clients_lock = threading.Lock()
+
+_max_response_bytes = DEFAULT_MAX_RESPONSE_KB * 1024
+
+_flights: dict[str, _Flight] = {}
+_flights_lock = threading.Lock()
+_coalesced_total = 0
+
+T = TypeVar("T")
 
 
 class NetworkError(Exception):
     """Ошибка сети или ответа API."""
 
-    def __init__(self, message: str, http_status: int | None = None) -> None:
+    def __init__(
+        self,
+        message: str,
+        http_status: int | None = None,
+        *,
+        retryable: bool | None = None,
+        timed_out: bool = False,
+    ) -> None:
         super().__init__(message)
         self.http_status = http_status
+        # Попытку оборвал таймаут запроса (request_logs.timed_out).
+        self.timed_out = timed_out
+        if retryable is None:
+            retryable = http_status == 429 or (http_status or 0) >= 500
+        # Таймауты, обрывы соединения, 429 и 5xx имеет смысл повторить.
+        self.retryable = retryable
+        self.attempt = 0
+
+
+class RequestCancelled(NetworkError):
+    """Запрос отменён: проигравший дубль хеджа или отмена пользователем."""
+
+    def __init__(self, message: str = "Запрос отменён") -> None:
+        super().__init__(message, retryable=False)
+
+
+class CancelToken:
+    """
+    Флаг отмены запроса. cancel() будит ожидание и обрывает сокет,
+    на чтении/записи которого сейчас висит запрос с этим токеном.
+    """
+
+    def __init__(self, parent: CancelToken | None = None) -> None:
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks: dict[int, Callable[[], None]] = {}
+        self._next_id = 0
+        if parent is not None:
+            parent.on_cancel(self.cancel)
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self) -> None:
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks = list(self._callbacks.values())
+            self._callbacks.clear()
+        for callback in callbacks:
+            callback()
+
+    def on_cancel(self, callback: Callable[[], None]) -> Callable[[], None]:
+        """Регистрирует обработчик отмены. Возвращает функцию снятия регистрации."""
+        with self._lock:
+            if not self._event.is_set():
+                handle = self._next_id
+                self._next_id += 1
+                self._callbacks[handle] = callback
+                return lambda: self._callbacks.pop(handle, None)
+        callback()
+        return lambda: None
+
+    def wait(self, timeout: float) -> bool:
+        """Пауза, прерываемая отменой. True — токен отменён."""
+        return self._event.wait(timeout)
+
+
+_scope = threading.local()
+
+
+def _scoped_wait(seconds: float) -> bool:
+    """Пауза, прерываемая токеном текущего HTTP-обмена (воспроизведение кассеты)."""
+    token: CancelToken | None = getattr(_scope, "token", None)
+    if token is None:
+        time.sleep(seconds)
+        return False
+    return token.wait(seconds)
+
+
+@contextmanager
+def _cancel_scope(token: CancelToken) -> Iterator[None]:
+    """Привязывает токен к текущему потоку на время HTTP-обмена."""
+    previous = getattr(_scope, "token", None)
+    _scope.token = token
+    try:
+        yield
+    finally:
+        _scope.token = previous
+
+
+class _CancellableStream(httpcore.NetworkStream):
+    """Сокет пула, который можно оборвать из другого потока через CancelToken."""
+
+    def __init__(self, stream: httpcore.NetworkStream) -> None:
+        self._stream = stream
+
+    def _abort(self) -> None:
+        sock = self._stream.get_extra_info("socket")
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except (AttributeError, OSError):
+            pass
+
+    @contextmanager
+    def _guard(self) -> Iterator[None]:
+        token: CancelToken | None = getattr(_scope, "token", None)
+        if token is None:
+            yield
+            return
+        if token.cancelled:
+            raise httpcore.ReadError("cancelled")
+        unregister = token.on_cancel(self._abort)
+        try:
+            yield
+        finally:
+            unregister()
+
+    def read(self, max_bytes: int, timeout: float | None = None) -> bytes:
+        with self._guard():
+            return self._stream.read(max_bytes, timeout)
+
+    def write(self, buffer: bytes, timeout: float | None = None) -> None:
+        with self._guard():
+            self._stream.write(buffer, timeout)
+
+    def close(self) -> None:
+        self._stream.close()
+
+    def start_tls(self, *args: Any, **kwargs: Any) -> httpcore.NetworkStream:
+        return _CancellableStream(self._stream.start_tls(*args, **kwargs))
+
+    def get_extra_info(self, info: str) -> Any:
+        return self._stream.get_extra_info(info)
+
+
+class _CancellableBackend(httpcore.NetworkBackend):
+    def __init__(self, backend: httpcore.NetworkBackend) -> None:
+        self._backend = backend
+
+    def connect_tcp(self, *args: Any, **kwargs: Any) -> httpcore.NetworkStream:
+        return _CancellableStream(self._backend.connect_tcp(*args, **kwargs))
+
+    def connect_unix_socket(self, *args: Any, **kwargs: Any) -> httpcore.NetworkStream:
+        return _CancellableStream(self._backend.connect_unix_socket(*args, **kwargs))
+
+    def sleep(self, seconds: float) -> None:
+        self._backend.sleep(seconds)
+
+
+@dataclass(frozen=True)
+class Attempt:
+    """Одна физическая попытка HTTP-запроса."""
+
+    number: int
+    status: str  # ok / error / cancelled
+    duration_ms: int
+    http_status: int | None = None
+    error: str = ""
+    hedge: bool = False
+    timed_out: bool = False
+
+
+@dataclass(frozen=True)
+class ResponseSize:
+    """Размер тела ответа: после распаковки и по сети (gzip/br)."""
+
+    body_bytes: int
+    wire_bytes: int
+    truncated: bool = False
+
+
+def size_columns(size: ResponseSize | None) -> dict[str, Any]:
+    """Именованные аргументы размера ответа для log_request."""
+    if size is None:
+        return {}
+    return {"response_bytes": size.body_bytes, "wire_bytes": size.wire_bytes}
+
+
+@dataclass
+class _AttemptLog:
+    attempts: list[Attempt] = field(default_factory=list)
+    final: int = 0
+    coalesced: bool = False
+    usage: Usage | None = None
+    size: ResponseSize | None = None
+    _counter: int = 0
+    _lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def next_number(self) -> int:
+        with self._lock:
+            self._counter += 1
+            return self._counter
+
+    def superseded(self) -> list[Attempt]:
+        """Попытки, не ставшие итогом (повторённые ошибки, проигравшие дубли)."""
+        return sorted(
+            (a for a in self.attempts if a.number != self.final),
+            key=lambda a: a.number,
+        )
+
+
+@dataclass(frozen=True)
+class SendOutcome:
+    """Итог одного запроса к модели (для таблицы и request_logs)."""
+
+    model: ActiveModel
+    answer: str
+    status: str
+    http_status: int | None
+    duration_ms: int
+    ttft_ms: int | None = None
+    attempt: int = 1
+    superseded: tuple[Attempt, ...] = ()
+    coalesced: bool = False
+    usage: Usage | None = None
+    size: ResponseSize | None = None
+    timed_out: bool = False
+
+    def log_rows(self, prompt: str) -> list[dict[str, Any]]:
+        """Строки request_logs (для log_requests_many): лишние попытки и итог."""
+        rows: list[dict[str, Any]] = []
+        for attempt in self.superseded:
+            if attempt.status != "cancelled":
+                status = "retry"
+            elif self.status == "cancelled":
+                status = "cancelled"
+            else:
+                status = "hedge_lost"
+            rows.append(
+                {
+                    "model_name": self.model.name,
+                    "prompt": prompt,
+                    "status": status,
+                    "response": attempt.error,
+                    "duration_ms": attempt.duration_ms,
+                    "http_status": attempt.http_status,
+                    "attempt": attempt.number,
+                    "timed_out": attempt.timed_out,
+                }
+            )
+        rows.append(
+            {
+                "model_name": self.model.name,
+                "prompt": prompt,
+                "status": self.status,
+                "response": self.answer,
+                "duration_ms": self.duration_ms,
+                "http_status": self.http_status,
+                "ttft_ms": self.ttft_ms,
+                "attempt": self.attempt,
+                "timed_out": self.timed_out,
+                **usage_columns(self.usage, self.model.price, billed=not self.coalesced),
+                **size_columns(self.size),
+            }
+        )
+        return rows
+
+
+def http2_available() -> bool:
+    """HTTP/2 включается, только если установлен пакет h2 (httpx[http2])."""
+    return importlib.util.find_spec("h2") is not None
+
+
+def brotli_available() -> bool:
+    """Ответы в br httpx распаковывает, только если установлен brotli (httpx[brotli])."""
+    return any(
+        importlib.util.find_spec(name) is not None for name in ("brotli", "brotlicffi")
+    )
+
+
+def accept_encoding() -> str:
+    return "br, gzip, deflate" if brotli_available() else "gzip, deflate"
+
+
+def configure_max_response(kb: float) -> None:
+    """Лимит размера ответа в КБ; 0 — без лимита."""
+    global _max_response_bytes
+    _max_response_bytes = max(0, int(kb * 1024))
+
+
+def configure_from_settings(db: Database) -> None:
+    """max_response_kb из settings (0 — без лимита)."""
+    try:
+        kb = float(db.get_setting("max_response_kb", "") or DEFAULT_MAX_RESPONSE_KB)
+    except ValueError:
+        kb = DEFAULT_MAX_RESPONSE_KB
+    configure_max_response(kb)
+
+
+def truncation_marker(limit_bytes: int) -> str:
+    return f"\n\n[Обрезано: ответ больше {limit_bytes // 1024} КБ]"
+
+
+def _read_body(response: httpx.Response, limit: int) -> tuple[bytearray, bool]:
+    """Тело ответа по частям, не больше limit байт (0 — целиком); True — обрезано."""
+    body = bytearray()
+    for chunk in response.iter_bytes():
+        body += chunk
+        if limit and len(body) > limit:
+            del body[limit:]
+            return body, True
+    return body, False
+
+
+def _error_detail(response: httpx.Response) -> str:
+    body, _cut = _read_body(response, ERROR_DETAIL_BYTES)
+    return body.decode("utf-8", "replace")[:500]
+
+
+def _parse_json_body(
+    model: ActiveModel, response: httpx.Response
+) -> tuple[dict, ResponseSize]:
+    """
+    JSON-ответ с лимитом размера. Обрезанное тело не разобрать целиком —
+    из него берётся начало message.content и дописывается пометка.
+    """
+    limit = _max_response_bytes
+    body, truncated = _read_body(response, limit)
+    size = ResponseSize(len(body), response.num_bytes_downloaded, truncated)
+    if truncated:
+        content = truncated_chat_content(body) + truncation_marker(limit)
+        return {"choices": [{"message": {"content": content}}]}, size
+    try:
+        return json.loads(body), size
+    except ValueError as exc:
+        raise NetworkError(
+            f"Некорректный ответ API от {model.name}",
+            http_status=response.status_code,
+        ) from exc
+
+
+def _sse_lines(response: httpx.Response, counter: list[int]) -> Iterator[str]:
+    """Строки SSE из распакованных байт; counter[0] — сколько байт прочитано."""
+    pending = bytearray()
+    for chunk in response.iter_bytes():
+        counter[0] += len(chunk)
+        pending += chunk
+        start = 0
+        while (end := pending.find(b"\n", start)) >= 0:
+            yield pending[start:end].rstrip(b"\r").decode("utf-8", "replace")
+            start = end + 1
+        del pending[:start]
+    if pending:
+        yield pending.decode("utf-8", "replace")
+
+
+def _pool_key(api_url: str) -> str:
+    parts = urlsplit(api_url)
+    return f"{parts.scheme}://{parts.netloc}".lower()
+
+
+def _wrap_backend(transport: httpx.HTTPTransport) -> None:
+    """
+    Оборачивает сокеты пула, чтобы CancelToken мог оборвать запрос. У httpx нет
+    публичного способа задать сетевой бэкенд, поэтому подменяется атрибут
+    httpcore.ConnectionPool (версия httpcore закреплена в requirements.txt).
+    Если атрибутов нет, запрос не обрывается: отмена срабатывает между
+    попытками, а идущая попытка доживает до своего таймаута.
+    """
+    pool = getattr(transport, "_pool", None)
+    backend = getattr(pool, "_network_backend", None)
+    if isinstance(backend, httpcore.NetworkBackend):
+        pool._network_backend = _CancellableBackend(backend)
+
+
+def get_client(api_url: str) -> httpx.Client:
+    """
+    Долгоживущий клиент на хост провайдера: keep-alive и общий пул соединений.
+    Потокобезопасен; таймаут задаётся на каждый запрос.
+    """
+    key = _pool_key(api_url)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None or client.is_closed:
+            transport = httpx.HTTPTransport(limits=POOL_LIMITS, http2=http2_available())
+            _wrap_backend(transport)
+            # Кассета (если включена) пишет обмен или отвечает вместо сети.
+            client = httpx.Client(
+                transport=cassette.wrap_transport(transport, _scoped_wait)
+            )
+            _clients[key] = client
+        return client
+
+
+def close_clients() -> None:
+    """Закрывает все клиенты пула (при выходе из приложения)."""
+    with _clients_lock:
+        clients = list(_clients.values())
+        _clients.clear()
+    for client in clients:
+        client.close()
+    cassette.close()
+
+
+def _headers(model: ActiveModel) -> dict[str, str]:
+    return {
+        "Authorization": f"Bearer {model.api_key}",
+        "Content-Type": "application/json",
+        "Accept-Encoding": accept_encoding(),
+        **extra_headers(model.api_url),
+    }
+
+
+def _execute(
+    model: ActiveModel,
+    timeout_sec: float,
+    exchange: Callable[[ProviderLimiter, Callable[[], bool]], T],
+    *,
+    policy: RetryPolicy = NO_RETRY,
+    hedge_after_sec: float | None = None,
+    token: CancelToken | None = None,
+    log: _AttemptLog | None = None,
+) -> T:
+    """
+    Выполняет запрос через лимитер провайдера с повторами и хеджированием.
+
+    exchange(limiter, claim) — один HTTP-обмен; claim() вызывается, когда попытка
+    готова стать ответом (False — ответ уже дал дубль, попытку надо бросить).
+    HTTP 429 повторяется после паузы лимитера, пока не истечёт timeout_sec;
+    остальные повторяемые ошибки — не больше policy.max_attempts раз.
+    """
+    limiter = limiter_for(detect_provider(model.api_url), model.api_key)
+    deadline = time.monotonic() + timeout_sec
+    parent = token or CancelToken()
+    log = log if log is not None else _AttemptLog()
+
+    def attempt(own: CancelToken, claim: Callable[[], bool], hedge: bool) -> T:
+        number = log.next_number()
+        started = time.perf_counter()
+        status, http_status, error = "error", None, ""
+        timed_out = False
+        # Для AIMD: когда ушёл запрос и сколько было в полёте вместе с ним.
+        sent_at: float | None = None
+        in_flight = 0
+        try:
+            unregister = own.on_cancel(limiter.wake)
+            try:
+                limiter.acquire(deadline, cancelled=lambda: own.cancelled)
+                sent_at = time.perf_counter()
+                in_flight = limiter.in_flight
+            except AcquireCancelled as exc:
+                raise RequestCancelled() from exc
+            except RateLimitTimeout as exc:
+                raise NetworkError(
+                    f"{exc} ({model.name})", http_status=429, retryable=False
+                ) from exc
+            finally:
+                unregister()
+            try:
+                if own.cancelled:
+                    raise RequestCancelled()
+                with _cancel_scope(own):
+                    result = exchange(limiter, claim)
+            except httpx.TimeoutException as exc:
+                raise NetworkError(
+                    f"Таймаут при запросе к {model.name}",
+                    retryable=True,
+                    timed_out=True,
+                ) from exc
+            except httpx.RequestError as exc:
+                raise NetworkError(
+                    f"Сеть: {model.name}: {exc}", retryable=True
+                ) from exc
+            finally:
+                limiter.release()
+        except NetworkError as exc:
+            failure = exc
+            if own.cancelled and not isinstance(exc, RequestCancelled):
+                failure = RequestCancelled()
+            cancelled = isinstance(failure, RequestCancelled)
+            status = "cancelled" if cancelled else "error"
+            http_status, error = exc.http_status, str(exc)
+            timed_out = exc.timed_out and not cancelled
+            failure.attempt = number
+            if failure is exc:
+                raise
+            raise failure from exc
+        else:
+            status = "ok"
+            log.final = number
+            return result
+        finally:
+            if sent_at is not None and status != "cancelled":
+                limiter.record(
+                    status == "ok",
+                    http_status,
+                    int((time.perf_counter() - sent_at) * 1000),
+                    in_flight,
+                )
+            log.attempts.append(
+                Attempt(
+                    number=number,
+                    status=status,
+                    duration_ms=int((time.perf_counter() - started) * 1000),
+                    http_status=http_status,
+                    error=error,
+                    hedge=hedge,
+                    timed_out=timed_out,
+                )
+            )
+
+    def run_once() -> T:
+        if hedge_after_sec is None:
+            return attempt(CancelToken(parent), lambda: True, False)
+        return _hedged(parent, hedge_after_sec, attempt)
+
+    retries = 0
+    while True:
+        try:
+            return run_once()
+        except NetworkError as exc:
+            if not exc.retryable or parent.cancelled:
+                log.final = exc.attempt
+                raise
+            if exc.http_status == 429:
+                # Пауза Retry-After уже выставлена в лимитере.
+                if time.monotonic() < deadline:
+                    continue
+                log.final = exc.attempt
+                raise
+            retries += 1
+            if retries >= policy.max_attempts:
+                log.final = exc.attempt
+                raise
+            if parent.wait(policy.backoff(retries - 1)):
+                log.final = exc.attempt
+                raise RequestCancelled() from exc
+
+
+def _hedged(
+    parent: CancelToken,
+    delay_sec: float,
+    attempt: Callable[[CancelToken, Callable[[], bool], bool], T],
+) -> T:
+    """
+    Основная попытка в текущем потоке; если она не ответила за delay_sec —
+    дубль в отдельном потоке. Кто первым заявит ответ (claim), тот и победил;
+    проигравший отменяется вместе с соединением.
+    """
+    primary = CancelToken(parent)
+    backup = CancelToken(parent)
+    lock = threading.Lock()
+    winner: list[CancelToken] = []
+    backup_result: Future[T] = Future()
+
+    def claim(own: CancelToken, other: CancelToken) -> bool:
+        with lock:
+            if not winner:
+                winner.append(own)
+        if winner[0] is own:
+            other.cancel()
+            return True
+        return False
+
+    def run_backup() -> None:
+        if not backup_result.set_running_or_notify_cancel():
+            return
+        try:
+            backup_result.set_result(
+                attempt(backup, lambda: claim(backup, primary), True)
+            )
+        except BaseException as exc:  # noqa: BLE001 — передаётся вызывающему
+            backup_result.set_exception(exc)
+
+    timer = threading.Timer(delay_sec, run_backup)
+    timer.daemon = True
+    timer.start()
+    try:
+        return attempt(primary, lambda: claim(primary, backup), False)
+    except NetworkError:
+        timer.cancel()
+        if backup_result.cancel():
+            raise
+        # Дубль уже в работе: его ответ (или ошибка) и есть итог.
+        return backup_result.result()
+    finally:
+        timer.cancel()
+        backup_result.cancel()
+
+
+class _Flight:
+    """Запрос в полёте, к которому присоединяются одинаковые запросы других потоков."""
+
+    def __init__(self) -> None:
+        self.result: Any = None
+        self.error: BaseException | None = None
+        self.text = ""
+        self.listeners: list[Callable[[str], None]] = []
+        self.waiters: list[threading.Event] = []
+
+    def publish(self, text: str) -> None:
+        """Накопленный текст потока — всем присоединившимся."""
+        with _flights_lock:
+            self.text = text
+            listeners = list(self.listeners)
+        for listener in listeners:
+            listener(text)
+
+
+def _flight_key(model: ActiveModel, payload: dict) -> str:
+    material = json.dumps(
+        [model.api_url, payload], ensure_ascii=False, sort_keys=True
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def coalesced_total() -> int:
+    """Сколько запросов с начала работы не ушло в сеть, а дождалось такого же в полёте."""
+    with _flights_lock:
+        return _coalesced_total
+
+
+def _single_flight(
+    key: str,
+    call: Callable[[Callable[[str], None]], T],
+    *,
+    on_text: Callable[[str], None] | None = None,
+    token: CancelToken | None = None,
+    log: _AttemptLog | None = None,
+) -> T:
+    """
+    Один HTTP-запрос на одинаковый ключ (модель + тело): первый поток выполняет
+    call(publish), остальные ждут его результат или ошибку. on_text получает
+    накопленный текст потока независимо от того, кто ведёт запрос.
+    Если ведущий отменён, а ждущий нет — ждущий повторяет запрос сам.
+    """
+    global _coalesced_total
+    while True:
+        with _flights_lock:
+            flight = _flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = _Flight()
+                _flights[key] = flight
+            else:
+                _coalesced_total += 1
+                wake = threading.Event()
+                flight.waiters.append(wake)
+            if on_text is not None:
+                flight.listeners.append(on_text)
+            text = flight.text
+
+        if leader:
+            try:
+                flight.result = call(flight.publish)
+                return flight.result
+            except BaseException as exc:
+                flight.error = exc
+                raise
+            finally:
+                with _flights_lock:
+                    _flights.pop(key, None)
+                    waiters = list(flight.waiters)
+                for waiter in waiters:
+                    waiter.set()
+
+        if log is not None:
+            log.coalesced = True
+        if on_text is not None and text:
+            on_text(text)
+        unregister = token.on_cancel(wake.set) if token is not None else None
+        try:
+            wake.wait()
+        finally:
+            if unregister is not None:
+                unregister()
+            if on_text is not None:
+                with _flights_lock:
+                    flight.listeners.remove(on_text)
+        if token is not None and token.cancelled:
+            raise RequestCancelled()
+        if isinstance(flight.error, RequestCancelled):
+            with _flights_lock:
+                _coalesced_total -= 1
+            continue
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+
+def post_chat(
+    model: ActiveModel,
+    payload: dict,
+    *,
+    timeout_sec: float = 60.0,
+    policy: RetryPolicy = NO_RETRY,
+    hedge_after_sec: float | None = None,
+    token: CancelToken | None = None,
+    log: _AttemptLog | None = None,
+) -> dict:
+    """
+    POST chat/completions через пул, лимитер и повторы. Возвращает разобранный JSON;
+    ответ больше max_response_kb — с обрезанным content и пометкой, размер — в log.size.
+    """
+
+    def exchange(
+        limiter: ProviderLimiter, claim: Callable[[], bool]
+    ) -> tuple[dict, ResponseSize]:
+        # stream() вместо post(): тело читается частями и не больше лимита.
+        with get_client(model.api_url).stream(
+            "POST",
+            model.api_url,
+            headers=_headers(model),
+            json=payload,
+            timeout=timeout_sec,
+        ) as response:
+            limiter.observe(response.status_code, response.headers)
+            if response.status_code >= 400:
+                raise NetworkError(
+                    f"HTTP {response.status_code} от {model.name}: "
+                    f"{_error_detail(response)}",
+                    http_status=response.status_code,
+                )
+            data, size = _parse_json_body(model, response)
+        if not claim():
+            raise RequestCancelled()
+        return data, size
+
+    data, size = _single_flight(
+        _flight_key(model, payload),
+        lambda _publish: _execute(
+            model,
+            timeout_sec,
+            exchange,
+            policy=policy,
+            hedge_after_sec=hedge_after_sec,
+            token=token,
+            log=log,
+        ),
+        token=token,
+        log=log,
+    )
+    if log is not None:
+        log.size = size
+    return data
 
 
 def send_prompt(
@@ -21,33 +822,360 @@ def send_prompt(
     prompt: str,
     *,
     timeout_sec: float = 60.0,
+    policy: RetryPolicy = NO_RETRY,
+    hedge_after_sec: float | None = None,
+    token: CancelToken | None = None,
+    log: _AttemptLog | None = None,
 ) -> str:
     """Отправляет промт в модель. Возвращает текст ответа."""
-    headers = {
-        "Authorization": f"Bearer {model.api_key}",
-        "Content-Type": "application/json",
-        **extra_headers(model.api_url),
-    }
-    payload = chat_payload(model.name, prompt)
+    data = post_chat(
+        model,
+        chat_payload(model.name, prompt),
+        timeout_sec=timeout_sec,
+        policy=policy,
+        hedge_after_sec=hedge_after_sec,
+        token=token,
+        log=log,
+    )
     try:
-        with httpx.Client(timeout=timeout_sec) as client:
-            response = client.post(model.api_url, headers=headers, json=payload)
-    except httpx.TimeoutException as exc:
-        raise NetworkError(f"Таймаут при запросе к {model.name}") from exc
-    except httpx.RequestError as exc:
-        raise NetworkError(f"Сеть: {model.name}: {exc}") from exc
+        content = parse_chat_content(data)
+    except (KeyError, IndexError, TypeError, ValueError) as exc:
+        raise NetworkError(f"Некорректный ответ API от {model.name}") from exc
+    if log is not None:
+        log.usage = parse_usage(data)
+    return content
 
-    if response.status_code >= 400:
-        detail = response.text[:500]
-        raise NetworkError(
-            f"HTTP {response.status_code} от {model.name}: {detail}",
-            http_status=response.status_code,
-        )
 
+def stream_prompt(
+    model: ActiveModel,
+    prompt: str,
+    *,
+    timeout_sec: float = 60.0,
+    on_text: Callable[[str], None] | None = None,
+    policy: RetryPolicy = NO_RETRY,
+    hedge_after_sec: float | None = None,
+    token: CancelToken | None = None,
+    log: _AttemptLog | None = None,
+) -> tuple[str, int | None]:
+    """
+    Потоковая отправка (stream: true, SSE). on_text получает накопленный текст.
+    Возвращает (ответ, время до первого токена в мс); usage из последнего
+    чанка — в log.usage, размер — в log.size. Текст больше max_response_kb
+    обрезается с пометкой. При хеджировании побеждает попытка, первой выдавшая токен.
+    Одинаковый поток, уже идущий из другого потока, не дублируется.
+    """
+    payload = chat_payload(model.name, prompt, stream=True)
+    payload.update(stream_options(model.api_url))
+    started = time.perf_counter()
+
+    def exchange(
+        limiter: ProviderLimiter,
+        claim: Callable[[], bool],
+        publish: Callable[[str], None],
+    ) -> tuple[str, int | None, Usage | None, ResponseSize]:
+        ttft_ms: int | None = None
+        usage: Usage | None = None
+        parts: list[str] = []
+        http_status: int | None = None
+        limit = _max_response_bytes
+        text_bytes = 0
+        read = [0]
+        truncated = False
+        published_at = 0.0
+        try:
+            with get_client(model.api_url).stream(
+                "POST",
+                model.api_url,
+                headers=_headers(model),
+                json=payload,
+                timeout=timeout_sec,
+            ) as response:
+                http_status = response.status_code
+                limiter.observe(response.status_code, response.headers)
+                if response.status_code >= 400:
+                    raise NetworkError(
+                        f"HTTP {response.status_code} от {model.name}: "
+                        f"{_error_detail(response)}",
+                        http_status=response.status_code,
+                    )
+                content_type = response.headers.get("content-type", "")
+                if "text/event-stream" not in content_type:
+                    # Провайдер проигнорировал stream — обычный JSON целиком.
+                    data, size = _parse_json_body(model, response)
+                    text = parse_chat_content(data)
+                    if not claim():
+                        raise RequestCancelled()
+                    elapsed_ms = int((time.perf_counter() - started) * 1000)
+                    return text, elapsed_ms, parse_usage(data), size
+                done = False
+                for line in _sse_lines(response, read):
+                    data = sse_data(line)
+                    if not data or done:
+                        continue
+                    if data == SSE_DONE:
+                        # Дочитываем тело до конца: иначе соединение не вернётся в пул.
+                        done = True
+                        continue
+                    chunk = json.loads(data)
+                    usage = parse_usage(chunk) or usage
+                    delta = parse_chat_delta(chunk)
+                    if not delta:
+                        continue
+                    if ttft_ms is None:
+                        if not claim():
+                            raise RequestCancelled()
+                        ttft_ms = int((time.perf_counter() - started) * 1000)
+                    parts.append(delta)
+                    text_bytes += len(delta.encode("utf-8"))
+                    if limit and text_bytes > limit:
+                        # Дальше не читаем: соединение закроется, а не вернётся в пул.
+                        truncated = True
+                        break
+                    now = time.perf_counter()
+                    if now - published_at >= PUBLISH_INTERVAL_SEC:
+                        # Склейка всего текста на каждый чанк — O(n²) на длинных ответах.
+                        published_at = now
+                        publish("".join(parts))
+                wire_bytes = response.num_bytes_downloaded
+        except (KeyError, IndexError, TypeError, ValueError) as exc:
+            raise NetworkError(
+                f"Некорректный ответ API от {model.name}: {exc}",
+                http_status=http_status,
+            ) from exc
+        if ttft_ms is None and not claim():
+            raise RequestCancelled()
+        text = "".join(parts)
+        if truncated:
+            text = text.encode("utf-8")[:limit].decode("utf-8", "ignore")
+            text = text.strip() + truncation_marker(limit)
+        else:
+            text = text.strip()
+        publish(text)
+        return text, ttft_ms, usage, ResponseSize(read[0], wire_bytes, truncated)
+
+    text, ttft_ms, usage, size = _single_flight(
+        _flight_key(model, payload),
+        lambda publish: _execute(
+            model,
+            timeout_sec,
+            lambda limiter, claim: exchange(limiter, claim, publish),
+            policy=policy,
+            hedge_after_sec=hedge_after_sec,
+            token=token,
+            log=log,
+        ),
+        on_text=on_text,
+        token=token,
+        log=log,
+    )
+    if log is not None:
+        log.usage = usage
+        log.size = size
+    return text, ttft_ms
+
+
+def _probe(model: ActiveModel, timeout_sec: float) -> None:
+    """Фоновая проверка модели с разомкнутым предохранителем: минимальный запрос."""
+    payload = chat_payload(model.name, "ping")
+    payload["max_tokens"] = 1
+    started = time.perf_counter()
     try:
-        return parse_chat_content(response.json())
-    except (KeyError, IndexError, TypeError, ValueError) as exc:
-        raise NetworkError(
-            f"Некорректный ответ API от {model.name}",
-            http_status=response.status_code,
-        ) from exc
+        post_chat(model, payload, timeout_sec=min(timeout_sec, PROBE_TIMEOUT_SEC))
+        ok, detail = True, ""
+    except NetworkError as exc:
+        ok, detail = False, str(exc)
+    duration_ms = int((time.perf_counter() - started) * 1000)
+    breaker.record_probe(model.name, ok, duration_ms, detail)
+
+
+def _skipped(model: ActiveModel, state: breaker.BreakerState) -> SendOutcome:
+    if state.state == breaker.HALF_OPEN:
+        note = "идёт фоновая проверка"
+    else:
+        note = f"проверка через {math.ceil(state.retry_in_sec)} с"
+    answer = (
+        f"[Пропущено] {model.name}: модель временно отключена, "
+        f"ошибок подряд: {state.failures} ({note})"
+    )
+    return SendOutcome(model, answer, "skipped", None, 0)
+
+
+def send_one(
+    model: ActiveModel,
+    prompt: str,
+    *,
+    timeout_sec: float = 60.0,
+    on_partial: Callable[[ActiveModel, str], None] | None = None,
+    policy: RetryPolicy = NO_RETRY,
+    hedge_after_sec: float | None = None,
+    token: CancelToken | None = None,
+) -> SendOutcome:
+    """Запрос к одной модели с учётом предохранителя; ошибки — в итоге, не исключением."""
+    model_breaker = breaker.breaker_for(model.name)
+    decision = model_breaker.allow()
+    if decision == breaker.PROBE:
+        threading.Thread(
+            target=_probe, args=(model, timeout_sec), daemon=True, name="probe"
+        ).start()
+    if decision != breaker.PASS:
+        return _skipped(model, model_breaker.state())
+
+    started = time.perf_counter()
+    http_status: int | None = None
+    ttft_ms: int | None = None
+    timed_out = False
+    log = _AttemptLog()
+    received = ""
+
+    def on_text(text: str) -> None:
+        nonlocal received
+        received = text
+        if on_partial is not None:
+            on_partial(model, text)
+
+    try:
+        if on_partial is None:
+            answer = send_prompt(
+                model,
+                prompt,
+                timeout_sec=timeout_sec,
+                policy=policy,
+                hedge_after_sec=hedge_after_sec,
+                token=token,
+                log=log,
+            )
+        else:
+            answer, ttft_ms = stream_prompt(
+                model,
+                prompt,
+                timeout_sec=timeout_sec,
+                on_text=on_text,
+                policy=policy,
+                hedge_after_sec=hedge_after_sec,
+                token=token,
+                log=log,
+            )
+        status = "ok"
+    except RequestCancelled:
+        # Уже полученная часть потокового ответа остаётся в строке.
+        answer = f"{received}\n\n[Отменено]" if received else f"[Отменено] {model.name}"
+        status = "cancelled"
+    except NetworkError as exc:
+        answer = f"[Ошибка] {exc}"
+        status = "error"
+        http_status = exc.http_status
+        timed_out = exc.timed_out
+    if not log.coalesced and status != "cancelled":
+        model_breaker.record(status == "ok")
+    duration_ms = int((time.perf_counter() - started) * 1000)
+    return SendOutcome(
+        model,
+        answer,
+        status,
+        http_status,
+        duration_ms,
+        ttft_ms,
+        attempt=log.final or 1,
+        superseded=tuple(log.superseded()),
+        coalesced=log.coalesced,
+        usage=log.usage if status == "ok" else None,
+        size=log.size if status == "ok" else None,
+        timed_out=timed_out,
+    )
+
+
+def _straggler(model: ActiveModel, note: str, elapsed_sec: float) -> SendOutcome:
+    return SendOutcome(
+        model,
+        f"[Не дождались] {model.name}: {note}",
+        "deadline",
+        None,
+        int(elapsed_sec * 1000),
+    )
+
+
+def send_to_models(
+    models: Sequence[ActiveModel],
+    prompt: str,
+    *,
+    timeout_sec: float = 60.0,
+    max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+    on_partial: Callable[[ActiveModel, str], None] | None = None,
+    policy: RetryPolicy = NO_RETRY,
+    hedge_after: Mapping[int, float] | None = None,
+    deadline_sec: float | None = None,
+    first_k: int = 0,
+    keep_stragglers: bool = False,
+    tokens: Mapping[int, CancelToken] | None = None,
+    timeouts: Mapping[int, float] | None = None,
+) -> Iterator[SendOutcome]:
+    """
+    Параллельная рассылка промта во все модели.
+    Не больше max_in_flight запросов одновременно; итоги отдаются по мере готовности.
+    Если задан on_partial — ответы запрашиваются потоком, и он получает
+    накопленный текст каждой модели (вызывается из рабочих потоков).
+    hedge_after: model_id → через сколько секунд слать дубль запроса.
+
+    deadline_sec / first_k: по истечении общего срока или после first_k успешных
+    ответов на каждую оставшуюся модель отдаётся итог со статусом «deadline».
+    Затем их запросы отменяются, а при keep_stragglers — продолжаются, и их
+    настоящие итоги отдаются следом.
+    tokens: model_id → токен отмены запроса к модели (итог — статус «cancelled»).
+    timeouts: model_id → свой таймаут модели вместо timeout_sec.
+    """
+    if not models:
+        return
+    hedge_after = hedge_after or {}
+    timeouts = timeouts or {}
+    workers = max(1, min(max_in_flight, len(models)))
+    given = tokens or {}
+    tokens = {model.id: given.get(model.id) or CancelToken() for model in models}
+    started = time.monotonic()
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="send")
+    futures = {
+        pool.submit(
+            send_one,
+            model,
+            prompt,
+            timeout_sec=timeouts.get(model.id, timeout_sec),
+            on_partial=on_partial,
+            policy=policy,
+            hedge_after_sec=hedge_after.get(model.id),
+            token=tokens[model.id],
+        ): model
+        for model in models
+    }
+    pending = set(futures)
+    answered = 0
+    try:
+        while pending:
+            remaining = (
+                None
+                if deadline_sec is None
+                else max(0.0, started + deadline_sec - time.monotonic())
+            )
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                outcome = future.result()
+                answered += outcome.status == "ok"
+                yield outcome
+            if not done:
+                note = f"нет ответа за {deadline_sec:g} с"
+                break
+            if first_k > 0 and answered >= first_k:
+                note = f"получено первых ответов: {answered}"
+                break
+        if not pending:
+            return
+        elapsed = time.monotonic() - started
+        for future, model in futures.items():
+            if future in pending:
+                yield _straggler(model, note, elapsed)
+        if keep_stragglers:
+            for future in as_completed(pending):
+                yield future.result()
+    finally:
+        for future, model in futures.items():
+            if not future.done():
+                tokens[model.id].cancel()
+        pool.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,84 @@
+"""Токены и стоимость запросов: цены моделей за миллион токенов, ток/с."""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any
+
+from adapters import Usage
+
+TOKENS_PER_PRICE_UNIT = 1_000_000
+
+
+@dataclass(frozen=True)
+class ModelPrice:
+    """Цена в долларах за миллион токенов; cached — для токенов из кэша провайдера."""
+
+    input_per_mtok: float = 0.0
+    output_per_mtok: float = 0.0
+    cached_per_mtok: float | None = None
+
+
+def price_from_row(row: dict[str, Any]) -> ModelPrice | None:
+    """Цена из строки models; None, если ни входная, ни выходная цена не заданы."""
+    input_price = row.get("price_input_per_mtok")
+    output_price = row.get("price_output_per_mtok")
+    if input_price is None and output_price is None:
+        return None
+    cached = row.get("price_cached_per_mtok")
+    return ModelPrice(
+        input_per_mtok=float(input_price or 0.0),
+        output_per_mtok=float(output_price or 0.0),
+        cached_per_mtok=None if cached is None else float(cached),
+    )
+
+
+def cost_usd(usage: Usage, price: ModelPrice) -> float:
+    cached = min(usage.cached_tokens, usage.prompt_tokens)
+    cached_rate = (
+        price.input_per_mtok if price.cached_per_mtok is None else price.cached_per_mtok
+    )
+    total = (
+        (usage.prompt_tokens - cached) * price.input_per_mtok
+        + cached * cached_rate
+        + usage.completion_tokens * price.output_per_mtok
+    )
+    return total / TOKENS_PER_PRICE_UNIT
+
+
+def usage_columns(
+    usage: Usage | None, price: ModelPrice | None, *, billed: bool = True
+) -> dict[str, Any]:
+    """
+    Именованные аргументы токенов и стоимости для log_request / save_result.
+    billed=False — запрос не уходил в сеть (объединён с таким же): стоимость не считаем.
+    """
+    if usage is None:
+        return {}
+    return {
+        "prompt_tokens": usage.prompt_tokens,
+        "completion_tokens": usage.completion_tokens,
+        "cached_tokens": usage.cached_tokens,
+        "cost_usd": cost_usd(usage, price) if price is not None and billed else None,
+    }
+
+
+def tokens_per_sec(
+    completion_tokens: int | None, duration_ms: int | None, ttft_ms: int | None = None
+) -> float | None:
+    """
+    Скорость генерации. Для потока — от первого токена до конца
+    (ожидание очереди провайдера не в счёт), иначе — по всей длительности.
+    """
+    if not completion_tokens or not duration_ms:
+        return None
+    generation_ms = duration_ms - (ttft_ms or 0)
+    if generation_ms <= 0 or completion_tokens < 2:
+        generation_ms = duration_ms
+    return completion_tokens * 1000.0 / generation_ms
+
+
+def format_cost(value: float | None) -> str:
+    if value is None:
+        return ""
+    return f"${value:.6f}" if value < 0.01 else f"${value:.4f}"
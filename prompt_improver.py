@@ -5,10 +5,12 @@ from __future__ import annotations
 import json
 from dataclasses import dataclass, field
 
-import httpx
-
-from adapters import extra_headers, parse_chat_content
+from adapters import parse_chat_content
+from cache import cache_key, response_cache
+from db import Database
 from models import ActiveModel
+from network import post_chat
+from retry import NO_RETRY, RetryPolicy
 
 SYSTEM_PROMPT = """\
 You are a prompt-engineering assistant. The user will give you their original prompt.
@@ -28,6 +30,7 @@ class ImproveResult:
     alternatives: list[str] = field(default_factory=list)
     adaptations: dict[str, str] = field(default_factory=dict)
     raw: str = ""
+    cached: bool = False
 
 
 def _parse_result(text: str) -> ImproveResult:
@@ -66,13 +69,14 @@ def improve_prompt(
     prompt: str,
     *,
     timeout_sec: float = 90.0,
+    policy: RetryPolicy = NO_RETRY,
+    db: Database | None = None,
+    use_cache: bool = True,
 ) -> ImproveResult:
-    """Отправляет промт в модель и возвращает улучшенные варианты."""
-    headers = {
-        "Authorization": f"Bearer {model.api_key}",
-        "Content-Type": "application/json",
-        **extra_headers(model.api_url),
-    }
+    """
+    Отправляет промт в модель и возвращает улучшенные варианты.
+    Ответ берётся из кэша и сохраняется в него; use_cache=False — только сохранение.
+    """
     payload = {
         "model": model.name,
         "messages": [
@@ -80,13 +84,13 @@ def improve_prompt(
             {"role": "user", "content": prompt},
         ],
     }
-
-    with httpx.Client(timeout=timeout_sec) as client:
-        response = client.post(model.api_url, headers=headers, json=payload)
-
-    if response.status_code >= 400:
-        detail = response.text[:500]
-        raise RuntimeError(f"HTTP {response.status_code}: {detail}")
-
-    content = parse_chat_content(response.json())
+    key = cache_key(model, payload)
+    content = response_cache.get(key, db) if use_cache else None
+    if content is not None:
+        result = _parse_result(content)
+        result.cached = True
+        return result
+    data = post_chat(model, payload, timeout_sec=timeout_sec, policy=policy)
+    content = parse_chat_content(data)
+    response_cache.put(key, content, model_name=model.name, db=db)
     return _parse_result(content)
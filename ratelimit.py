@@ -0,0 +1,463 @@
+"""Ограничение частоты запросов по провайдеру и API-ключу (token bucket + лимит параллельности)."""
+
+from __future__ import annotations
+
+import hashlib
+import threading
+import time
+from collections.abc import Callable, Mapping
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+from adapters import PROVIDERS
+from db import Database
+
+# Пауза после 429 без Retry-After.
+DEFAULT_429_COOLDOWN_SEC = 2.0
+# Верхняя граница паузы из заголовков (защита от мусорных значений).
+MAX_BLOCK_SEC = 600.0
+
+# Коды, на которые адаптивный лимит параллельности отвечает сокращением.
+OVERLOAD_STATUSES = frozenset({429, 500, 502, 503, 504, 529})
+
+
+class RateLimitTimeout(Exception):
+    """Слот не освободился до дедлайна запроса."""
+
+    def __init__(self, message: str, wait_sec: float) -> None:
+        super().__init__(message)
+        self.wait_sec = wait_sec
+
+
+class AcquireCancelled(Exception):
+    """Ожидание слота прервано отменой запроса."""
+
+
+@dataclass(frozen=True)
+class RateLimit:
+    """rps/burst — token bucket; concurrency — одновременных запросов. 0 — без ограничения."""
+
+    rps: float = 0.0
+    burst: int = 1
+    concurrency: int = 0
+
+
+@dataclass(frozen=True)
+class AimdConfig:
+    """
+    Адаптивный лимит параллельности (AIMD): +increase за каждое «окно» из limit
+    успешных ответов при полной загрузке; ×decrease_factor при 429/5xx/таймауте
+    и ×latency_factor, если задержка выросла в latency_ratio раз против базовой.
+    """
+
+    enabled: bool = True
+    initial: float = 8.0
+    min_limit: float = 1.0
+    max_limit: float = 64.0
+    increase: float = 1.0
+    decrease_factor: float = 0.5
+    latency_ratio: float = 2.0
+    latency_factor: float = 0.9
+
+
+@dataclass(frozen=True)
+class LimiterStats:
+    queue_depth: int
+    in_flight: int
+    waits: int
+    total_wait_ms: int
+    max_wait_ms: int
+    last_wait_ms: int
+    blocked_for_ms: int
+    # Текущий адаптивный лимит параллельности; None — AIMD выключен.
+    concurrency_limit: float | None = None
+    decreases: int = 0
+
+
+def _parse_duration(value: str) -> float | None:
+    """Секунды из «1.5», «20ms», «6m0s», «1h2m3s», эпохи в с или мс."""
+    value = value.strip().lower()
+    if not value:
+        return None
+    try:
+        number = float(value)
+    except ValueError:
+        number = None
+    if number is not None:
+        now = time.time()
+        if number > 1e12:  # эпоха в миллисекундах (OpenRouter X-RateLimit-Reset)
+            return number / 1000.0 - now
+        if number > 1e9:  # эпоха в секундах
+            return number - now
+        return number
+    total = 0.0
+    num = ""
+    i = 0
+    while i < len(value):
+        ch = value[i]
+        if ch.isdigit() or ch == ".":
+            num += ch
+            i += 1
+            continue
+        if value.startswith("ms", i):
+            unit, step = 0.001, 2
+        elif ch in "hms":
+            unit, step = {"h": 3600.0, "m": 60.0, "s": 1.0}[ch], 1
+        else:
+            return None
+        if not num:
+            return None
+        total += float(num) * unit
+        num = ""
+        i += step
+    return total if not num else None
+
+
+def _retry_after_sec(value: str) -> float | None:
+    seconds = _parse_duration(value)
+    if seconds is not None:
+        return seconds
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return (when - datetime.now(timezone.utc)).total_seconds()
+
+
+def block_seconds(status_code: int, headers: Mapping[str, str]) -> float:
+    """Сколько ждать перед следующим запросом по ответу провайдера (0 — не ждать)."""
+    lowered = {k.lower(): v for k, v in headers.items()}
+    wait = 0.0
+    if "retry-after" in lowered:
+        wait = _retry_after_sec(lowered["retry-after"]) or 0.0
+    for suffix in ("-requests", ""):
+        remaining = lowered.get(f"x-ratelimit-remaining{suffix}")
+        reset = lowered.get(f"x-ratelimit-reset{suffix}")
+        if remaining is None or reset is None:
+            continue
+        try:
+            exhausted = float(remaining) <= 0
+        except ValueError:
+            continue
+        if exhausted:
+            wait = max(wait, _parse_duration(reset) or 0.0)
+        break
+    if status_code == 429 and wait <= 0:
+        wait = DEFAULT_429_COOLDOWN_SEC
+    return min(max(wait, 0.0), MAX_BLOCK_SEC)
+
+
+class ProviderLimiter:
+    """Очередь запросов к одному провайдеру с одним ключом. Потокобезопасен."""
+
+    def __init__(
+        self, limit: RateLimit | None = None, aimd: AimdConfig | None = None
+    ) -> None:
+        self._cond = threading.Condition()
+        self._limit = limit or RateLimit()
+        self._aimd = aimd or AimdConfig(enabled=False)
+        self._adaptive = self._aimd.initial
+        # Задержка ответа: короткое и длинное (базовое) скользящее среднее, мс.
+        self._latency_fast = 0.0
+        self._latency_base = 0.0
+        self._decreased_at = 0.0
+        self._decreases = 0
+        self._tokens = float(max(self._limit.burst, 1))
+        self._refilled_at = time.monotonic()
+        self._blocked_until = 0.0
+        self._in_flight = 0
+        self._waiting = 0
+        self._waits = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        self._last_wait = 0.0
+
+    def configure(self, limit: RateLimit, aimd: AimdConfig | None = None) -> None:
+        with self._cond:
+            self._limit = limit
+            self._tokens = min(self._tokens, float(max(limit.burst, 1)))
+            if aimd is not None and aimd != self._aimd:
+                if not self._aimd.enabled:
+                    self._adaptive = aimd.initial
+                self._aimd = aimd
+                self._adaptive = min(max(self._adaptive, aimd.min_limit), aimd.max_limit)
+            self._cond.notify_all()
+
+    def _concurrency_cap(self) -> int:
+        """Сколько запросов можно держать в полёте (0 — без ограничения)."""
+        caps = []
+        if self._limit.concurrency > 0:
+            caps.append(self._limit.concurrency)
+        if self._aimd.enabled:
+            caps.append(max(1, int(self._adaptive)))
+        return min(caps) if caps else 0
+
+    def _refill(self, now: float) -> None:
+        if self._limit.rps > 0:
+            capacity = float(max(self._limit.burst, 1))
+            elapsed = now - self._refilled_at
+            self._tokens = min(capacity, self._tokens + elapsed * self._limit.rps)
+        self._refilled_at = now
+
+    def _wait_needed(self, now: float) -> float | None:
+        """0 — можно идти; None — ждать освобождения слота; иначе секунды."""
+        if now < self._blocked_until:
+            return self._blocked_until - now
+        cap = self._concurrency_cap()
+        if cap > 0 and self._in_flight >= cap:
+            return None
+        if self._limit.rps > 0 and self._tokens < 1.0:
+            return (1.0 - self._tokens) / self._limit.rps
+        return 0.0
+
+    def acquire(
+        self,
+        deadline: float | None = None,
+        cancelled: Callable[[], bool] | None = None,
+    ) -> float:
+        """
+        Ждёт слот (до deadline по time.monotonic()). Возвращает время ожидания в секундах.
+        cancelled() проверяется при каждом пробуждении; разбудить ожидающих — wake().
+        """
+        started = time.monotonic()
+        with self._cond:
+            self._waiting += 1
+            try:
+                while True:
+                    if cancelled is not None and cancelled():
+                        raise AcquireCancelled()
+                    now = time.monotonic()
+                    self._refill(now)
+                    wait = self._wait_needed(now)
+                    if wait == 0.0:
+                        break
+                    if deadline is not None:
+                        remaining = deadline - now
+                        if remaining <= 0 or (wait is not None and wait > remaining):
+                            needed = remaining if wait is None else wait
+                            raise RateLimitTimeout(
+                                "Лимит запросов провайдера: "
+                                f"нужно ждать ещё {max(needed, 0.0):.1f} с",
+                                wait_sec=max(needed, 0.0),
+                            )
+                        wait = remaining if wait is None else wait
+                    self._cond.wait(wait)
+                if self._limit.rps > 0:
+                    self._tokens -= 1.0
+                self._in_flight += 1
+            finally:
+                self._waiting -= 1
+            waited = time.monotonic() - started
+            if waited > 0.001:
+                self._waits += 1
+                self._total_wait += waited
+                self._max_wait = max(self._max_wait, waited)
+            self._last_wait = waited
+            return waited
+
+    @property
+    def in_flight(self) -> int:
+        with self._cond:
+            return self._in_flight
+
+    def wake(self) -> None:
+        """Будит ожидающих acquire (например, после отмены одного из запросов)."""
+        with self._cond:
+            self._cond.notify_all()
+
+    def release(self) -> None:
+        with self._cond:
+            self._in_flight = max(0, self._in_flight - 1)
+            self._cond.notify_all()
+
+    def record(
+        self, ok: bool, http_status: int | None, duration_ms: int, in_flight: int
+    ) -> None:
+        """
+        Итог попытки (то же, что пишется в request_logs) для AIMD.
+        in_flight — сколько запросов было в полёте вместе с этим, при его старте.
+        """
+        aimd = self._aimd
+        if not aimd.enabled:
+            return
+        with self._cond:
+            now = time.monotonic()
+            overloaded = not ok and (http_status is None or http_status in OVERLOAD_STATUSES)
+            if ok:
+                sample = float(max(duration_ms, 1))
+                if self._latency_base <= 0:
+                    self._latency_fast = self._latency_base = sample
+                else:
+                    self._latency_fast += (sample - self._latency_fast) * 0.2
+                    self._latency_base += (sample - self._latency_base) * 0.02
+            slow = (
+                ok
+                and self._latency_base > 0
+                and self._latency_fast > self._latency_base * aimd.latency_ratio
+            )
+            if overloaded or slow:
+                # Одно сокращение на «поколение» запросов: ошибки уже летевших
+                # запросов не режут лимит повторно.
+                cooldown = max(self._latency_fast, 500.0) / 1000.0
+                if now - self._decreased_at < cooldown:
+                    return
+                factor = aimd.decrease_factor if overloaded else aimd.latency_factor
+                self._adaptive = max(aimd.min_limit, self._adaptive * factor)
+                self._decreased_at = now
+                self._decreases += 1
+                if slow:
+                    # Новая норма: иначе лимит падает до минимума при устойчиво
+                    # медленном провайдере.
+                    self._latency_base = self._latency_fast
+            elif ok and in_flight >= int(self._adaptive):
+                # Рост только при полной загрузке: иначе лимит раздувается вхолостую.
+                self._adaptive = min(
+                    aimd.max_limit, self._adaptive + aimd.increase / self._adaptive
+                )
+                self._cond.notify_all()
+
+    def observe(self, status_code: int, headers: Mapping[str, str]) -> float:
+        """Учитывает Retry-After / x-ratelimit-* из ответа. Возвращает паузу в секундах."""
+        wait = block_seconds(status_code, headers)
+        if wait > 0:
+            with self._cond:
+                self._blocked_until = max(
+                    self._blocked_until, time.monotonic() + wait
+                )
+        return wait
+
+    def stats(self) -> LimiterStats:
+        with self._cond:
+            blocked = max(0.0, self._blocked_until - time.monotonic())
+            return LimiterStats(
+                queue_depth=self._waiting,
+                in_flight=self._in_flight,
+                waits=self._waits,
+                total_wait_ms=int(self._total_wait * 1000),
+                max_wait_ms=int(self._max_wait * 1000),
+                last_wait_ms=int(self._last_wait * 1000),
+                blocked_for_ms=int(blocked * 1000),
+                concurrency_limit=self._adaptive if self._aimd.enabled else None,
+                decreases=self._decreases,
+            )
+
+
+_limits: dict[str, RateLimit] = {}
+_aimd = AimdConfig()
+_limiters: dict[tuple[str, str], ProviderLimiter] = {}
+_registry_lock = threading.Lock()
+
+
+def _key_fingerprint(api_key: str) -> str:
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:12]
+
+
+def _limit_locked(provider: str) -> RateLimit:
+    return _limits.get(provider) or _limits.get("default") or RateLimit()
+
+
+def limiter_for(provider: str, api_key: str) -> ProviderLimiter:
+    """Общий лимитер для пары (провайдер, ключ)."""
+    key = (provider, _key_fingerprint(api_key))
+    with _registry_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            limiter = ProviderLimiter(_limit_locked(provider), _aimd)
+            _limiters[key] = limiter
+        return limiter
+
+
+def configure(provider: str, limit: RateLimit) -> None:
+    """Задаёт лимит провайдера ("default" — для всех без своего лимита)."""
+    with _registry_lock:
+        _limits[provider] = limit
+        updates = [
+            (limiter, _limit_locked(name))
+            for (name, _), limiter in _limiters.items()
+        ]
+    for limiter, current in updates:
+        limiter.configure(current)
+
+
+def configure_aimd(config: AimdConfig) -> None:
+    """Настройки адаптивного лимита для всех лимитеров."""
+    global _aimd
+    with _registry_lock:
+        _aimd = config
+        limiters = [(limiter, _limit_locked(name)) for (name, _), limiter in _limiters.items()]
+    for limiter, limit in limiters:
+        limiter.configure(limit, config)
+
+
+def _float_setting(db: Database, key: str, fallback: float) -> float:
+    raw = db.get_setting(key, "") or ""
+    try:
+        return float(raw)
+    except ValueError:
+        return fallback
+
+
+def configure_from_settings(db: Database) -> None:
+    """
+    Читает лимиты из settings: rate_limit_rps / rate_limit_burst / rate_limit_concurrency
+    и переопределения провайдера с суффиксом «:<provider>», например rate_limit_rps:openrouter;
+    адаптивный лимит — adaptive_concurrency / aimd_initial / aimd_min / aimd_max.
+    """
+    defaults = AimdConfig()
+    configure_aimd(
+        AimdConfig(
+            enabled=(db.get_setting("adaptive_concurrency", "1") or "1") == "1",
+            initial=max(1.0, _float_setting(db, "aimd_initial", defaults.initial)),
+            min_limit=max(1.0, _float_setting(db, "aimd_min", defaults.min_limit)),
+            max_limit=max(
+                _float_setting(db, "aimd_min", defaults.min_limit),
+                _float_setting(db, "aimd_max", defaults.max_limit),
+                1.0,
+            ),
+        )
+    )
+    base = RateLimit(
+        rps=_float_setting(db, "rate_limit_rps", 0.0),
+        burst=int(_float_setting(db, "rate_limit_burst", 1.0)),
+        concurrency=int(_float_setting(db, "rate_limit_concurrency", 0.0)),
+    )
+    configure("default", base)
+    for provider in [*PROVIDERS, "openai_compatible"]:
+        configure(
+            provider,
+            RateLimit(
+                rps=_float_setting(db, f"rate_limit_rps:{provider}", base.rps),
+                burst=int(
+                    _float_setting(db, f"rate_limit_burst:{provider}", base.burst)
+                ),
+                concurrency=int(
+                    _float_setting(
+                        db, f"rate_limit_concurrency:{provider}", base.concurrency
+                    )
+                ),
+            ),
+        )
+
+
+def snapshot() -> dict[str, LimiterStats]:
+    """Состояние всех лимитеров: «провайдер/отпечаток ключа» → статистика."""
+    with _registry_lock:
+        items = list(_limiters.items())
+    return {f"{name}/{fp}": limiter.stats() for (name, fp), limiter in items}
+
+
+def format_concurrency() -> str:
+    """Живая метрика для строки состояния: «openrouter 3/8» — в полёте / адаптивный лимит."""
+    stats = snapshot()
+    providers = [key.split("/", 1)[0] for key in stats]
+    parts = []
+    for key, item in sorted(stats.items()):
+        if item.concurrency_limit is None:
+            continue
+        name = key.split("/", 1)[0]
+        label = key if providers.count(name) > 1 else name
+        parts.append(f"{label} {item.in_flight}/{item.concurrency_limit:.0f}")
+    return ", ".join(parts)
@@ -0,0 +1,77 @@
+"""Политика повторов (экспоненциальная пауза с джиттером) и задержка хеджирования."""
+
+from __future__ import annotations
+
+import math
+import random
+from collections.abc import Sequence
+from dataclasses import dataclass
+
+from db import Database
+
+# Сколько последних успешных запросов модели учитывать для перцентиля.
+LATENCY_WINDOW = 200
+# Меньше стольких замеров — хедж не включается (перцентиль ненадёжен).
+MIN_LATENCY_SAMPLES = 10
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """
+    max_attempts — всего попыток на один запрос (1 — без повторов).
+    hedge_percentile — 0: без хеджирования; иначе дубль уходит, когда первая
+    попытка медленнее этого перцентиля истории модели.
+    """
+
+    max_attempts: int = 3
+    base_delay_sec: float = 0.5
+    max_delay_sec: float = 8.0
+    hedge_percentile: float = 0.0
+
+    def backoff(self, retry_index: int) -> float:
+        """Пауза перед повтором (full jitter): случайно в [0, base * 2^n], не больше max."""
+        ceiling = min(self.max_delay_sec, self.base_delay_sec * (2**retry_index))
+        return random.uniform(0.0, ceiling)
+
+
+NO_RETRY = RetryPolicy(max_attempts=1)
+
+
+def percentile(values: Sequence[float], q: float) -> float | None:
+    """Перцентиль q (0–100) с линейной интерполяцией; None для пустого набора."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * min(max(q, 0.0), 100.0) / 100.0
+    low = math.floor(rank)
+    high = math.ceil(rank)
+    if low == high:
+        return float(ordered[low])
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def policy_from_settings(db: Database) -> RetryPolicy:
+    def number(key: str, fallback: float) -> float:
+        raw = db.get_setting(key, "") or ""
+        try:
+            return float(raw)
+        except ValueError:
+            return fallback
+
+    return RetryPolicy(
+        max_attempts=max(1, int(number("retry_max_attempts", 3))),
+        base_delay_sec=max(0.0, number("retry_base_delay_sec", 0.5)),
+        max_delay_sec=max(0.0, number("retry_max_delay_sec", 8.0)),
+        hedge_percentile=max(0.0, min(number("hedge_percentile", 0.0), 99.9)),
+    )
+
+
+def hedge_delay_sec(db: Database, model_name: str, policy: RetryPolicy) -> float | None:
+    """Через сколько секунд слать дубль запроса к модели; None — не хеджировать."""
+    if policy.hedge_percentile <= 0:
+        return None
+    durations = db.recent_durations(model_name, LATENCY_WINDOW)
+    if len(durations) < MIN_LATENCY_SAMPLES:
+        return None
+    value = percentile(durations, policy.hedge_percentile)
+    return None if value is None else value / 1000.0
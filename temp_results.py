@@ -3,6 +3,7 @@
 from __future__ import annotations
 
 from dataclasses import dataclass, field
+from typing import Any
 
 
 @dataclass
@@ -13,6 +14,8 @@ class TempResultRow:
     selected: bool = False
     prompt_id: int | None = None
     prompt_text: str = ""
+    # Токены и стоимость ответа (аргументы save_result); пусто — неизвестны.
+    usage: dict[str, Any] = field(default_factory=dict)
 
 
 @dataclass
@@ -36,7 +39,9 @@ class TempResultsTable:
         """
         Создать таблицу после ответов моделей.
         items: список (model_id, model_name, response).
+        Токены, уже пришедшие для модели, сохраняются.
         """
+        usage = {row.model_id: row.usage for row in self.rows}
         self.reset()
         for model_id, model_name, response in items:
             self.rows.append(
@@ -47,9 +52,41 @@ class TempResultsTable:
                     selected=False,
                     prompt_id=prompt_id,
                     prompt_text=prompt_text,
+                    usage=usage.get(model_id, {}),
                 )
             )
 
+    def update_response(
+        self,
+        *,
+        model_id: int,
+        model_name: str,
+        response: str,
+        prompt_id: int | None,
+        prompt_text: str,
+    ) -> bool:
+        """Обновить (или добавить) ответ модели по мере получения. True — строка новая."""
+        for row in self.rows:
+            if row.model_id == model_id:
+                row.response = response
+                return False
+        self.rows.append(
+            TempResultRow(
+                model_id=model_id,
+                model_name=model_name,
+                response=response,
+                prompt_id=prompt_id,
+                prompt_text=prompt_text,
+            )
+        )
+        return True
+
+    def set_usage(self, model_id: int, usage: dict[str, Any]) -> None:
+        for row in self.rows:
+            if row.model_id == model_id:
+                row.usage = dict(usage)
+                return
+
     def selected_rows(self) -> list[TempResultRow]:
         return [r for r in self.rows if r.selected]
 
@@ -0,0 +1,182 @@
+"""
+Таймаут на модель по перцентилю её прошлых длительностей (вместо одного на всех).
+Попытки, оборванные прошлым таймаутом, входят в выборку со своей длительностью,
+а не теряются: иначе бюджет тяжёлого хвоста раз за разом сжимается до floor.
+Выключен по умолчанию (adaptive_timeout).
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections.abc import Iterable, Sequence
+from dataclasses import dataclass, replace
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from db import Database
+from models import ActiveModel
+from retry import LATENCY_WINDOW, MIN_LATENCY_SAMPLES, percentile
+
+DEFAULT_PERCENTILE = 99.0
+# Запас сверх перцентиля: p99 × 1.5.
+DEFAULT_MULTIPLIER = 1.5
+DEFAULT_FLOOR_SEC = 10.0
+DEFAULT_CEILING_SEC = 300.0
+# Учитываются запросы не старше стольких дней.
+DEFAULT_WINDOW_DAYS = 7.0
+# Сколько секунд сводка по request_logs считается свежей.
+SUMMARY_TTL_SEC = 60.0
+
+
+@dataclass(frozen=True)
+class TimeoutConfig:
+    enabled: bool = False
+    percentile: float = DEFAULT_PERCENTILE
+    multiplier: float = DEFAULT_MULTIPLIER
+    floor_sec: float = DEFAULT_FLOOR_SEC
+    ceiling_sec: float = DEFAULT_CEILING_SEC
+    window_days: float = DEFAULT_WINDOW_DAYS
+    # request_timeout_sec: для моделей без истории и при выключенном планировщике.
+    default_sec: float = 60.0
+
+
+@dataclass(frozen=True)
+class LatencySummary:
+    model_name: str
+    samples: int
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    durations_ms: tuple[int, ...] = ()
+
+
+@dataclass(frozen=True)
+class TimeoutBudget:
+    model_name: str
+    timeout_sec: float
+    # history — по перцентилю модели; default — общий таймаут (мало истории);
+    # off — планировщик выключен.
+    source: str
+    summary: LatencySummary | None = None
+
+    def describe(self) -> str:
+        s = self.summary
+        if self.source == "off":
+            return "общий таймаут (по истории — выключено)"
+        if self.source != "history" or s is None:
+            samples = 0 if s is None else s.samples
+            return f"общий таймаут (запросов в истории: {samples})"
+        return (
+            f"по {s.samples} запросам: p50 {s.p50_ms / 1000:.1f} с, "
+            f"p95 {s.p95_ms / 1000:.1f} с, p99 {s.p99_ms / 1000:.1f} с"
+        )
+
+
+def summarize(model_name: str, durations: Sequence[int]) -> LatencySummary:
+    return LatencySummary(
+        model_name=model_name,
+        samples=len(durations),
+        p50_ms=percentile(durations, 50) or 0.0,
+        p95_ms=percentile(durations, 95) or 0.0,
+        p99_ms=percentile(durations, 99) or 0.0,
+        durations_ms=tuple(durations),
+    )
+
+
+def config_from_settings(db: Database) -> TimeoutConfig:
+    def number(key: str, fallback: float) -> float:
+        try:
+            return float(db.get_setting(key, "") or fallback)
+        except ValueError:
+            return fallback
+
+    floor = max(1.0, number("timeout_floor_sec", DEFAULT_FLOOR_SEC))
+    return TimeoutConfig(
+        enabled=(db.get_setting("adaptive_timeout", "0") or "0") == "1",
+        percentile=max(50.0, min(number("timeout_percentile", DEFAULT_PERCENTILE), 99.9)),
+        multiplier=max(1.0, number("timeout_multiplier", DEFAULT_MULTIPLIER)),
+        floor_sec=floor,
+        ceiling_sec=max(floor, number("timeout_ceiling_sec", DEFAULT_CEILING_SEC)),
+        window_days=max(0.0, number("timeout_window_days", DEFAULT_WINDOW_DAYS)),
+        default_sec=max(1.0, number("request_timeout_sec", 60.0)),
+    )
+
+
+class TimeoutPlanner:
+    """
+    Сводка длительностей по всем моделям — одним запросом к request_logs,
+    с кэшем на SUMMARY_TTL_SEC; бюджет — перцентиль × запас в пределах [floor, ceiling].
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._summaries: dict[str, LatencySummary] = {}
+        self._key: tuple[Path, float] | None = None
+        self._loaded_at = 0.0
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._key = None
+
+    def summaries(
+        self, db: Database, window_days: float = DEFAULT_WINDOW_DAYS
+    ) -> dict[str, LatencySummary]:
+        key = (db.db_path, window_days)
+        now = time.monotonic()
+        with self._lock:
+            if self._key == key and now - self._loaded_at < SUMMARY_TTL_SEC:
+                return self._summaries
+        since = (
+            datetime.now(timezone.utc) - timedelta(days=window_days)
+            if window_days > 0
+            else datetime.min.replace(tzinfo=timezone.utc)
+        )
+        summaries = {
+            name: summarize(name, durations)
+            for name, durations in db.latency_samples(since, LATENCY_WINDOW).items()
+        }
+        with self._lock:
+            self._summaries = summaries
+            self._key = key
+            self._loaded_at = now
+        return summaries
+
+    @staticmethod
+    def budget(
+        model_name: str, summary: LatencySummary | None, config: TimeoutConfig
+    ) -> TimeoutBudget:
+        if not config.enabled:
+            return TimeoutBudget(model_name, config.default_sec, "off", summary)
+        if summary is None or summary.samples < MIN_LATENCY_SAMPLES:
+            return TimeoutBudget(model_name, config.default_sec, "default", summary)
+        base_ms = percentile(summary.durations_ms, config.percentile) or 0.0
+        seconds = base_ms / 1000.0 * config.multiplier
+        seconds = min(config.ceiling_sec, max(config.floor_sec, seconds))
+        return TimeoutBudget(model_name, round(seconds, 1), "history", summary)
+
+    def plan(
+        self,
+        db: Database,
+        model_names: Iterable[str],
+        config: TimeoutConfig | None = None,
+    ) -> dict[str, TimeoutBudget]:
+        config = config or config_from_settings(db)
+        summaries = self.summaries(db, config.window_days)
+        return {
+            name: self.budget(name, summaries.get(name), config) for name in model_names
+        }
+
+
+planner = TimeoutPlanner()
+
+
+def timeouts_for(
+    db: Database, models: Sequence[ActiveModel], default_sec: float | None = None
+) -> dict[int, float]:
+    """model_id → таймаут запроса, с. default_sec — вместо request_timeout_sec."""
+    config = config_from_settings(db)
+    if default_sec is not None:
+        config = replace(config, default_sec=default_sec)
+    budgets = planner.plan(db, [m.name for m in models], config)
+    return {m.id: budgets[m.name].timeout_sec for m in models}